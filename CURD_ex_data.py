@@ -1,6 +1,10 @@
 import sqlite3
 from datetime import datetime
 
+from blob_store import split_test_data
+from output_compare import is_valid_compare_mode
+from run_cpp import COMPILE_PROFILES
+
 # Database path (same as in exercise_handler.py)
 DB_PATH = "dataBase/exercises.db"
 
@@ -12,7 +16,37 @@ def connect_db():
     return conn
 
 
-def create_exercise(title, description, difficulty, test_cases):
+def bump_suite_version(cursor, exercise_id):
+    """Mark an exercise's test suite as changed, so cached grading results of it are not reused"""
+    try:
+        cursor.execute("UPDATE exercises SET suite_version = COALESCE(suite_version, 0) + 1 WHERE id = ?",
+                       (exercise_id,))
+        cursor.execute("DELETE FROM grading_cache WHERE exercise_id = ?", (exercise_id,))
+    except sqlite3.OperationalError:
+        pass  # Database created before the grading cache existed
+
+
+def _insert_test_case(cursor, exercise_id, input_data, expected_output, is_hidden, generator_seed=None):
+    """Insert a test case, moving large inputs and outputs to the blob store, and return its id"""
+    input_data, input_blob = split_test_data(input_data)
+    expected_output, expected_blob = split_test_data(expected_output)
+    if generator_seed is None:
+        cursor.execute(
+            "INSERT INTO test_cases (exercise_id, input, expected_output, is_hidden, input_blob, expected_blob) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (exercise_id, input_data, expected_output, is_hidden, input_blob, expected_blob)
+        )
+    else:
+        cursor.execute(
+            "INSERT INTO test_cases (exercise_id, input, expected_output, is_hidden, input_blob, expected_blob, "
+            "generator_seed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (exercise_id, input_data, expected_output, is_hidden, input_blob, expected_blob, generator_seed)
+        )
+    return cursor.lastrowid
+
+
+def create_exercise(title, description, difficulty, test_cases, compile_profile=None, compare_mode=None,
+                    checker_code=None, reference_code=None):
     """
     Create a new exercise with test cases
 
@@ -21,28 +55,37 @@ def create_exercise(title, description, difficulty, test_cases):
         description (str): Exercise description
         difficulty (str): Exercise difficulty level
         test_cases (list): List of dictionaries with keys 'input', 'expected_output', and 'is_hidden'
+        compile_profile (str, optional): Compiler flag profile from run_cpp.COMPILE_PROFILES
+        compare_mode (str, optional): Output compare mode, e.g. "lines" or "float:1e-4" (see output_compare)
+        checker_code (str, optional): C++ checker program judging outputs instead (see run_cpp.compile_checker)
+        reference_code (str, optional): Model solution, timed by calibrate.calibrate_exercise to set
+            per-test time and memory limits
 
     Returns:
         tuple: (success bool, message string)
     """
+    if compile_profile is not None and compile_profile not in COMPILE_PROFILES:
+        return False, f"Unknown compile profile '{compile_profile}'"
+    if compare_mode is not None and not is_valid_compare_mode(compare_mode):
+        return False, f"Unknown compare mode '{compare_mode}'"
+
     try:
         conn = connect_db()
         cursor = conn.cursor()
 
         # Insert exercise
         cursor.execute(
-            "INSERT INTO exercises (title, description, difficulty) VALUES (?, ?, ?)",
-            (title, description, difficulty)
+            "INSERT INTO exercises (title, description, difficulty, compile_profile, compare_mode, checker_code, "
+            "reference_code) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (title, description, difficulty, compile_profile, compare_mode, checker_code, reference_code)
         )
 
         exercise_id = cursor.lastrowid
 
         # Insert test cases
         for tc in test_cases:
-            cursor.execute(
-                "INSERT INTO test_cases (exercise_id, input, expected_output, is_hidden) VALUES (?, ?, ?, ?)",
-                (exercise_id, tc.get('input', ''), tc['expected_output'], tc.get('is_hidden', False))
-            )
+            _insert_test_case(cursor, exercise_id, tc.get('input', ''), tc['expected_output'],
+                              tc.get('is_hidden', False))
 
         conn.commit()
         conn.close()
@@ -87,7 +130,8 @@ def read_exercise(exercise_id):
     return exercise_dict
 
 
-def update_exercise(exercise_id, title=None, description=None, difficulty=None):
+def update_exercise(exercise_id, title=None, description=None, difficulty=None, compile_profile=None,
+                    compare_mode=None, checker_code=None, reference_code=None, generator_code=None):
     """
     Update an existing exercise
 
@@ -96,6 +140,13 @@ def update_exercise(exercise_id, title=None, description=None, difficulty=None):
         title (str, optional): New title
         description (str, optional): New description
         difficulty (str, optional): New difficulty level
+        compile_profile (str, optional): New compiler flag profile from run_cpp.COMPILE_PROFILES
+        compare_mode (str, optional): New output compare mode (see output_compare)
+        checker_code (str, optional): New C++ checker program, "" to remove it
+        reference_code (str, optional): New model solution, "" to remove it; the time and memory
+            limits stay until calibrate.calibrate_exercise is run again
+        generator_code (str, optional): New test generator program, "" to remove it; the
+            generated test cases stay until generate_tests.generate_test_cases is run again
 
     Returns:
         tuple: (success bool, message string)
@@ -126,6 +177,32 @@ def update_exercise(exercise_id, title=None, description=None, difficulty=None):
             update_fields.append("difficulty = ?")
             params.append(difficulty)
 
+        if compile_profile is not None:
+            if compile_profile not in COMPILE_PROFILES:
+                conn.close()
+                return False, f"Unknown compile profile '{compile_profile}'"
+            update_fields.append("compile_profile = ?")
+            params.append(compile_profile)
+
+        if compare_mode is not None:
+            if not is_valid_compare_mode(compare_mode):
+                conn.close()
+                return False, f"Unknown compare mode '{compare_mode}'"
+            update_fields.append("compare_mode = ?")
+            params.append(compare_mode)
+
+        if checker_code is not None:
+            update_fields.append("checker_code = ?")
+            params.append(checker_code or None)
+
+        if reference_code is not None:
+            update_fields.append("reference_code = ?")
+            params.append(reference_code or None)
+
+        if generator_code is not None:
+            update_fields.append("generator_code = ?")
+            params.append(generator_code or None)
+
         if not update_fields:
             conn.close()
             return False, "No fields provided for update"
@@ -135,6 +212,11 @@ def update_exercise(exercise_id, title=None, description=None, difficulty=None):
         params.append(exercise_id)
 
         cursor.execute(query, params)
+
+        # These change how submissions are graded
+        if compile_profile is not None or compare_mode is not None or checker_code is not None:
+            bump_suite_version(cursor, exercise_id)
+
         conn.commit()
         conn.close()
 
@@ -173,6 +255,9 @@ def delete_exercise(exercise_id):
         # Delete related records from submissions
         cursor.execute("DELETE FROM submissions WHERE exercise_id = ?", (exercise_id,))
 
+        # Drop cached grading results
+        bump_suite_version(cursor, exercise_id)
+
         # Delete related records from test_cases
         cursor.execute("DELETE FROM test_cases WHERE exercise_id = ?", (exercise_id,))
 
@@ -197,6 +282,8 @@ def add_test_case(exercise_id, input_data, expected_output, is_hidden=False):
     """
     Add a test case to an existing exercise
 
+    Stored submissions keep their old verdicts until rejudge.rejudge_exercise is run.
+
     Args:
         exercise_id (int): Exercise ID
         input_data (str): Test case input
@@ -217,12 +304,8 @@ def add_test_case(exercise_id, input_data, expected_output, is_hidden=False):
             return False, f"Exercise with ID {exercise_id} not found"
 
         # Insert test case
-        cursor.execute(
-            "INSERT INTO test_cases (exercise_id, input, expected_output, is_hidden) VALUES (?, ?, ?, ?)",
-            (exercise_id, input_data, expected_output, is_hidden)
-        )
-
-        test_case_id = cursor.lastrowid
+        test_case_id = _insert_test_case(cursor, exercise_id, input_data, expected_output, is_hidden)
+        bump_suite_version(cursor, exercise_id)
         conn.commit()
         conn.close()
 
@@ -232,10 +315,64 @@ def add_test_case(exercise_id, input_data, expected_output, is_hidden=False):
         return False, f"Error adding test case: {str(e)}"
 
 
+def add_test_cases(exercise_id, test_cases, replace_generated=False):
+    """
+    Add many test cases to an existing exercise in one transaction
+
+    Either all of the test cases are added or, on an error, none of them.
+
+    Args:
+        exercise_id (int): Exercise ID
+        test_cases (list): Dictionaries with keys 'input', 'expected_output', 'is_hidden' and
+            optionally 'generator_seed' (see generate_tests.py)
+        replace_generated (bool): Delete the exercise's earlier generated test cases first
+
+    Returns:
+        tuple: (success bool, message string)
+    """
+    try:
+        conn = connect_db()
+        cursor = conn.cursor()
+
+        # Check if exercise exists
+        cursor.execute("SELECT id FROM exercises WHERE id = ?", (exercise_id,))
+        if not cursor.fetchone():
+            conn.close()
+            return False, f"Exercise with ID {exercise_id} not found"
+
+        try:
+            replaced = 0
+            if replace_generated:
+                cursor.execute("DELETE FROM test_cases WHERE exercise_id = ? AND generator_seed IS NOT NULL",
+                               (exercise_id,))
+                replaced = cursor.rowcount
+
+            for tc in test_cases:
+                _insert_test_case(cursor, exercise_id, tc.get('input', ''), tc['expected_output'],
+                                  tc.get('is_hidden', False), tc.get('generator_seed'))
+            bump_suite_version(cursor, exercise_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        message = f"Added {len(test_cases)} test cases to exercise {exercise_id}"
+        if replaced:
+            message += f", replacing {replaced} generated ones"
+        return True, message
+
+    except Exception as e:
+        return False, f"Error adding test cases: {str(e)}"
+
+
 def delete_test_case(test_case_id):
     """
     Delete a test case
 
+    Stored submissions keep their old verdicts until rejudge.rejudge_exercise is run.
+
     Args:
         test_case_id (int): Test case ID
 
@@ -247,13 +384,15 @@ def delete_test_case(test_case_id):
         cursor = conn.cursor()
 
         # Check if test case exists
-        cursor.execute("SELECT id FROM test_cases WHERE id = ?", (test_case_id,))
-        if not cursor.fetchone():
+        cursor.execute("SELECT exercise_id FROM test_cases WHERE id = ?", (test_case_id,))
+        test_case = cursor.fetchone()
+        if not test_case:
             conn.close()
             return False, f"Test case with ID {test_case_id} not found"
 
         # Delete test case
         cursor.execute("DELETE FROM test_cases WHERE id = ?", (test_case_id,))
+        bump_suite_version(cursor, test_case['exercise_id'])
 
         conn.commit()
         conn.close()
@@ -306,9 +445,12 @@ def get_submission_history(exercise_id):
 
     conn.close()
     return submissions
-# To delete an exercise:
-success, message = delete_exercise(exercise_id=3)
-if success:
-    print(message)  # Exercise with ID 5 and all related data deleted successfully
-else:
-    print(message)  # Will show error message if deletion failed
\ No newline at end of file
+
+
+if __name__ == "__main__":
+    # To delete an exercise:
+    success, message = delete_exercise(exercise_id=3)
+    if success:
+        print(message)  # Exercise with ID 5 and all related data deleted successfully
+    else:
+        print(message)  # Will show error message if deletion failed
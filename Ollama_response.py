@@ -1,11 +1,17 @@
 import ollama
-import requests
-import json
 import re
 import asyncio
+import hashlib
+import os
+import queue
+import threading
+from collections import OrderedDict
 from ollama import AsyncClient
 
-messages = []
+from context_window import SUMMARY_BUDGET, ContextWindow, transcript
+from dataBase.chat_history_DB import get_messages
+from llm_cache import get_response_cache, make_response_key
+
 MODEL = "llama3.2:3b"
 
 system_promt = {
@@ -19,9 +25,67 @@ system_promt = {
         "5. Do not answer if the question lacks context. If context is lacking, ask the user to provide it."
     )
 }
-messages.append(system_promt)
+
+# Part of every response cache key, so cached replies go stale when the system prompt changes
+PROMPT_VERSION = hashlib.sha256(system_promt['content'].encode('utf-8')).hexdigest()[:12]
+
+summary_promt = (
+    "Summarize this conversation between a student and a C++ tutor for the tutor's own memory. "
+    "Keep the student's goal, the code and names being discussed and what was already explained. "
+    "Answer with the summary only, at most 150 words."
+)
 
 gl=2
+
+# One event loop for every Ollama request, running on a background thread for the
+# lifetime of the process, and one client on it whose HTTP connections stay open
+_loop = None
+_loop_lock = threading.Lock()
+_client = None
+_DONE = object()
+
+
+def get_event_loop():
+    """
+    Get the background event loop Ollama requests run on, starting it on first use
+
+    Returns:
+        asyncio.AbstractEventLoop: The running loop
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="ollama-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def get_client():
+    """Get the shared AsyncClient; only call this from coroutines running on get_event_loop()"""
+    global _client
+    if _client is None:
+        _client = AsyncClient()
+    return _client
+
+
+def submit(coro):
+    """
+    Schedule a coroutine on the background loop, from any thread
+
+    Args:
+        coro: Coroutine, e.g. send_receive_response(...)
+
+    Returns:
+        concurrent.futures.Future: Its result
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def run(coro, timeout=None):
+    """Run a coroutine on the background loop and wait for its result, instead of asyncio.run"""
+    return submit(coro).result(timeout)
+
 # chia code và text
 def separate_code_and_text(text):
     pattern = r'```(?:[\w]+)\n([\s\S]*?)```'
@@ -46,43 +110,186 @@ def separate_code_and_text(text):
 
     return result
 
-def chuyen_tublpe_sang_dict(data_input:tuple)->dict:
-    for items in data_input:
-        messages.append({
-            'role': items[0],
-            'content': items[2],
-        })
-
-def load_old_message(old_mess):
-    messages.clear()
-    chuyen_tublpe_sang_dict(old_mess)
-
-def new_chat():
-    messages.clear()
-
-async def send_receive_response(user_promt):
-    client = AsyncClient()
-    messages.append(
-        {
-            'role': 'user',
-            'content': user_promt,
-        }
-    )
-    response = await client.chat(model=MODEL,
-                                 messages=messages,
-                                 stream=False,
-                                 )
-    assistant_reply = response['message']['content']
-    res_da_xu_li=separate_code_and_text(assistant_reply)
-    # print(assistant_reply)
-    messages.append(
-        {
-            'role': 'assistant',
-            'content': assistant_reply,
-        }
-    )
+def chuyen_tublpe_sang_dict(data_input:tuple)->list:
+    return [{
+        'role': items[0],
+        'content': items[2],
+    } for items in data_input]
 
-    return res_da_xu_li,assistant_reply
+
+async def summarize_messages(summary, old_messages):
+    """Fold messages that no longer fit in the context window into the rolling summary"""
+    content = transcript(old_messages)
+    if summary:
+        content = f"Earlier summary: {summary}\n\n{content}"
+    response = await get_client().chat(model=MODEL,
+                                       messages=[{'role': 'system', 'content': summary_promt},
+                                                 {'role': 'user', 'content': content}],
+                                       stream=False,
+                                       options={'num_predict': SUMMARY_BUDGET},
+                                       )
+    return response['message']['content'].strip()
+
+
+# Conversations of the chat sessions (session_id -> ContextWindow), the most recently used
+# last; the rest are dropped and loaded again from the chat history when they come back
+MAX_SESSIONS = int(os.environ.get("OLLAMA_MAX_SESSIONS", "200"))
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+_session_stats = {'hits': 0, 'rehydrated': 0, 'evicted': 0}
+
+
+def new_conversation(old_mess=()):
+    """A conversation starting from (role, type, message) rows of the chat history"""
+    conversation = ContextWindow(system_promt, summarize=summarize_messages)
+    conversation.reset(chuyen_tublpe_sang_dict(old_mess))
+    return conversation
 
 
+def get_conversation(session_id):
+    """
+    Get the conversation of a chat session
 
+    Args:
+        session_id (str): Chat session ID, as stored by chat_history_DB.save_message
+
+    Returns:
+        ContextWindow: The session's conversation, loaded from the chat history if it was not in memory
+    """
+    with _sessions_lock:
+        if session_id in _sessions:
+            _sessions.move_to_end(session_id)
+            _session_stats['hits'] += 1
+            return _sessions[session_id]
+
+        conversation = new_conversation(get_messages(session_id))
+        _sessions[session_id] = conversation
+        _session_stats['rehydrated'] += 1
+        while len(_sessions) > MAX_SESSIONS:
+            _sessions.popitem(last=False)
+            _session_stats['evicted'] += 1
+        return conversation
+
+
+def forget_session(session_id):
+    """Drop a session's conversation from memory, e.g. after it was deleted from the history"""
+    with _sessions_lock:
+        _sessions.pop(session_id, None)
+
+
+def get_session_stats():
+    """Sessions held in memory and how often a request found its session there"""
+    with _sessions_lock:
+        return dict(_session_stats, sessions=len(_sessions), max_sessions=MAX_SESSIONS)
+
+
+async def stream_response(user_promt, session_id=None, cache=None):
+    """
+    Ask the model and yield its reply a token at a time, as Ollama generates it
+
+    The question is added to the session's conversation right away and the reply,
+    as far as it got, once the stream ends. If the model fails before replying at
+    all, the question is taken out again, so the conversation never holds an
+    empty assistant turn.
+
+    Args:
+        user_promt (str): The user's message
+        session_id (str, optional): Chat session the message belongs to; without one the
+            message is answered on its own, outside any conversation
+        cache (str, optional): Kind of prompt ('chat' or 'review') to answer from the response
+            cache when possible; only messages that start a conversation are cached, since the
+            reply to anything later depends on what came before. 'chat' prompts are matched
+            ignoring case, unless they contain a code fence
+
+    Yields:
+        str: Pieces of the assistant's reply; a cached reply comes as one piece
+    """
+    client = get_client()
+    conversation = get_conversation(session_id) if session_id else new_conversation()
+    last = conversation.messages[-1] if conversation.messages else None
+    # A session loaded from the history may already end with this question, saved before asking
+    added = not (last and last['role'] == 'user' and last['content'] == user_promt)
+    if added:
+        conversation.append(
+            {
+                'role': 'user',
+                'content': user_promt,
+            }
+        )
+
+    cache_key = None
+    if cache and len(conversation.messages) == 1:
+        cache_key = make_response_key(MODEL, PROMPT_VERSION, user_promt, casefold=(cache == 'chat'))
+        cached = get_response_cache().get(cache_key, cache)
+        if cached is not None:
+            conversation.append({'role': 'assistant', 'content': cached})
+            yield cached
+            return
+
+    reply = []
+    try:
+        async for part in await client.chat(model=MODEL,
+                                            messages=await conversation.prompt_messages(),
+                                            stream=True,
+                                            ):
+            token = part['message']['content']
+            if token:
+                reply.append(token)
+                yield token
+        # Only complete replies are worth reusing
+        if cache_key and reply:
+            get_response_cache().put(cache_key, ''.join(reply), cache)
+    finally:
+        if reply:
+            conversation.append(
+                {
+                    'role': 'assistant',
+                    'content': ''.join(reply),
+                }
+            )
+        elif added and conversation.messages and conversation.messages[-1]['role'] == 'user':
+            conversation.messages.pop()
+
+
+def iter_response(user_promt, session_id=None, cache=None):
+    """
+    stream_response for synchronous callers such as st.write_stream
+
+    The stream runs on the background loop and hands tokens over through a queue;
+    closing the generator early cancels it.
+
+    Args:
+        user_promt (str): The user's message
+        session_id (str, optional): Chat session the message belongs to
+        cache (str, optional): Kind of prompt to answer from the response cache (see stream_response)
+
+    Yields:
+        str: Pieces of the assistant's reply
+    """
+    tokens = queue.Queue()
+
+    async def pump():
+        try:
+            async for token in stream_response(user_promt, session_id, cache):
+                tokens.put(token)
+        finally:
+            tokens.put(_DONE)
+
+    future = submit(pump())
+    try:
+        while (token := tokens.get()) is not _DONE:
+            yield token
+        # Raises what went wrong, if anything
+        future.result()
+    finally:
+        future.cancel()
+
+
+async def send_receive_response(user_promt, session_id=None, cache=None):
+    reply = []
+    async for token in stream_response(user_promt, session_id, cache):
+        reply.append(token)
+    assistant_reply = ''.join(reply)
+    res_da_xu_li=separate_code_and_text(assistant_reply)
+
+    return res_da_xu_li,assistant_reply
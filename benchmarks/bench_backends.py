@@ -0,0 +1,154 @@
+"""
+Compare per-submission grading latency of the three executor backends.
+
+Usage:
+    python benchmarks/bench_backends.py [--repeat N] [--tests N] [--json]
+
+Backends:
+    local    exercise_handler.check_submission (no isolation)
+    sandbox  local_sandbox.run_code_in_sandbox (rlimits + network namespace)
+    docker   docker_runner.run_code_in_docker (warm container pool); skipped
+             when Docker or the runner image is not available
+
+"cold" submissions are unique sources that have to be compiled, "warm" ones
+repeat the same source and are served by the compile cache. Everything runs in
+a scratch directory, so the real database and caches are left alone.
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SOLUTION = """#include <iostream>
+using namespace std;
+int main() {
+    long long a, b;
+    cin >> a >> b;
+    cout << "Sum: " << (a + b) << endl;
+    return 0;
+}
+"""
+
+
+def make_test_cases(count):
+    return [{'input': f"{i}\n{i * 7}", 'expected_output': f"Sum: {i * 8}", 'is_hidden': False} for i in range(count)]
+
+
+def setup_local_exercise(test_cases):
+    """Create a scratch exercise database for check_submission and return the exercise id"""
+    import exercise_handler
+
+    exercise_handler.DB_PATH = os.path.abspath("exercises.db")
+    exercise_handler.create_tables_if_not_exist()
+    conn = sqlite3.connect(exercise_handler.DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO exercises (title, description, difficulty) VALUES ('Bench', 'Sum', 'Easy')")
+    exercise_id = cursor.lastrowid
+    cursor.executemany(
+        "INSERT INTO test_cases (exercise_id, input, expected_output, is_hidden) VALUES (?, ?, ?, ?)",
+        [(exercise_id, tc['input'], tc['expected_output'], tc['is_hidden']) for tc in test_cases]
+    )
+    conn.commit()
+    conn.close()
+    return exercise_id
+
+
+def docker_available():
+    """Whether Docker runs and the runner image has been built"""
+    if not shutil.which("docker"):
+        return False
+    from docker_runner import RUNNER_IMAGE
+    result = subprocess.run(["docker", "image", "inspect", RUNNER_IMAGE], capture_output=True)
+    return result.returncode == 0
+
+
+def make_graders(test_cases):
+    """Build name -> grade(source) callables for the available backends"""
+    from docker_runner import run_code_in_docker
+    from exercise_handler import check_submission
+    from local_sandbox import run_code_in_sandbox
+
+    exercise_id = setup_local_exercise(test_cases)
+
+    def grade_local(source):
+        with tempfile.NamedTemporaryFile('w', suffix=".cpp", delete=False) as f:
+            f.write(source)
+        try:
+            return check_submission(exercise_id, f.name)
+        finally:
+            os.unlink(f.name)
+
+    graders = {
+        'local': grade_local,
+        'sandbox': lambda source: run_code_in_sandbox(source, test_cases)
+    }
+    if docker_available():
+        graders['docker'] = lambda source: run_code_in_docker(source, test_cases)
+    return graders
+
+
+def measure(grade, sources, expected_passed):
+    """Grade each source in turn and return the latencies in seconds"""
+    latencies = []
+    for source in sources:
+        start = time.perf_counter()
+        results = grade(source)
+        latencies.append(time.perf_counter() - start)
+        if results['passed_tests'] != expected_passed:
+            raise RuntimeError(f"Unexpected result: {results['feedback'][:200]}")
+    return latencies
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        'median': round(statistics.median(latencies), 4),
+        'p90': round(latencies[int(0.9 * (len(latencies) - 1))], 4),
+        'min': round(latencies[0], 4),
+        'max': round(latencies[-1], 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare grading latency of the executor backends")
+    parser.add_argument("--repeat", type=int, default=10, help="Submissions per backend and scenario")
+    parser.add_argument("--tests", type=int, default=10, help="Test cases per submission")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    test_cases = make_test_cases(args.tests)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench-backends-") as scratch:
+        os.chdir(scratch)
+        os.makedirs("dataBase", exist_ok=True)
+        for name, grade in make_graders(test_cases).items():
+            # Warm up the backend (pool start, first compile) outside the measurements
+            grade(SOLUTION)
+            cold = [f"{SOLUTION}// {name} {i} {time.time()}\n" for i in range(args.repeat)]
+            results[name] = {
+                'cold': summarize(measure(grade, cold, len(test_cases))),
+                'warm': summarize(measure(grade, [SOLUTION] * args.repeat, len(test_cases)))
+            }
+
+    if args.json:
+        print(json.dumps({'tests_per_submission': args.tests, 'results': results}, indent=2))
+        return
+
+    print(f"Per-submission latency, {args.tests} tests each (seconds)")
+    print(f"{'backend':<10}{'scenario':<10}{'median':>10}{'p90':>10}{'min':>10}{'max':>10}")
+    for name, scenarios in results.items():
+        for scenario, stats in scenarios.items():
+            print(f"{name:<10}{scenario:<10}{stats['median']:>10.3f}{stats['p90']:>10.3f}"
+                  f"{stats['min']:>10.3f}{stats['max']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark g++ compile time of typical submissions with and without the
+precompiled headers the cpp-runner image ships.
+
+Usage:
+    python benchmarks/bench_compile.py [--repeat N] [--json]
+
+Runs against the local g++; run it inside the runner image
+(`docker run --rm --entrypoint python3 cpp-runner:<version> ...`) to measure
+the image itself.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import run_cpp  # noqa: E402
+
+# Typical student programs, one per common first include
+PROGRAMS = {
+    "iostream": """#include <iostream>
+using namespace std;
+int main() {
+    int a, b;
+    cin >> a >> b;
+    cout << "Sum: " << (a + b) << endl;
+    return 0;
+}
+""",
+    "vector": """#include <vector>
+#include <iostream>
+using namespace std;
+int main() {
+    int n;
+    cin >> n;
+    vector<int> v(n);
+    for (int &x : v) cin >> x;
+    long long s = 0;
+    for (int x : v) s += x;
+    cout << s << endl;
+}
+""",
+    "bits/stdc++.h": """#include <bits/stdc++.h>
+using namespace std;
+int main() {
+    int n;
+    cin >> n;
+    vector<int> v(n);
+    for (int &x : v) cin >> x;
+    sort(v.begin(), v.end());
+    map<int, int> counts;
+    for (int x : v) counts[x]++;
+    cout << counts.size() << endl;
+}
+""",
+}
+
+
+def time_compile(source_path, flags, repeat):
+    """Median wall time of compiling a file with the given flags"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(["g++", source_path, "-o", source_path + ".out"] + flags, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compile time with and without precompiled headers")
+    parser.add_argument("--repeat", type=int, default=5, help="Compilations per measurement")
+    parser.add_argument("--profiles", nargs="*", default=list(run_cpp.COMPILE_PROFILES), help="Profiles to measure")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pch_dir = os.path.join(temp_dir, "pch")
+        start = time.perf_counter()
+        run_cpp.build_pch(pch_dir)
+        pch_build_time = time.perf_counter() - start
+
+        for header, program in PROGRAMS.items():
+            source_path = os.path.join(temp_dir, "solution.cpp")
+            with open(source_path, "w") as f:
+                f.write(program)
+
+            for profile in args.profiles:
+                flags = run_cpp.compile_flags(profile)
+                before = time_compile(source_path, flags, args.repeat)
+                after = time_compile(source_path, flags + ["-I", pch_dir], args.repeat)
+                results.append({
+                    "include": header,
+                    "profile": profile,
+                    "without_pch": round(before, 4),
+                    "with_pch": round(after, 4),
+                    "speedup": round(before / after, 2)
+                })
+
+    if args.json:
+        print(json.dumps({"pch_build_time": round(pch_build_time, 2), "results": results}, indent=2))
+        return
+
+    print(f"Precompiled headers built in {pch_build_time:.1f}s")
+    print(f"{'include':<15}{'profile':<12}{'without':>10}{'with':>10}{'speedup':>10}")
+    for row in results:
+        print(f"{row['include']:<15}{row['profile']:<12}{row['without_pch']:>9.3f}s{row['with_pch']:>9.3f}s"
+              f"{row['speedup']:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+End-to-end grading pipeline benchmark: where a submission's time goes, and how
+many submissions per second the graders sustain.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--repeat N] [--concurrency 1,2,4,8] [--submissions N]
+                                        [--fake] [--fake-start-ms MS] [--output FILE] [--compare OLD.json]
+
+Backends:
+    local    exercise_handler.check_submission
+    docker   docker_runner.run_code_in_docker on the warm container pool; when
+             Docker or the runner image is not available (or with --fake), a
+             fake executor stands in: run_code_in_sandbox behind a simulated
+             container start of --fake-start-ms
+
+Every backend grades a fixed corpus (see CORPUS) and saves each result with
+exercise_handler.save_submission. Phases, in seconds:
+    container_start  submit to the compile event less the compile itself (queue
+                     wait, container dispatch, job transfer); docker only
+    compile          g++ time reported by the runner
+    per_test_run     median wall time of the tests that ran
+    result_parsing   turning runner output into the result dict and feedback
+    db_save          save_submission
+    total            submit to saved
+Throughput (submissions per second, graded and saved) is measured with that
+many submissions in flight at each --concurrency level.
+
+Every submission is a unique source, so the grading result cache and the
+compile cache never answer for it. Everything runs in a scratch directory and
+the JSON report (--output, or stdout) carries the commit and runner image
+version; --compare prints the relative change against an earlier report.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SUM_SOLUTION = """#include <iostream>
+using namespace std;
+int main() {
+    long long a, b;
+    cin >> a >> b;
+    cout << "Sum: " << (a + b) << endl;
+    return 0;
+}
+"""
+
+
+def _sum_tests(count):
+    return [{'input': f"{i}\n{i * 7}", 'expected_output': f"Sum: {i * 8}", 'is_hidden': False} for i in range(count)]
+
+
+# name -> source, test cases, per-test timeout and tests expected to pass
+CORPUS = {
+    'correct': {
+        'source': SUM_SOLUTION,
+        'tests': _sum_tests(10),
+        'timeout': 5,
+        'passed': 10
+    },
+    'compile_error': {
+        'source': "#include <iostream>\nint main() {\n    std::cout << undefined_name;\n}\n",
+        'tests': _sum_tests(10),
+        'timeout': 5,
+        'passed': 0
+    },
+    'tle': {
+        'source': "int main() {\n    volatile unsigned long long i = 0;\n    while (true) i++;\n}\n",
+        'tests': _sum_tests(2),
+        'timeout': 1,
+        'passed': 0
+    },
+    'huge_output': {
+        'source': "#include <cstdio>\nint main() {\n    while (true) puts(\"spam spam spam spam spam spam\");\n}\n",
+        'tests': _sum_tests(2),
+        'timeout': 5,
+        'passed': 0
+    },
+    'many_tests': {
+        'source': SUM_SOLUTION,
+        'tests': _sum_tests(200),
+        'timeout': 5,
+        'passed': 200
+    }
+}
+
+THROUGHPUT_CASES = ['correct', 'compile_error', 'many_tests']
+
+PHASES = ['container_start', 'compile', 'per_test_run', 'result_parsing', 'db_save', 'total']
+
+_phase_times = threading.local()
+
+
+def _timed(func, phase):
+    """Wrap a pipeline function so the calling thread records how long it took"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            setattr(_phase_times, phase, getattr(_phase_times, phase, 0.0) + time.perf_counter() - start)
+    return wrapper
+
+
+def instrument():
+    """Time result parsing in every backend; the wrapped functions are looked up at call time"""
+    import docker_runner
+    import exercise_handler
+    import local_sandbox
+
+    docker_runner.format_results = _timed(docker_runner.format_results, 'result_parsing')
+    local_sandbox.format_results = docker_runner.format_results
+    exercise_handler._build_feedback = _timed(exercise_handler._build_feedback, 'result_parsing')
+
+
+def unique_source(source, tag):
+    """A source nothing has been cached for yet"""
+    return f"{source}// {tag} {time.time_ns()}\n"
+
+
+def setup_exercises():
+    """Create one scratch exercise per corpus case and return name -> exercise id"""
+    import exercise_handler
+
+    exercise_handler.DB_PATH = os.path.abspath("exercises.db")
+    exercise_handler.create_tables_if_not_exist()
+    conn = sqlite3.connect(exercise_handler.DB_PATH)
+    cursor = conn.cursor()
+    exercise_ids = {}
+    for name, case in CORPUS.items():
+        cursor.execute("INSERT INTO exercises (title, description, difficulty) VALUES (?, 'Benchmark', 'Easy')",
+                       (name,))
+        exercise_ids[name] = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO test_cases (exercise_id, input, expected_output, is_hidden) VALUES (?, ?, ?, ?)",
+            [(cursor.lastrowid, tc['input'], tc['expected_output'], tc['is_hidden']) for tc in case['tests']]
+        )
+    conn.commit()
+    conn.close()
+    return exercise_ids
+
+
+def docker_available():
+    """Whether Docker runs and the runner image has been built"""
+    if not shutil.which("docker"):
+        return False
+    from docker_runner import RUNNER_IMAGE
+    result = subprocess.run(["docker", "image", "inspect", RUNNER_IMAGE], capture_output=True)
+    return result.returncode == 0
+
+
+def make_fake_executor(start_delay):
+    """Stand-in for run_code_in_docker: the local sandbox behind a simulated container start"""
+    from local_sandbox import run_code_in_sandbox
+
+    def fake_run_code_in_docker(code_str, test_cases, timeout=5, on_event=None, **options):
+        time.sleep(start_delay)
+        return run_code_in_sandbox(code_str, test_cases, timeout=timeout, on_event=on_event, **options)
+    return fake_run_code_in_docker
+
+
+def make_graders(exercise_ids, use_fake, fake_start):
+    """
+    Build the backends
+
+    Returns:
+        tuple: (name -> grade(case name, source, on_event) callable, executor behind 'docker')
+    """
+    from exercise_handler import check_submission
+
+    def grade_local(name, source, on_event):
+        with tempfile.NamedTemporaryFile('w', suffix=".cpp", delete=False) as f:
+            f.write(source)
+        try:
+            return check_submission(exercise_ids[name], f.name, timeout=CORPUS[name]['timeout'], on_event=on_event)
+        finally:
+            os.unlink(f.name)
+
+    if use_fake:
+        run_docker = make_fake_executor(fake_start)
+        executor = "fake"
+    else:
+        from docker_runner import run_code_in_docker as run_docker
+        executor = "docker"
+
+    def grade_docker(name, source, on_event):
+        case = CORPUS[name]
+        return run_docker(source, case['tests'], timeout=case['timeout'], on_event=on_event)
+
+    return {'local': grade_local, 'docker': grade_docker}, executor
+
+
+def grade_and_save(grade, backend, exercise_ids, name, tag):
+    """
+    Grade one unique submission of a corpus case and save it
+
+    Returns:
+        dict: Seconds spent in each phase
+    """
+    from exercise_handler import save_submission
+
+    _phase_times.result_parsing = 0.0
+    source = unique_source(CORPUS[name]['source'], f"{backend} {tag}")
+    marks = {}
+
+    def on_event(event):
+        if event['event'] == 'compile' and 'compiled' not in marks:
+            marks['compiled'] = time.perf_counter()
+            marks['compile_time'] = event['compilation'].get('time') or 0.0
+
+    start = time.perf_counter()
+    results = grade(name, source, on_event)
+    graded = time.perf_counter()
+    save_submission(exercise_ids[name], source, results)
+    saved = time.perf_counter()
+
+    if results['passed_tests'] != CORPUS[name]['passed']:
+        raise RuntimeError(f"Unexpected result for {name}: {results['feedback'][:300]}")
+
+    test_times = [test['time'] for test in results.get('details') or results.get('test_results') or []
+                  if not test.get('skipped') and test.get('time') is not None]
+    phases = {
+        'compile': marks.get('compile_time', 0.0),
+        'per_test_run': statistics.median(test_times) if test_times else None,
+        'result_parsing': _phase_times.result_parsing,
+        'db_save': saved - graded,
+        'total': saved - start
+    }
+    if backend == 'docker' and 'compiled' in marks:
+        phases['container_start'] = max(0.0, marks['compiled'] - start - phases['compile'])
+    return phases
+
+
+def summarize(values):
+    values = sorted(value for value in values if value is not None)
+    if not values:
+        return None
+    return {
+        'median': round(statistics.median(values), 5),
+        'p90': round(values[math.ceil(0.9 * len(values)) - 1], 5),
+        'max': round(values[-1], 5)
+    }
+
+
+def measure_phases(grade, backend, exercise_ids, repeat):
+    """Phase latencies of each corpus case, one submission at a time"""
+    report = {}
+    for name in CORPUS:
+        # Warm up outside the measurements (pool start, first compile of the case)
+        grade_and_save(grade, backend, exercise_ids, name, "warm-up")
+        runs = [grade_and_save(grade, backend, exercise_ids, name, str(i)) for i in range(repeat)]
+        report[name] = {phase: summarize([run.get(phase) for run in runs]) for phase in PHASES}
+    return report
+
+
+def measure_throughput(grade, backend, exercise_ids, concurrency_levels, submissions):
+    """Submissions graded and saved per second with several of them in flight"""
+    report = {}
+    for concurrency in concurrency_levels:
+        jobs = [THROUGHPUT_CASES[i % len(THROUGHPUT_CASES)] for i in range(submissions)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(grade_and_save, grade, backend, exercise_ids, name, f"c{concurrency} {i}")
+                           for i, name in enumerate(jobs)]:
+                future.result()
+        elapsed = time.perf_counter() - start
+        report[str(concurrency)] = {'submissions_per_second': round(submissions / elapsed, 3),
+                                    'seconds': round(elapsed, 3)}
+    return report
+
+
+def environment():
+    """What the numbers were measured on, for comparing reports between versions"""
+    from docker_runner import RUNNER_IMAGE_VERSION
+    from run_cpp import cpu_allowance
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'runner_image_version': RUNNER_IMAGE_VERSION,
+        'cpus': cpu_allowance(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+
+
+def compare(report, old_report):
+    """Print the relative change of every median latency and throughput against an older report"""
+    print(f"Compared with {old_report['environment'].get('commit')} (negative latency change is faster)")
+    for backend, cases in report['phases'].items():
+        for name, phases in cases.items():
+            for phase, stats in phases.items():
+                old = old_report.get('phases', {}).get(backend, {}).get(name, {}).get(phase)
+                if stats and old and old['median']:
+                    change = (stats['median'] - old['median']) / old['median'] * 100
+                    print(f"{backend:<8}{name:<15}{phase:<17}{old['median']:>10.4f} -> {stats['median']:<10.4f}"
+                          f"{change:+7.1f}%")
+    for backend, levels in report['throughput'].items():
+        for concurrency, stats in levels.items():
+            old = old_report.get('throughput', {}).get(backend, {}).get(concurrency)
+            if old:
+                change = (stats['submissions_per_second'] - old['submissions_per_second']) \
+                    / old['submissions_per_second'] * 100
+                print(f"{backend:<8}throughput x{concurrency:<10}{old['submissions_per_second']:>10.3f} -> "
+                      f"{stats['submissions_per_second']:<10.3f}{change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the grading pipeline end to end")
+    parser.add_argument("--repeat", type=int, default=5, help="Submissions per backend and corpus case")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Comma-separated submissions in flight")
+    parser.add_argument("--submissions", type=int, default=24, help="Submissions per throughput measurement")
+    parser.add_argument("--fake", action="store_true", help="Use the fake executor even if Docker is available")
+    parser.add_argument("--fake-start-ms", type=float, default=0, help="Simulated container start of the fake")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+    old_report = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            old_report = json.load(f)
+    output = os.path.abspath(args.output) if args.output else None
+
+    report = {'environment': environment(), 'phases': {}, 'throughput': {}}
+    with tempfile.TemporaryDirectory(prefix="bench-pipeline-") as scratch:
+        os.chdir(scratch)
+        os.makedirs("dataBase", exist_ok=True)
+        instrument()
+        exercise_ids = setup_exercises()
+        graders, executor = make_graders(exercise_ids, args.fake or not docker_available(),
+                                         args.fake_start_ms / 1000)
+        report['environment']['docker_executor'] = executor
+
+        for backend, grade in graders.items():
+            report['phases'][backend] = measure_phases(grade, backend, exercise_ids, args.repeat)
+            report['throughput'][backend] = measure_throughput(grade, backend, exercise_ids, concurrency_levels,
+                                                               args.submissions)
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if old_report:
+        compare(report, old_report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Measure the per-test overhead of where runner scratch data lives.
+
+Usage:
+    python benchmarks/bench_scratch.py [--tests N] [--repeat N] [--json]
+
+Scenarios:
+    stdin       Feeding one test's input to the program: through a temporary file
+                on disk (how check_submission used to do it) against piping it
+                straight into the program's stdin
+    work_dir    One job's scratch files (source, binary, checker input/output
+                files) written to and removed from the system temp directory
+                against /dev/shm, the same kind of tmpfs the runner containers get
+    docker      run_code_in_docker per-test overhead with and without the tmpfs
+                scratch mount, one-shot and pooled; skipped when Docker or the
+                runner image is not available
+
+Per-test overhead is the time added by each extra test, so compile time and
+container start-up cancel out.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ECHO_SOLUTION = """#include <iostream>
+#include <string>
+int main() {
+    std::ios::sync_with_stdio(false);
+    std::string line;
+    long long lines = 0;
+    while (std::getline(std::cin, line)) lines++;
+    std::cout << lines << std::endl;
+    return 0;
+}
+"""
+
+INPUT_SIZES = {'small': 64, 'large': 1024 * 1024}
+
+
+def make_input(size):
+    line = "1 2 3 4 5 6 7 8 9 10 11 12 13 14 15\n"
+    return (line * (size // len(line) + 1))[:size]
+
+
+def median_ms(times):
+    return round(statistics.median(times) * 1000, 3)
+
+
+def run_via_temp_file(binary_path, test_input):
+    """The old local path: write the input to a temporary file and open it as stdin"""
+    from run_cpp import run_with_timeout
+
+    with tempfile.NamedTemporaryFile('w', delete=False) as input_file:
+        input_file.write(test_input)
+        input_path = input_file.name
+    with open(input_path, 'r') as stdin:
+        result = run_with_timeout([binary_path], timeout=10, stdin=stdin)
+    os.unlink(input_path)
+    return result
+
+
+def run_via_pipe(binary_path, test_input):
+    """The current local path: pipe the input into the program"""
+    from run_cpp import run_with_timeout
+
+    return run_with_timeout([binary_path], test_input, timeout=10)
+
+
+def bench_stdin(binary_path, repeat):
+    results = {}
+    for name, size in INPUT_SIZES.items():
+        test_input = make_input(size)
+        results[name] = {}
+        for method, run in (('temp_file', run_via_temp_file), ('pipe', run_via_pipe)):
+            run(binary_path, test_input)
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run(binary_path, test_input)
+                times.append(time.perf_counter() - start)
+            results[name][method] = median_ms(times)
+    return results
+
+
+def scratch_roots():
+    roots = {'disk': tempfile.gettempdir()}
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        roots['tmpfs'] = "/dev/shm"
+    return roots
+
+
+def one_job(root, binary_path, tests, test_input):
+    """Write and remove the files a job leaves in its work directory"""
+    work_dir = tempfile.mkdtemp(prefix="bench-job-", dir=root)
+    try:
+        with open(os.path.join(work_dir, "solution.cpp"), 'w') as f:
+            f.write(ECHO_SOLUTION)
+        # A compile cache hit copies the binary in
+        shutil.copy(binary_path, os.path.join(work_dir, "solution.cpp.out"))
+        for i in range(tests):
+            # What run_checker writes for every test
+            for name in ("input.txt", "output.txt", "answer.txt"):
+                with open(os.path.join(work_dir, f"{i}-{name}"), 'w') as f:
+                    f.write(test_input)
+                    f.flush()
+                    os.fsync(f.fileno())
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_work_dir(binary_path, tests, repeat):
+    test_input = make_input(INPUT_SIZES['small'])
+    results = {}
+    for name, root in scratch_roots().items():
+        one_job(root, binary_path, tests, test_input)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            one_job(root, binary_path, tests, test_input)
+            times.append((time.perf_counter() - start) / tests)
+        results[name] = median_ms(times)
+    return results
+
+
+def docker_available():
+    """Whether Docker runs and the runner image has been built"""
+    if not shutil.which("docker"):
+        return False
+    from docker_runner import RUNNER_IMAGE
+    result = subprocess.run(["docker", "image", "inspect", RUNNER_IMAGE], capture_output=True)
+    return result.returncode == 0
+
+
+def per_test_overhead(grade, tests, repeat):
+    """Median time each test beyond the first adds to a submission"""
+    test_cases = [{'input': make_input(INPUT_SIZES['small']), 'expected_output': "1"} for _ in range(tests)]
+    grade(test_cases[:1])
+    one, many = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        grade(test_cases[:1])
+        one.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        grade(test_cases)
+        many.append(time.perf_counter() - start)
+    return round((statistics.median(many) - statistics.median(one)) / (tests - 1) * 1000, 3)
+
+
+def bench_docker(tests, repeat):
+    import docker_runner
+
+    results = {}
+    for scratch, size in (('disk', "0"), ('tmpfs', docker_runner.SCRATCH_SIZE)):
+        docker_runner.SCRATCH_SIZE = size
+        docker_runner._pool = None  # Pool containers get their mounts when they start
+        results[scratch] = {}
+        for mode, use_pool in (('one_shot', False), ('pool', True)):
+            results[scratch][mode] = per_test_overhead(
+                lambda test_cases: docker_runner.run_code_in_docker(ECHO_SOLUTION, test_cases, use_pool=use_pool),
+                tests, repeat
+            )
+        if docker_runner._pool:
+            docker_runner._pool.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-test overhead of runner scratch space")
+    parser.add_argument("--tests", type=int, default=20, help="Test cases per job")
+    parser.add_argument("--repeat", type=int, default=20, help="Measurements per scenario")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    from run_cpp import compile_source
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench-scratch-") as scratch:
+        code_path = os.path.join(scratch, "echo.cpp")
+        with open(code_path, 'w') as f:
+            f.write(ECHO_SOLUTION)
+        compile_source(code_path, f"{code_path}.out", flags=['-O2'])
+
+        results['stdin'] = bench_stdin(f"{code_path}.out", args.repeat * 5)
+        results['work_dir'] = bench_work_dir(f"{code_path}.out", args.tests, args.repeat)
+
+        os.chdir(scratch)
+        os.makedirs("dataBase", exist_ok=True)
+        if docker_available():
+            results['docker'] = bench_docker(args.tests, args.repeat)
+
+    if args.json:
+        print(json.dumps({'tests_per_job': args.tests, 'results': results}, indent=2))
+        return
+
+    print("Per-test overhead (milliseconds, median)")
+    for size, methods in results['stdin'].items():
+        print(f"stdin, {size} input: " + ", ".join(f"{method} {ms:.3f}" for method, ms in methods.items()))
+    print("work dir files: " + ", ".join(f"{root} {ms:.3f}" for root, ms in results['work_dir'].items()))
+    if 'docker' in results:
+        for scratch, modes in results['docker'].items():
+            print(f"docker, {scratch} scratch: " + ", ".join(f"{mode} {ms:.3f}" for mode, ms in modes.items()))
+    else:
+        print("docker: skipped, Docker or the runner image is not available")
+
+
+if __name__ == "__main__":
+    main()
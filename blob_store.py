@@ -0,0 +1,144 @@
+"""
+Content-addressed, gzip-compressed store for large test data.
+
+Test inputs and expected outputs longer than BLOB_THRESHOLD are kept here
+instead of in the test_cases table, which then holds only an excerpt and the
+blob's hash (input_blob / expected_blob). Blobs are named by the SHA-256 of
+their uncompressed content, so identical data is stored once, and are read back
+as streams: they are fed into the program's stdin and the output comparator a
+chunk at a time and never loaded whole.
+
+The store is a plain directory so it can be bind mounted read-only into the
+runner containers; this module is also copied into the cpp-runner image next to
+run_cpp.py.
+"""
+import gzip
+import hashlib
+import os
+import tempfile
+
+DEFAULT_BLOB_DIR = os.environ.get("TEST_BLOB_DIR", "dataBase/blobs")
+
+# Test data longer than this many characters is moved to the blob store
+BLOB_THRESHOLD = 64 * 1024
+# Characters of a stored blob kept inline for feedback and listings
+INLINE_EXCERPT = 2000
+
+COPY_CHUNK = 64 * 1024
+
+
+def _encode(data):
+    return data.encode("utf-8") if isinstance(data, str) else data
+
+
+class BlobStore:
+    """Directory of gzip-compressed blobs named by the hash of their content"""
+
+    def __init__(self, blob_dir=DEFAULT_BLOB_DIR):
+        self.blob_dir = blob_dir
+
+    def path(self, blob_hash):
+        """Path of a blob's file, fanned out by the first two hex digits"""
+        return os.path.join(self.blob_dir, blob_hash[:2], f"{blob_hash}.gz")
+
+    def exists(self, blob_hash):
+        return os.path.exists(self.path(blob_hash))
+
+    def _store(self, chunks):
+        """Compress chunks of bytes into a new blob, returning its hash"""
+        os.makedirs(self.blob_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.blob_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as compressed:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    compressed.write(chunk)
+
+            blob_hash = digest.hexdigest()
+            if self.exists(blob_hash):
+                os.unlink(temp_path)
+            else:
+                os.makedirs(os.path.dirname(self.path(blob_hash)), exist_ok=True)
+                # The runner user inside the containers has to be able to read it
+                os.chmod(temp_path, 0o644)
+                # Readers never see a half-written blob
+                os.replace(temp_path, self.path(blob_hash))
+            return blob_hash
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def put(self, data):
+        """
+        Store data, unless an identical blob is already there
+
+        Args:
+            data (str | bytes): Content; text is stored as UTF-8
+
+        Returns:
+            str: Hash of the blob
+        """
+        data = _encode(data)
+        blob_hash = hashlib.sha256(data).hexdigest()
+        if not self.exists(blob_hash):
+            self._store([data])
+        return blob_hash
+
+    def put_file(self, file_path):
+        """Store a file's content without reading it into memory, returning the blob's hash"""
+        with open(file_path, "rb") as f:
+            return self._store(iter(lambda: f.read(COPY_CHUNK), b""))
+
+    def open(self, blob_hash, binary=False):
+        """
+        Open a blob for streaming
+
+        Args:
+            blob_hash (str): Hash from put
+            binary (bool): Read bytes instead of text
+
+        Returns:
+            file: Decompressing stream over the blob's content
+
+        Raises:
+            FileNotFoundError: If there is no such blob
+        """
+        if binary:
+            return gzip.open(self.path(blob_hash), "rb")
+        return gzip.open(self.path(blob_hash), "rt", encoding="utf-8", errors="replace", newline="")
+
+    def read(self, blob_hash):
+        """Read a whole blob as text"""
+        with self.open(blob_hash) as f:
+            return f.read()
+
+
+_stores = {}
+
+
+def get_blob_store(blob_dir=DEFAULT_BLOB_DIR):
+    """Get the blob store for a directory, reusing it between calls"""
+    if blob_dir not in _stores:
+        _stores[blob_dir] = BlobStore(blob_dir)
+    return _stores[blob_dir]
+
+
+def split_test_data(data, store=None):
+    """
+    Decide where a test's input or expected output is kept
+
+    Args:
+        data (str): Test data
+        store (BlobStore, optional): Store for large data, the default one if not given
+
+    Returns:
+        tuple: (text for the test_cases column, blob hash or None); large data is put in
+            the blob store and only an excerpt of it is returned as the text
+    """
+    data = data or ''
+    if len(data) <= BLOB_THRESHOLD:
+        return data, None
+    blob_hash = (store or get_blob_store()).put(data)
+    return data[:INLINE_EXCERPT] + f"\n... ({len(data)} characters in total)", blob_hash
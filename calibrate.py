@@ -0,0 +1,208 @@
+"""
+Per-test time and memory limits derived from an exercise's reference solution.
+
+The reference solution (exercises.reference_code) is compiled like a submission
+and run several times on every test case. Each test then gets a time limit of
+TIME_FACTOR times the reference's median wall time plus TIME_SLACK, but at
+least MIN_TIME_LIMIT. Where the reference's peak memory could be measured, the
+test also gets a memory limit of MEMORY_FACTOR times that peak plus
+MEMORY_SLACK_KB. Graders use the time limit instead of their fixed timeout.
+A submission that breaks a limit fails the test with a "time limit exceeded"
+verdict quoting the reference's time (see run_cpp.limit_verdict). Tests that
+were never calibrated keep the fixed timeout.
+
+The limits are wall-clock times, so calibrate on the machine that grades.
+
+Usage:
+    python calibrate.py EXERCISE_ID [--runs N] [--clear]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+
+import exercise_handler
+from CURD_ex_data import bump_suite_version
+from output_compare import compare_output
+from run_cpp import compile_checker, compile_flags, compile_source, open_test_data, run_checker, run_with_timeout
+
+DEFAULT_RUNS = 5
+TIME_FACTOR = 3.0
+TIME_SLACK = 0.1  # Seconds, absorbs process start-up noise
+MIN_TIME_LIMIT = 0.5
+MEMORY_FACTOR = 2
+MEMORY_SLACK_KB = 64 * 1024
+# The reference solution itself is given this long per run
+CALIBRATION_TIMEOUT = 30
+
+
+def derive_limits(times, peaks):
+    """
+    Turn the reference solution's measurements on one test into its limits
+
+    Args:
+        times (list): Wall times of the runs in seconds
+        peaks (list): Peak memory of the runs in KB, None where it was not measurable
+
+    Returns:
+        dict: 'time_limit', 'memory_limit_kb' (None without measurements) and 'reference_time'
+    """
+    reference_time = statistics.median(times)
+    measured = [peak for peak in peaks if peak is not None]
+    return {
+        'time_limit': round(max(MIN_TIME_LIMIT, reference_time * TIME_FACTOR + TIME_SLACK), 3),
+        'memory_limit_kb': max(measured) * MEMORY_FACTOR + MEMORY_SLACK_KB if measured else None,
+        'reference_time': round(reference_time, 4)
+    }
+
+
+def _measure_test(binary_path, test, runs, compare_mode, checker_path):
+    """
+    Run the reference solution on one test case
+
+    Returns:
+        tuple: (limits dict, None) or (None, why the reference solution fails the test)
+    """
+    times, peaks = [], []
+    for run in range(runs):
+        with open_test_data(test, 'input', binary=True) as input_data:
+            result = run_with_timeout([binary_path], input_data, timeout=CALIBRATION_TIMEOUT)
+        if result.get('timed_out'):
+            return None, f"timed out after {CALIBRATION_TIMEOUT}s"
+        if result['returncode'] != 0:
+            return None, f"exited with code {result['returncode']}"
+
+        if run == 0:
+            # The reference has to pass the test it sets the limits for
+            if checker_path:
+                with open_test_data(test, 'input') as checker_input, \
+                        open_test_data(test, 'expected_output') as expected:
+                    comparison = run_checker(checker_path, checker_input, result['stdout'], expected)
+            else:
+                with open_test_data(test, 'expected_output') as expected:
+                    comparison = compare_output(result['stdout'], expected, compare_mode)
+            if not comparison['passed']:
+                return None, comparison['message'] or "wrong output"
+
+        times.append(result['time'])
+        peaks.append(result['max_rss_kb'])
+    return derive_limits(times, peaks), None
+
+
+def calibrate_exercise(exercise_id, runs=DEFAULT_RUNS):
+    """
+    Time an exercise's reference solution and store per-test limits
+
+    Args:
+        exercise_id (int): Exercise ID
+        runs (int): Runs per test case; the median time is used
+
+    Returns:
+        tuple: (success bool, message string); nothing is stored unless the reference
+            solution compiles and passes every test case
+    """
+    conn = sqlite3.connect(exercise_handler.DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT reference_code, compile_profile, compare_mode, checker_code FROM exercises WHERE id = ?",
+                   (exercise_id,))
+    exercise = cursor.fetchone()
+    cursor.execute("SELECT id, input, expected_output, input_blob, expected_blob FROM test_cases "
+                   "WHERE exercise_id = ? ORDER BY id", (exercise_id,))
+    tests = [
+        {'id': row[0], 'input': row[1], 'expected_output': row[2], 'input_blob': row[3], 'expected_blob': row[4]}
+        for row in cursor.fetchall()
+    ]
+    conn.close()
+
+    if not exercise:
+        return False, f"Exercise with ID {exercise_id} not found"
+    reference_code, compile_profile, compare_mode, checker_code = exercise
+    if not reference_code:
+        return False, f"Exercise with ID {exercise_id} has no reference solution"
+
+    work_dir = tempfile.mkdtemp(prefix="calibrate-")
+    try:
+        code_path = os.path.join(work_dir, "reference.cpp")
+        with open(code_path, 'w') as f:
+            f.write(reference_code)
+        compilation = compile_source(code_path, f"{code_path}.out", flags=compile_flags(compile_profile),
+                                     cache=exercise_handler.get_compile_cache())
+        if compilation['returncode'] != 0:
+            return False, f"Reference solution does not compile:\n{compilation['stderr']}"
+
+        checker_path = None
+        if checker_code:
+            checker_path, checker_compilation = compile_checker(checker_code, work_dir,
+                                                                exercise_handler.get_compile_cache())
+            if checker_compilation['returncode'] != 0:
+                return False, f"Checker does not compile:\n{checker_compilation['stderr']}"
+
+        limits = []
+        for test in tests:
+            test_limits, error = _measure_test(f"{code_path}.out", test, runs, compare_mode, checker_path)
+            if error:
+                return False, f"Reference solution fails test case {test['id']}: {error}"
+            limits.append((test_limits['time_limit'], test_limits['memory_limit_kb'],
+                           test_limits['reference_time'], test['id']))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    conn = sqlite3.connect(exercise_handler.DB_PATH)
+    cursor = conn.cursor()
+    cursor.executemany(
+        "UPDATE test_cases SET time_limit = ?, memory_limit_kb = ?, reference_time = ? WHERE id = ?", limits
+    )
+    # Verdicts depend on the limits
+    bump_suite_version(cursor, exercise_id)
+    conn.commit()
+    conn.close()
+
+    if not limits:
+        return True, f"Exercise with ID {exercise_id} has no test cases to calibrate"
+    time_limits = [row[0] for row in limits]
+    return True, (f"Calibrated {len(limits)} test cases of exercise {exercise_id}: "
+                  f"time limits {min(time_limits):.2f}s to {max(time_limits):.2f}s")
+
+
+def clear_limits(exercise_id):
+    """
+    Remove the calibrated limits of an exercise, going back to the graders' fixed timeout
+
+    Args:
+        exercise_id (int): Exercise ID
+
+    Returns:
+        tuple: (success bool, message string)
+    """
+    conn = sqlite3.connect(exercise_handler.DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE test_cases SET time_limit = NULL, memory_limit_kb = NULL, reference_time = NULL "
+        "WHERE exercise_id = ?",
+        (exercise_id,)
+    )
+    bump_suite_version(cursor, exercise_id)
+    conn.commit()
+    conn.close()
+    return True, f"Limits of exercise {exercise_id} removed"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Derive per-test limits from an exercise's reference solution")
+    parser.add_argument("exercise_id", type=int, help="Exercise to calibrate")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Runs of the reference per test case")
+    parser.add_argument("--clear", action="store_true", help="Remove the limits instead")
+    args = parser.parse_args()
+
+    if args.clear:
+        success, message = clear_limits(args.exercise_id)
+    else:
+        success, message = calibrate_exercise(args.exercise_id, runs=args.runs)
+    print(message)
+    raise SystemExit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Content-addressed cache of compiled C++ submissions.
+
+Entries are keyed by a hash of the source, the compiler flags and the
+toolchain (runner image version) and hold either the compiled executable or
+the compiler's error output. The cache is a plain directory; it is also
+copied into the cpp-runner image next to run_cpp.py. The runner containers
+keep theirs in a Docker volume of their own, so nothing they compile is ever
+executed by the host backends.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.environ.get("CPP_COMPILE_CACHE_DIR", "dataBase/compile_cache")
+DEFAULT_MAX_BYTES = int(os.environ.get("CPP_COMPILE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+BINARY_NAME = "a.out"
+META_NAME = "meta.json"
+
+
+def make_cache_key(source, flags, toolchain):
+    """
+    Build the cache key for a compilation
+
+    Args:
+        source (str | bytes): C++ source code
+        flags (list): Compiler flags
+        toolchain (str): Runner image version or host compiler identifier
+
+    Returns:
+        str: Hex digest identifying the compilation
+    """
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    digest = hashlib.sha256()
+    digest.update(json.dumps([toolchain, list(flags)]).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(source)
+    return digest.hexdigest()
+
+
+class CompileCache:
+    """Size-bounded LRU cache of compiled executables and compile errors"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key):
+        """
+        Look up a compilation
+
+        Args:
+            key (str): Key from make_cache_key
+
+        Returns:
+            dict: {'compilation': compile result, 'binary': path or None}, or None on a miss
+        """
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, META_NAME), 'r') as f:
+                meta = json.load(f)
+            # Mark the entry as recently used
+            os.utime(entry_dir)
+        except (OSError, ValueError):
+            self._count('misses')
+            return None
+
+        binary = os.path.join(entry_dir, BINARY_NAME)
+        if meta['compilation']['returncode'] == 0 and not os.path.exists(binary):
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        return {
+            'compilation': meta['compilation'],
+            'binary': binary if meta['compilation']['returncode'] == 0 else None
+        }
+
+    def put(self, key, compile_result, binary_path=None):
+        """
+        Store the outcome of a compilation
+
+        Args:
+            key (str): Key from make_cache_key
+            compile_result (dict): Result of running the compiler
+            binary_path (str, optional): Compiled executable, None for compile errors
+        """
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(entry_dir):
+            return
+
+        # Build the entry next to its final place, then move it in atomically
+        staging = tempfile.mkdtemp(prefix=".tmp-", dir=self.cache_dir)
+        try:
+            if binary_path:
+                shutil.copy2(binary_path, os.path.join(staging, BINARY_NAME))
+            with open(os.path.join(staging, META_NAME), 'w') as f:
+                json.dump({'compilation': compile_result, 'created_at': time.time()}, f)
+            os.rename(staging, entry_dir)
+            self._count('stores')
+        except OSError:
+            # Another worker stored the same key first
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            entry_dir = self._entry_dir(name)
+            if name.startswith(".tmp-"):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_dir))
+                entries.append((os.stat(entry_dir).st_mtime, size, entry_dir))
+            except OSError:
+                continue
+            total += size
+
+        entries.sort()
+        for _, size, entry_dir in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            self._count('evictions')
+
+    def stats(self):
+        """
+        Report hit/miss counters
+
+        Returns:
+            dict: Hits, misses, stores, evictions and the hit rate
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,336 @@
+import json
+import queue
+import subprocess
+import threading
+import time
+import uuid
+
+
+def docker_run_options(memory="512m", cpus="1", pids_limit=64, volumes=None, tmpfs=None):
+    """
+    Sandbox options of a runner `docker run`, the same for pooled and one-shot containers
+
+    Args:
+        memory (str): Memory limit, e.g. "512m"
+        cpus (str): CPU limit
+        pids_limit (int): Most processes and threads the container may have
+        volumes (list, optional): (host path, container path) or (host path, container path,
+            options such as "ro") of the volumes to mount
+        tmpfs (list, optional): (container path, mount options) of in-memory filesystems
+
+    Returns:
+        list: Arguments to put before the image name
+    """
+    options = [
+        "--network=none",  # No network access for security
+        f"--memory={memory}",  # Limit memory to prevent DoS
+        f"--cpus={cpus}",  # Limit CPU to prevent DoS
+        f"--pids-limit={pids_limit}",  # Stop fork bombs
+    ]
+    for volume in (volumes or []):
+        options += ["-v", ":".join(volume)]
+    for path, mount_options in (tmpfs or []):
+        options += ["--tmpfs", f"{path}:{mount_options}"]
+    return options
+
+
+class RunnerContainer:
+    """A long-lived cpp-runner container grading jobs sent over its stdin"""
+
+    def __init__(self, image, memory="512m", cpus="1", pids_limit=64, volumes=None, tmpfs=None):
+        self.name = f"cpp-runner-pool-{uuid.uuid4().hex[:12]}"
+        self.jobs_done = 0
+        # Set once a line that the runner did not write for the current job shows up
+        self.out_of_step = False
+        self._lines = queue.Queue()
+
+        # Same sandbox as the one-shot `docker run`, but kept alive in serve mode
+        cmd = [
+            "docker", "run", "-i", "--rm",
+            "--name", self.name,
+            *docker_run_options(memory, cpus, pids_limit, volumes, tmpfs),
+            image, "--serve"
+        ]
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+
+        # Read result lines on a thread so waits can time out
+        self._reader = threading.Thread(target=self._read_lines, daemon=True)
+        self._reader.start()
+
+    def _read_lines(self):
+        for line in self.process.stdout:
+            self._lines.put(line)
+        # EOF: the container is gone
+        self._lines.put(None)
+
+    def _read_line(self, timeout):
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Runner container {self.name} did not answer within {timeout}s")
+        if line is None:
+            raise RuntimeError(f"Runner container {self.name} exited unexpectedly")
+        return line
+
+    def wait_ready(self, timeout=60):
+        """Block until the runner inside the container reports that it is serving"""
+        json.loads(self._read_line(timeout))
+
+    def run(self, config, timeout, on_event=None):
+        """
+        Send one job to the container and wait for its result
+
+        Args:
+            config (dict): Job description understood by run_cpp.py
+            timeout (float): Seconds to wait for the result
+            on_event (callable, optional): Called with each progress event of a streaming job
+
+        Returns:
+            dict: The runner's JSON results
+        """
+        # The runner echoes the nonce on every line of the job, so lines a program
+        # managed to write to the container's stdout are told apart
+        nonce = uuid.uuid4().hex
+        self.process.stdin.write(json.dumps(dict(config, nonce=nonce)) + "\n")
+        self.process.stdin.flush()
+
+        deadline = time.monotonic() + timeout
+        while True:
+            line = self._read_line(max(deadline - time.monotonic(), 0))
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                message = None
+            if not isinstance(message, dict) or message.pop("nonce", None) != nonce:
+                # Ignored, but the container is no longer trusted with jobs
+                self.out_of_step = True
+                continue
+            if "event" not in message:
+                break
+            if on_event:
+                on_event(message)
+
+        self.jobs_done += 1
+        return message
+
+    def stop(self):
+        """Shut the container down, killing it if it does not exit on its own"""
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            subprocess.run(["docker", "kill", self.name], capture_output=True)
+            self.process.kill()
+
+
+class ContainerPool:
+    """
+    Pool of warm, network-less, resource-capped cpp-runner containers
+
+    Containers are started once and then reused: each job runs in a fresh work
+    directory inside the container, and a container is replaced after
+    `max_jobs_per_container` jobs, as soon as a job fails, times out or comes
+    back with an error result, or once it wrote a line that the runner did not
+    write for the job.
+    When a replacement cannot be started, the next job that finds the pool
+    below its size starts one itself, so a failed start never shrinks the pool
+    for good.
+    """
+
+    def __init__(self, image, size=2, memory="512m", cpus="1", pids_limit=64, max_jobs_per_container=100,
+                 volumes=None, tmpfs=None, wait_timeout=600):
+        self.image = image
+        self.size = size
+        self.memory = memory
+        self.cpus = cpus
+        self.pids_limit = pids_limit
+        self.max_jobs_per_container = max_jobs_per_container
+        self.volumes = volumes or []
+        self.tmpfs = tmpfs or []
+        # Seconds a job waits for a free container before giving up
+        self.wait_timeout = wait_timeout
+
+        # Most recently used container first, so its caches stay warm
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        # Containers that are idle, busy or being started
+        self._live = 0
+        self._started = False
+        self._closed = False
+        self._stats = {
+            'jobs': 0,
+            'recycled': 0,
+            'waiting': 0,
+            'busy': 0,
+            'total_queue_wait': 0.0,
+            'max_queue_wait': 0.0,
+            'last_queue_wait': 0.0
+        }
+
+    def _new_container(self):
+        container = RunnerContainer(self.image, self.memory, self.cpus, self.pids_limit, self.volumes,
+                                    self.tmpfs)
+        try:
+            container.wait_ready()
+        except Exception:
+            container.stop()
+            raise
+        return container
+
+    def _reserve(self):
+        """Claim room for one more container, False when the pool is already at its size"""
+        with self._lock:
+            if self._closed or self._live >= self.size:
+                return False
+            self._live += 1
+            return True
+
+    def _release(self):
+        with self._lock:
+            self._live -= 1
+
+    def _start_reserved(self):
+        """Start a container in a slot claimed with _reserve, giving the slot back if it fails"""
+        try:
+            return self._new_container()
+        except Exception:
+            self._release()
+            raise
+
+    def start(self):
+        """Start all containers of the pool (called lazily by run_job)"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.size):
+            if not self._reserve():
+                break
+            try:
+                self._idle.put(self._start_reserved())
+            except Exception as e:
+                # Jobs start the missing containers on demand
+                print(f"Could not start runner container: {e}")
+
+    def _replace(self, container):
+        """Stop a used-up container and put a fresh one in its place"""
+        container.stop()
+        self._release()
+        with self._lock:
+            self._stats['recycled'] += 1
+        if not self._reserve():
+            return
+        try:
+            self._idle.put(self._start_reserved())
+        except Exception as e:
+            # The next job to find the pool short starts one instead
+            print(f"Could not start replacement runner container: {e}")
+
+    def _acquire(self):
+        """
+        Take a free container, starting one if the pool is below its size
+
+        Raises:
+            RuntimeError: If no container can be started or none becomes free within wait_timeout
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self._reserve():
+                try:
+                    return self._start_reserved()
+                except Exception as e:
+                    raise RuntimeError(f"No runner container available, could not start one: {e}")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"No runner container became free within {self.wait_timeout}s")
+            try:
+                # Wake up now and then in case a container was lost and its slot freed
+                return self._idle.get(timeout=min(remaining, 1))
+            except queue.Empty:
+                pass
+
+    def run_job(self, config, timeout, on_event=None):
+        """
+        Run a job on the next free container
+
+        Args:
+            config (dict): Job description understood by run_cpp.py
+            timeout (float): Seconds to wait for the job once it has a container
+            on_event (callable, optional): Called with each progress event of a streaming job
+
+        Returns:
+            dict: The runner's JSON results
+
+        Raises:
+            RuntimeError: If no container could be started or became free within wait_timeout
+        """
+        self.start()
+
+        # Wait for a free container
+        enqueued = time.monotonic()
+        with self._lock:
+            self._stats['waiting'] += 1
+        try:
+            container = self._acquire()
+        finally:
+            with self._lock:
+                self._stats['waiting'] -= 1
+        waited = time.monotonic() - enqueued
+        with self._lock:
+            self._stats['busy'] += 1
+            self._stats['total_queue_wait'] += waited
+            self._stats['max_queue_wait'] = max(self._stats['max_queue_wait'], waited)
+            self._stats['last_queue_wait'] = waited
+
+        healthy = False
+        try:
+            result = container.run(config, timeout, on_event)
+            # A job the runner could not run at all may have left the container broken
+            healthy = "error" not in result
+            return result
+        finally:
+            with self._lock:
+                self._stats['busy'] -= 1
+                self._stats['jobs'] += 1
+
+            # Recycle broken or worn-out containers in the background
+            if healthy and not container.out_of_step and container.jobs_done < self.max_jobs_per_container:
+                self._idle.put(container)
+            else:
+                threading.Thread(target=self._replace, args=(container,), daemon=True).start()
+
+    def stats(self):
+        """
+        Report pool size and queue wait
+
+        Returns:
+            dict: Pool size, idle/busy/waiting counts, job counts and queue wait times in seconds
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['size'] = self.size
+        stats['idle'] = self._idle.qsize()
+        dispatched = stats['jobs'] + stats['busy']
+        stats['avg_queue_wait'] = stats['total_queue_wait'] / dispatched if dispatched else 0.0
+        return stats
+
+    def shutdown(self):
+        """Stop every idle container of the pool"""
+        self._closed = True
+        while True:
+            try:
+                container = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            container.stop()
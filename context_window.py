@@ -0,0 +1,134 @@
+"""
+Token-budgeted view of a chat conversation for the model.
+
+The whole conversation is kept, but each request only sends the system prompt,
+a rolling summary of the older turns and as many of the most recent turns as
+fit in the budget, so the prompt stays about the same size however long the
+session gets.
+
+Messages that fall out of the window are folded into the summary by a
+summarizer coroutine (see Ollama_response.summarize_messages). To keep those
+extra model calls rare, the window is trimmed down to LOW_WATER of the budget
+whenever it overflows, and the summary is reused until the next overflow.
+
+Token counts are estimates (words and punctuation, see count_tokens) rather
+than the model's own tokenizer, which is close enough for a budget.
+"""
+import functools
+import re
+
+DEFAULT_BUDGET = 1500
+SUMMARY_BUDGET = 250
+# Fraction of the budget the recent turns are cut down to once they overflow it
+LOW_WATER = 0.6
+# Role and formatting tokens the chat template adds to every message
+MESSAGE_OVERHEAD = 4
+# Characters of each message the summarizer sees
+SUMMARY_INPUT_CHARS = 2000
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+@functools.lru_cache(maxsize=4096)
+def count_tokens(text):
+    """Estimate how many tokens a text is: one per word or punctuation mark, more for long words"""
+    return sum(1 + len(token) // 8 for token in _TOKEN_PATTERN.findall(text or ''))
+
+
+def message_tokens(message):
+    """Estimated tokens a chat message takes up in the prompt"""
+    return count_tokens(message['content']) + MESSAGE_OVERHEAD
+
+
+def transcript(messages, limit=SUMMARY_INPUT_CHARS):
+    """Messages as 'role: content' lines for a summarizer, each cut to `limit` characters"""
+    return "\n".join(f"{message['role']}: {message['content'][:limit]}" for message in messages)
+
+
+class ContextWindow:
+    """A conversation that keeps its system prompt and fits its recent turns in a token budget"""
+
+    def __init__(self, system_prompt, budget=DEFAULT_BUDGET, summarize=None, summary_budget=SUMMARY_BUDGET):
+        """
+        Args:
+            system_prompt (dict): System message, always sent first
+            budget (int): Estimated tokens per request, system prompt and summary included
+            summarize (callable, optional): Coroutine function (summary, messages) -> new summary,
+                folding messages that left the window into the summary; without it they are dropped
+            summary_budget (int): Tokens set aside for the summary
+        """
+        self.system_prompt = system_prompt
+        self.budget = budget
+        self.summarize = summarize
+        self.summary_budget = summary_budget
+        self.messages = []
+        self.summary = None
+        # Messages before this index are only represented by the summary
+        self.start = 0
+        self.last_prompt_tokens = 0
+
+    def reset(self, messages=()):
+        """Start over with the given earlier messages, e.g. a conversation loaded from the history"""
+        self.messages = list(messages)
+        self.summary = None
+        self.start = 0
+        self.last_prompt_tokens = 0
+
+    def append(self, message):
+        self.messages.append(message)
+
+    def _summary_message(self):
+        return {'role': 'system', 'content': f"Summary of the earlier conversation: {self.summary}"}
+
+    def _window_start(self, budget):
+        """Index of the oldest message that still fits in `budget` tokens, starting at a user turn"""
+        used = 0
+        start = len(self.messages)
+        while start > self.start:
+            cost = message_tokens(self.messages[start - 1])
+            if used + cost > budget and start < len(self.messages):
+                break
+            used += cost
+            start -= 1
+        # Never start the window in the middle of a turn
+        while self.start < start < len(self.messages) - 1 and self.messages[start]['role'] != 'user':
+            start += 1
+        return start
+
+    async def prompt_messages(self):
+        """
+        Build the messages to send for the next request
+
+        Returns:
+            list: System prompt, then the summary of older turns if there is one, then the recent
+                turns; the latest message is always included however long it is
+        """
+        budget = self.budget - message_tokens(self.system_prompt) - (self.summary_budget if self.summarize else 0)
+        recent = sum(message_tokens(message) for message in self.messages[self.start:])
+        if recent > budget:
+            start = self._window_start(int(budget * LOW_WATER))
+            dropped = self.messages[self.start:start]
+            if dropped and self.summarize:
+                try:
+                    self.summary = await self.summarize(self.summary, dropped)
+                except Exception as e:
+                    # Better to forget the old turns than to fail the request
+                    print(f"Could not summarize the conversation: {e}")
+            self.start = start
+
+        prompt = [self.system_prompt]
+        if self.summary:
+            prompt.append(self._summary_message())
+        prompt += self.messages[self.start:]
+        self.last_prompt_tokens = sum(message_tokens(message) for message in prompt)
+        return prompt
+
+    def stats(self):
+        """Sizes of the conversation and of the last prompt built from it"""
+        return {
+            'messages': len(self.messages),
+            'summarized_messages': self.start,
+            'window_messages': len(self.messages) - self.start,
+            'has_summary': self.summary is not None,
+            'last_prompt_tokens': self.last_prompt_tokens
+        }
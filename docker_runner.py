@@ -1,119 +1,469 @@
+import asyncio
+import atexit
 import subprocess
 import json
 import os
+import shutil
 import tempfile
+import threading
+import uuid
+
+from blob_store import DEFAULT_BLOB_DIR
+from compile_cache import CompileCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, make_cache_key
+from container_pool import ContainerPool, docker_run_options
+from grading_scheduler import iter_events
+from run_cpp import CHECKER_TIMEOUT, COMPILE_TIMEOUT, OUTPUT_LIMIT, compile_flags, format_usage
+
+# Runner image, tagged with a version so a changed run_cpp.py triggers a rebuild
+RUNNER_IMAGE_VERSION = "19"
+RUNNER_IMAGE = f"cpp-runner:{RUNNER_IMAGE_VERSION}"
+RUNNER_DIR = os.path.dirname(os.path.abspath(__file__))
+RUNNER_FILES = ["run_cpp.py", "compile_cache.py", "output_compare.py", "blob_store.py"]
+
+# Host cache of the compile errors the runner containers reported, so a repeated broken
+# submission is answered without Docker; executables built in a container never come back
+COMPILE_CACHE_DIR = os.path.abspath(DEFAULT_CACHE_DIR)
+# The containers' own compile cache, a Docker volume the host backends never run anything from
+RUNNER_CACHE_VOLUME = os.environ.get("CPP_RUNNER_CACHE_VOLUME", "cpp-runner-compile-cache")
+CONTAINER_CACHE_DIR = "/cache"
+
+# Large test data, mounted read-only so it never goes through the job JSON
+BLOB_DIR = os.path.abspath(DEFAULT_BLOB_DIR)
+CONTAINER_BLOB_DIR = "/blobs"
+
+# In-memory scratch space of each container for sources, binaries and checker files
+# (counts against DOCKER_MEMORY); "0" turns it off and uses the container's own disk
+SCRATCH_SIZE = os.environ.get("CPP_RUNNER_SCRATCH_SIZE", "128m")
+CONTAINER_SCRATCH_DIR = "/scratch"
+
+# Sandbox limits shared by the warm pool and one-shot containers
+DOCKER_MEMORY = "512m"
+DOCKER_CPUS = os.environ.get("CPP_RUNNER_CPUS", "1")
+# Processes and threads per runner container: the runner, its test threads and the programs
+DOCKER_PIDS_LIMIT = int(os.environ.get("CPP_RUNNER_PIDS_LIMIT", "64"))
+# Seconds a job may take on top of its own work, for starting a container and passing the job in and out
+DOCKER_OVERHEAD = 10
+POOL_SIZE = int(os.environ.get("CPP_RUNNER_POOL_SIZE", "2"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_compile_cache = None
+
+
+def get_compile_cache():
+    """
+    Get the host cache of the runner containers' compile errors
+
+    Returns:
+        CompileCache: The host cache, whose stats() report hit/miss counters
+    """
+    global _compile_cache
+    if _compile_cache is None:
+        _compile_cache = CompileCache(COMPILE_CACHE_DIR)
+    return _compile_cache
+
+
+def _remember_compile_error(code_str, flags, docker_results):
+    """Keep a runner's compile error on the host for _cached_compile_error (never its executables)"""
+    compilation = docker_results.get("compilation")
+    if compilation and compilation.get("returncode", 0) != 0 and not compilation.get("timed_out"):
+        get_compile_cache().put(make_cache_key(code_str, flags, RUNNER_IMAGE_VERSION),
+                                {key: value for key, value in compilation.items() if key != "cached"})
+
+
+def _job_result(stdout, nonce):
+    """
+    Find the runner's result line for a job in a container's output
+
+    The runner echoes the job's nonce on every line it writes, so a line a
+    program managed to write to the container's stdout is never taken for it.
+
+    Args:
+        stdout (str): Everything the container wrote
+        nonce (str): Nonce the job was sent with
+
+    Returns:
+        dict: The job's results, or None if the runner never wrote them
+    """
+    for line in reversed(stdout.splitlines()):
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(message, dict) and "event" not in message and message.pop("nonce", None) == nonce:
+            return message
+    return None
+
+
+def longest_run(test_cases, timeout):
+    """
+    Longest a single run of a job's program may take
+
+    Args:
+        test_cases (list): Test cases, calibrated ones with their own 'time_limit'
+        timeout (float): Timeout in seconds of the tests without one
+
+    Returns:
+        float: Seconds
+    """
+    # Calibrated tests have their own time limits, which may be longer than the timeout
+    return max([timeout] + [test.get('time_limit') or 0 for test in test_cases])
+
+
+def job_deadline(test_cases, timeout, repeat=1, checker_code=None):
+    """
+    Seconds to wait for a whole job in a runner container before giving up on it
 
+    Covers compiling the submission (and the checker), every run of every test
+    as if none finished early, the checker's runs and starting the container.
 
-def run_code_in_docker(code_str, test_cases, timeout=5):
+    Args:
+        test_cases (list): The job's test cases
+        timeout (float): Timeout in seconds of the tests without a 'time_limit'
+        repeat (int): Runs of each passing test
+        checker_code (str, optional): The exercise's checker, if the job compiles and runs one
+
+    Returns:
+        float: Seconds
+    """
+    compiling = COMPILE_TIMEOUT * (2 if checker_code else 1)
+    per_test = longest_run(test_cases, timeout) * max(repeat, 1) + (CHECKER_TIMEOUT if checker_code else 0)
+    return compiling + per_test * max(len(test_cases), 1) + DOCKER_OVERHEAD
+
+
+def _job_config(code_str, test_cases, timeout, parallel, max_failures, flags, compare_mode, checker_code, repeat,
+                stream=False):
+    """
+    Build the run_cpp job config of a runner container job
+
+    Takes the arguments of run_code_in_docker, with the compile profile already
+    turned into flags; `stream` asks the runner for progress events.
+
+    Returns:
+        dict: Job config, with a fresh "nonce" for _job_result
+    """
+    return {
+        "nonce": uuid.uuid4().hex,
+        "code": code_str,
+        "test_cases": test_cases,
+        "timeout": timeout,
+        "parallel": parallel,
+        "max_failures": max_failures,
+        "repeat": repeat,
+        "compile_flags": flags,
+        "output_limit": OUTPUT_LIMIT,
+        "compare_mode": compare_mode,
+        "checker_code": checker_code,
+        "stream": stream,
+        "cache_dir": CONTAINER_CACHE_DIR,
+        "blob_dir": CONTAINER_BLOB_DIR,
+        "cache_max_bytes": DEFAULT_MAX_BYTES
+    }
+
+
+def get_blob_dir():
+    """Host directory of the test blob store, created so Docker does not create it as root"""
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    return BLOB_DIR
+
+
+def scratch_mounts():
+    """(container path, mount options) of the runners' tmpfs scratch space, none when it is turned off"""
+    if not SCRATCH_SIZE or SCRATCH_SIZE == "0":
+        return []
+    # exec, because the compiled submissions run from here
+    return [(CONTAINER_SCRATCH_DIR, f"rw,exec,nosuid,nodev,size={SCRATCH_SIZE},mode=1777")]
+
+
+def runner_volumes():
+    """Volumes of every runner container: the shared compile cache and the read-only blob store"""
+    return [(RUNNER_CACHE_VOLUME, CONTAINER_CACHE_DIR), (get_blob_dir(), CONTAINER_BLOB_DIR, "ro")]
+
+
+def runner_options():
+    """docker run sandbox options of a one-shot runner container, the same as the pool's"""
+    return docker_run_options(DOCKER_MEMORY, DOCKER_CPUS, DOCKER_PIDS_LIMIT, runner_volumes(), scratch_mounts())
+
+
+def get_container_pool():
+    """
+    Get the process-wide pool of warm runner containers, creating it on first use
+
+    Returns:
+        ContainerPool: The shared pool
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ContainerPool(
+                RUNNER_IMAGE, size=POOL_SIZE, memory=DOCKER_MEMORY, cpus=DOCKER_CPUS,
+                pids_limit=DOCKER_PIDS_LIMIT, volumes=runner_volumes(), tmpfs=scratch_mounts()
+            )
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def format_results(docker_results):
+    """Turn run_cpp job results (from a container or local_sandbox) into the application's result dict"""
+    # Format results for the application
+    feedback_lines = []
+    passed_tests = docker_results.get("summary", {}).get("passed", 0)
+    total_tests = docker_results.get("summary", {}).get("total", 0)
+
+    # Check for compilation errors
+    if docker_results.get("compilation", {}).get("returncode", 0) != 0:
+        feedback_lines.append("Compilation Error:")
+        feedback_lines.append(docker_results["compilation"]["stderr"])
+    elif docker_results.get("checker_compilation", {}).get("returncode", 0) != 0:
+        # A broken exercise, not a broken submission
+        feedback_lines.append("Error: the exercise's checker program does not compile:")
+        feedback_lines.append(docker_results["checker_compilation"]["stderr"])
+    else:
+        # Add test results to feedback
+        feedback_lines.append(f"Test Results: {passed_tests}/{total_tests} passed\n")
+
+        for i, test in enumerate(docker_results.get("test_results", [])):
+            if test.get("skipped"):
+                feedback_lines.append(f"Test {i + 1}: ⏭️ Skipped")
+                continue
+
+            status = "✅ Passed" if test["passed"] else "❌ Failed"
+            usage = format_usage(test)
+            feedback_lines.append(f"Test {i + 1}: {status}" + (f" ({usage})" if usage else ""))
+
+            if not test["passed"]:
+                feedback_lines.append(f"  Input: {test['input']}")
+                feedback_lines.append(f"  Expected: {test['expected_output']}")
+                feedback_lines.append(f"  Your output: {test['actual_output']}")
+                if test.get("mismatch"):
+                    feedback_lines.append(f"  First difference: {test['mismatch']}")
+                if test.get("limit_exceeded"):
+                    feedback_lines.append(f"  {test['limit_exceeded']}")
+                if test["stderr"]:
+                    feedback_lines.append(f"  Error output: {test['stderr']}")
+                if test.get("output_limit_exceeded"):
+                    feedback_lines.append("  Output limit exceeded - your program printed too much output")
+                if test.get("signal"):
+                    feedback_lines.append(f"  Program was killed by {test['signal']}")
+                feedback_lines.append("")
+
+    summary = docker_results.get("summary", {})
+    return {
+        "passed_tests": passed_tests,
+        "total_tests": total_tests,
+        "feedback": "\n".join(feedback_lines),
+        # Per-test results in test order, with 1-based positions as test_id
+        "test_results": docker_results.get("test_results", []),
+        # Measured by the runner inside the container, so Docker overhead is not included
+        "resources": {
+            "wall_time": summary.get("wall_time"),
+            "cpu_time": summary.get("cpu_time"),
+            "max_rss_kb": summary.get("max_rss_kb")
+        }
+    }
+
+
+def error_results(error, test_cases, feedback=None):
+    """Result dict for a submission that could not be graded"""
+    return {
+        "error": error,
+        "passed_tests": 0,
+        "total_tests": len(test_cases),
+        "feedback": feedback if feedback is not None else f"Error running code: {error}"
+    }
+
+
+def _cached_compile_error(code_str, flags, on_event=None):
+    """Formatted results for a submission whose compile error is already cached, else None"""
+    cached = get_compile_cache().get(make_cache_key(code_str, flags, RUNNER_IMAGE_VERSION))
+    if cached and cached["binary"] is None:
+        if on_event:
+            on_event({"event": "compile", "compilation": dict(cached["compilation"], cached=True)})
+        return format_results({
+            "compilation": cached["compilation"],
+            "summary": {"passed": 0, "total": 0}
+        })
+    return None
+
+
+def run_code_in_docker(code_str, test_cases, timeout=5, use_pool=True, parallel=False, on_event=None,
+                       max_failures=None, compile_profile=None, compare_mode=None,
+                       checker_code=None, repeat=1):
     """
     Run C++ code in a Docker container
 
     Args:
         code_str (str): C++ code as a string
-        test_cases (list): List of test case dictionaries with 'input' and 'expected_output' keys
+        test_cases (list): List of test case dictionaries with 'input' and 'expected_output' keys (or
+            'input_blob' / 'expected_blob' hashes of large data in the blob store)
         timeout (int): Timeout in seconds for each test case
+        use_pool (bool): Grade on a warm container from the pool instead of starting a new one
+        parallel (bool): Run the test cases concurrently, capped at the container's CPUs
+        on_event (callable, optional): Called with the runner's 'compile' and 'test' events as
+            they happen (pool only; the one-shot container reports everything at the end)
+        max_failures (int, optional): Stop after this many failed tests and skip the rest;
+            order test_cases with the likeliest failures first to get the most out of it
+        compile_profile (str, optional): Compiler flag profile of the exercise (see run_cpp.COMPILE_PROFILES)
+        compare_mode (str, optional): Output compare mode of the exercise (see output_compare)
+        checker_code (str, optional): C++ checker program judging the outputs instead of compare_mode
+        repeat (int): Runs of each passing test, reporting their median time
 
     Returns:
         dict: Results of code execution
     """
     try:
-        # Create a temporary directory to hold files
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Write code to a file
-            code_path = os.path.join(temp_dir, "solution.cpp")
-            with open(code_path, "w") as f:
-                f.write(code_str)
-
-            # Create config file for the Docker script
-            config = {
-                "code_path": "/code/solution.cpp",
-                "test_cases": test_cases,
-                "timeout": timeout
-            }
-
-            config_path = os.path.join(temp_dir, "config.json")
-            with open(config_path, "w") as f:
-                json.dump(config, f)
-
-            # Run Docker command
-            cmd = [
-                "docker", "run", "--rm",
-                "-v", f"{temp_dir}:/code",
-                "-w", "/code",
-                "--network=none",  # No network access for security
-                "--memory=512m",  # Limit memory to prevent DoS
-                "--cpus=1",  # Limit CPU to prevent DoS
-                "cpp-runner",  # Name of the Docker image
-                "/code/config.json"
-            ]
-
-            # Execute Docker
-            result = subprocess.run(
-                cmd,
-                text=True,
-                capture_output=True,
-                timeout=timeout + 10  # Give extra time for Docker overhead
+        # Repeated broken submissions are answered without touching Docker
+        flags = compile_flags(compile_profile)
+        cached = _cached_compile_error(code_str, flags, on_event)
+        if cached:
+            return cached
+
+        if use_pool:
+            config = _job_config(code_str, test_cases, timeout, parallel, max_failures, flags, compare_mode,
+                                 checker_code, repeat, stream=on_event is not None)
+            # The warm container only pays for compiling and running the tests
+            docker_results = get_container_pool().run_job(
+                config, timeout=job_deadline(test_cases, timeout, repeat, checker_code), on_event=on_event
             )
+            _remember_compile_error(code_str, flags, docker_results)
+            if "error" in docker_results:
+                return error_results(docker_results["error"], test_cases)
+            return format_results(docker_results)
+
+        # The job is piped in, so the container needs no files from the host
+        config = _job_config(code_str, test_cases, timeout, parallel, max_failures, flags, compare_mode,
+                             checker_code, repeat)
+
+        # Run Docker command
+        cmd = [
+            "docker", "run", "-i", "--rm",
+            *runner_options(),
+            RUNNER_IMAGE,  # Name of the Docker image
+            "-"
+        ]
 
-            # Check if Docker ran successfully
-            if result.returncode != 0:
-                return {
-                    "error": f"Docker execution failed: {result.stderr}",
-                    "passed_tests": 0,
-                    "total_tests": len(test_cases),
-                    "feedback": result.stderr
-                }
-
-            # Parse results
-            try:
-                docker_results = json.loads(result.stdout)
-
-                # Format results for the application
-                feedback_lines = []
-                passed_tests = docker_results.get("summary", {}).get("passed", 0)
-                total_tests = docker_results.get("summary", {}).get("total", 0)
-
-                # Check for compilation errors
-                if docker_results.get("compilation", {}).get("returncode", 0) != 0:
-                    feedback_lines.append("Compilation Error:")
-                    feedback_lines.append(docker_results["compilation"]["stderr"])
-                else:
-                    # Add test results to feedback
-                    feedback_lines.append(f"Test Results: {passed_tests}/{total_tests} passed\n")
-
-                    for i, test in enumerate(docker_results.get("test_results", [])):
-                        status = "✅ Passed" if test["passed"] else "❌ Failed"
-                        feedback_lines.append(f"Test {i + 1}: {status}")
-
-                        if not test["passed"]:
-                            feedback_lines.append(f"  Input: {test['input']}")
-                            feedback_lines.append(f"  Expected: {test['expected_output']}")
-                            feedback_lines.append(f"  Your output: {test['actual_output']}")
-                            if test["stderr"]:
-                                feedback_lines.append(f"  Error output: {test['stderr']}")
-                            feedback_lines.append("")
-
-                return {
-                    "passed_tests": passed_tests,
-                    "total_tests": total_tests,
-                    "feedback": "\n".join(feedback_lines)
-                }
-
-            except json.JSONDecodeError:
-                return {
-                    "error": "Failed to parse Docker output",
-                    "passed_tests": 0,
-                    "total_tests": len(test_cases),
-                    "feedback": result.stdout
-                }
+        # Execute Docker
+        result = subprocess.run(
+            cmd,
+            input=json.dumps(config),
+            text=True,
+            capture_output=True,
+            timeout=job_deadline(test_cases, timeout, repeat, checker_code)
+        )
+
+        # Check if Docker ran successfully
+        if result.returncode != 0:
+            return error_results(f"Docker execution failed: {result.stderr}", test_cases, result.stderr)
+
+        # Parse results
+        docker_results = _job_result(result.stdout, config["nonce"])
+        if docker_results is None:
+            return error_results("Failed to parse Docker output", test_cases, result.stdout)
+        _remember_compile_error(code_str, flags, docker_results)
+        return format_results(docker_results)
 
     except Exception as e:
-        return {
-            "error": str(e),
-            "passed_tests": 0,
-            "total_tests": len(test_cases),
-            "feedback": f"Error running code: {str(e)}"
-        }
+        return error_results(str(e), test_cases)
+
+
+def iter_code_in_docker(code_str, test_cases, timeout=5, parallel=False, max_failures=None, compile_profile=None,
+                        compare_mode=None, checker_code=None, repeat=1):
+    """
+    Grade C++ code on the container pool, yielding progress as it happens
+
+    Args:
+        code_str (str): C++ code as a string
+        test_cases (list): List of test case dictionaries with 'input' and 'expected_output' keys
+        timeout (int): Timeout in seconds for each test case
+        parallel (bool): Run the test cases concurrently, capped at the container's CPUs
+        max_failures (int, optional): Stop after this many failed tests and skip the rest
+        compile_profile (str, optional): Compiler flag profile of the exercise
+        compare_mode (str, optional): Output compare mode of the exercise
+        checker_code (str, optional): C++ checker program judging the outputs
+        repeat (int): Runs of each passing test, reporting their median time
+
+    Yields:
+        dict: {'event': 'compile', 'compilation': ...}, then {'event': 'test', 'index': i, 'test': ...}
+            per finished test, and finally {'event': 'result', 'results': <run_code_in_docker dict>}
+    """
+    yield from iter_events(run_code_in_docker, code_str, test_cases, timeout=timeout, parallel=parallel,
+                           max_failures=max_failures, compile_profile=compile_profile, compare_mode=compare_mode,
+                           checker_code=checker_code, repeat=repeat)
+
+
+async def run_code_in_docker_async(code_str, test_cases, timeout=5, parallel=False, max_failures=None,
+                                   compile_profile=None, compare_mode=None, checker_code=None, repeat=1):
+    """
+    Coroutine version of run_code_in_docker built on asyncio subprocesses
+
+    The job is piped into a one-off runner container in serve mode, so no
+    temporary files are needed. Cancelling the task, or running past the
+    overall timeout, kills the container.
+
+    Args:
+        code_str (str): C++ code as a string
+        test_cases (list): List of test case dictionaries with 'input' and 'expected_output' keys
+        timeout (int): Timeout in seconds for each test case
+        parallel (bool): Run the test cases concurrently, capped at the container's CPUs
+        max_failures (int, optional): Stop after this many failed tests and skip the rest
+        compile_profile (str, optional): Compiler flag profile of the exercise
+        compare_mode (str, optional): Output compare mode of the exercise
+        checker_code (str, optional): C++ checker program judging the outputs
+        repeat (int): Runs of each passing test, reporting their median time
+
+    Returns:
+        dict: Same result dict as run_code_in_docker
+    """
+    try:
+        flags = compile_flags(compile_profile)
+        cached = _cached_compile_error(code_str, flags)
+        if cached:
+            return cached
+
+        name = f"cpp-runner-{uuid.uuid4().hex[:12]}"
+        cmd = [
+            "docker", "run", "-i", "--rm",
+            "--name", name,
+            *runner_options(),
+            RUNNER_IMAGE,
+            "--serve"
+        ]
+        config = _job_config(code_str, test_cases, timeout, parallel, max_failures, flags, compare_mode,
+                             checker_code, repeat)
+
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        try:
+            # Closing stdin after the job makes the runner exit once it has answered
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate((json.dumps(config) + "\n").encode()),
+                timeout=job_deadline(test_cases, timeout, repeat, checker_code)
+            )
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # Stopping the docker client does not stop the container itself
+            subprocess.Popen(["docker", "kill", name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            process.kill()
+            raise
+
+        if process.returncode != 0:
+            return error_results(f"Docker execution failed: {stderr.decode()}", test_cases, stderr.decode())
+
+        # The first line only announces that the runner is ready
+        docker_results = _job_result(stdout.decode(), config["nonce"])
+        if docker_results is None:
+            return error_results("Failed to parse Docker output", test_cases, stdout.decode())
+        _remember_compile_error(code_str, flags, docker_results)
+        if "error" in docker_results:
+            return error_results(docker_results["error"], test_cases)
+        return format_results(docker_results)
+
+    except asyncio.CancelledError:
+        raise
+    except asyncio.TimeoutError:
+        return error_results("Grading timed out", test_cases)
+    except Exception as e:
+        return error_results(str(e), test_cases)
 
 
 def setup_docker():
@@ -129,13 +479,13 @@ def setup_docker():
 
         # Check if our image exists
         result = subprocess.run(
-            ["docker", "images", "-q", "cpp-runner"],
+            ["docker", "images", "-q", RUNNER_IMAGE],
             text=True,
             capture_output=True
         )
 
         if not result.stdout.strip():
-            print("Docker image 'cpp-runner' not found. Building it now...")
+            print(f"Docker image '{RUNNER_IMAGE}' not found. Building it now...")
 
             # Create temporary directory for Dockerfile
             with tempfile.TemporaryDirectory() as temp_dir:
@@ -150,155 +500,52 @@ RUN apt-get update && apt-get install -y \\
     python3-pip \\
     && rm -rf /var/lib/apt/lists/*
 
-# Set up a non-root user for better security
-RUN useradd -m cpprunner
-USER cpprunner
-WORKDIR /home/cpprunner
+# Set up a non-root user for better security, and another one the submissions run as
+RUN useradd -m cpprunner && useradd -M -s /usr/sbin/nologin cpptest
 
-# Create directories for code
-RUN mkdir -p /home/cpprunner/code
+# Mount point of the runner cache volume, which Docker creates with this owner
+RUN mkdir /cache && chown cpprunner:cpprunner /cache
 
-# Copy the executor script
-COPY --chown=cpprunner:cpprunner run_cpp.py /home/cpprunner/
+# Copy the executor script and its compile cache
+COPY --chown=cpprunner:cpprunner run_cpp.py compile_cache.py output_compare.py blob_store.py /home/cpprunner/
+# Readable by cpptest too, which runs `run_cpp.py --clear` to delete its own leftovers
+RUN chmod 755 /home/cpprunner
 
-# Default command
-ENTRYPOINT ["python3", "/home/cpprunner/run_cpp.py"]
-""")
+# Precompile the common standard headers for every compile profile
+ENV RUNNER_PCH_DIR=/opt/pch
+RUN python3 /home/cpprunner/run_cpp.py --build-pch /opt/pch
 
-                # Write the run_cpp.py script
-                script_path = os.path.join(temp_dir, "run_cpp.py")
-                with open(script_path, "w") as f:
-                    # Copy the contents of the run_cpp.py script here
-                    f.write("""#!/usr/bin/env python3
-import subprocess
-import json
-import os
-import sys
-import tempfile
-import time
-import signal
-
-def run_with_timeout(cmd, input_data=None, timeout=5):
-    \"\"\"Run a command with timeout and input data\"\"\"
-    start = time.time()
-    process = subprocess.Popen(
-        cmd,
-        stdin=subprocess.PIPE if input_data else None,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-
-    try:
-        stdout, stderr = process.communicate(input=input_data, timeout=timeout)
-        end = time.time()
-        return {
-            'returncode': process.returncode,
-            'stdout': stdout,
-            'stderr': stderr,
-            'time': end - start
-        }
-    except subprocess.TimeoutExpired:
-        # Kill the process if it times out
-        process.kill()
-        return {
-            'returncode': -1,
-            'stdout': '',
-            'stderr': 'Process timed out',
-            'time': timeout
-        }
+# Work directories of the jobs; a tmpfs is mounted over it when the container starts
+RUN mkdir -m 1777 /scratch
+ENV RUNNER_WORK_ROOT=/scratch
 
-def main():
-    \"\"\"Main function to run C++ code against test cases\"\"\"
-    if len(sys.argv) < 2:
-        print("Usage: python run_cpp.py <path-to-config-json>")
-        sys.exit(1)
+# Small setuid helper that measures each program's peak memory and CPU time and
+# runs the submissions as cpptest, out of reach of the runner and its caches
+ENV RUNNER_RUSAGE_HELPER=/opt/rusage-helper
+ENV RUNNER_TEST_USER=cpptest
+RUN python3 /home/cpprunner/run_cpp.py --build-rusage-helper /opt/rusage-helper cpptest \\
+    && chmod 4755 /opt/rusage-helper
 
-    config_path = sys.argv[1]
+USER cpprunner
+WORKDIR /home/cpprunner
 
-    try:
-        with open(config_path, 'r') as f:
-            config = json.load(f)
-
-        # Get code file path
-        code_path = config.get('code_path')
-        if not code_path or not os.path.exists(code_path):
-            raise Exception(f"Code file not found at {code_path}")
-
-        # Compile the code
-        compile_result = run_with_timeout(['g++', code_path, '-o', f"{code_path}.out", '-std=c++11'])
-
-        results = {
-            'compilation': compile_result,
-            'test_results': [],
-            'summary': {
-                'passed': 0,
-                'total': 0
-            }
-        }
+# Create directories for code
+RUN mkdir -p /home/cpprunner/code
 
-        # If compilation failed, return results immediately
-        if compile_result['returncode'] != 0:
-            results['summary']['error'] = "Compilation failed"
-            print(json.dumps(results))
-            sys.exit(0)
-
-        # Get test cases
-        test_cases = config.get('test_cases', [])
-        results['summary']['total'] = len(test_cases)
-
-        # Run each test case
-        for i, test in enumerate(test_cases):
-            test_input = test.get('input', '')
-            expected_output = test.get('expected_output', '').strip()
-            is_hidden = test.get('is_hidden', False)
-
-            # Run the program
-            run_result = run_with_timeout([f"{code_path}.out"], test_input, timeout=config.get('timeout', 5))
-
-            # Check output
-            actual_output = run_result['stdout'].strip()
-            passed = actual_output == expected_output and run_result['returncode'] == 0
-
-            if passed:
-                results['summary']['passed'] += 1
-
-            # Add test result
-            test_result = {
-                'test_id': i + 1,
-                'passed': passed,
-                'input': test_input if not is_hidden else "[Hidden]",
-                'expected_output': expected_output if not is_hidden else "[Hidden]",
-                'actual_output': actual_output if not is_hidden else "[Hidden]",
-                'stderr': run_result['stderr'],
-                'time': run_result['time'],
-                'is_hidden': is_hidden
-            }
-
-            results['test_results'].append(test_result)
-
-        # Output results as JSON
-        print(json.dumps(results))
+# Compile cache keys include the image version
+ENV RUNNER_IMAGE_VERSION=%s
 
-    except Exception as e:
-        error_result = {
-            'error': str(e),
-            'summary': {
-                'passed': 0,
-                'total': 0,
-                'error': str(e)
-            }
-        }
-        print(json.dumps(error_result))
-        sys.exit(1)
+# Default command
+ENTRYPOINT ["python3", "/home/cpprunner/run_cpp.py"]
+""" % RUNNER_IMAGE_VERSION)
 
-if __name__ == "__main__":
-    main()
-""")
+                # Copy the runner scripts next to the Dockerfile
+                for name in RUNNER_FILES:
+                    shutil.copy(os.path.join(RUNNER_DIR, name), os.path.join(temp_dir, name))
 
                 # Build the Docker image
                 subprocess.run(
-                    ["docker", "build", "-t", "cpp-runner", temp_dir],
+                    ["docker", "build", "-t", RUNNER_IMAGE, temp_dir],
                     check=True
                 )
 
@@ -333,5 +580,7 @@ int main() {
 
         results = run_code_in_docker(test_code, test_cases)
         print(json.dumps(results, indent=2))
+        print(json.dumps(get_container_pool().stats(), indent=2))
+        print(json.dumps(get_compile_cache().stats(), indent=2))
     else:
         print("Docker setup failed")
\ No newline at end of file
@@ -1,14 +1,48 @@
+import asyncio
 import sqlite3
 import os
-import subprocess
+import shutil
+import statistics
 import tempfile
 import json
+import hashlib
 import uuid
 from datetime import datetime
 
+from blob_store import split_test_data
+from compile_cache import CompileCache
+from grading_scheduler import iter_events
+from output_compare import compare_output
+from run_cpp import (
+    CHECKER_PROFILE, OUTPUT_LIMIT, USAGE_FIELDS, compile_checker, compile_flags, compile_source, compile_source_async,
+    format_usage, limit_verdict, open_test_data, run_checker, run_checker_async, run_with_timeout,
+    run_with_timeout_async, truncate_output, usage_summary
+)
+
 # Database path
 DB_PATH = "dataBase/exercises.db"
 
+# Interactive submits stop grading after this many failed tests
+INTERACTIVE_MAX_FAILURES = 3
+
+# Runs per passing test when a student asks for the median runtime
+TIMING_RUNS = 5
+
+# Compiled submissions and compile errors, shared by every check_submission call
+_compile_cache = None
+
+
+# Grading results served from / missing in the result cache since startup
+_result_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def get_compile_cache():
+    """Get the compile cache used by check_submission, creating it on first use"""
+    global _compile_cache
+    if _compile_cache is None:
+        _compile_cache = CompileCache()
+    return _compile_cache
+
 
 def create_tables_if_not_exist():
     """Initialize the exercises database with necessary tables"""
@@ -51,6 +85,54 @@ def create_tables_if_not_exist():
     )
     ''')
 
+    # Compiler flag profile of each exercise (a COMPILE_PROFILES name, NULL for the default)
+    _add_column_if_missing(cursor, "exercises", "compile_profile", "TEXT")
+
+    # How outputs of each exercise are compared (an output_compare mode, NULL for exact)
+    _add_column_if_missing(cursor, "exercises", "compare_mode", "TEXT")
+
+    # C++ checker program judging outputs instead of compare_mode (see run_cpp.compile_checker)
+    _add_column_if_missing(cursor, "exercises", "checker_code", "TEXT")
+
+    # Hashes of large test data kept in the blob store; the text columns then hold an excerpt
+    _add_column_if_missing(cursor, "test_cases", "input_blob", "TEXT")
+    _add_column_if_missing(cursor, "test_cases", "expected_blob", "TEXT")
+
+    # Reference solution of each exercise, timed by calibrate.py to derive per-test limits
+    _add_column_if_missing(cursor, "exercises", "reference_code", "TEXT")
+    _add_column_if_missing(cursor, "test_cases", "time_limit", "REAL")
+    _add_column_if_missing(cursor, "test_cases", "memory_limit_kb", "INTEGER")
+    _add_column_if_missing(cursor, "test_cases", "reference_time", "REAL")
+
+    # Generator program of each exercise and the seed each generated test came from (see generate_tests.py)
+    _add_column_if_missing(cursor, "exercises", "generator_code", "TEXT")
+    _add_column_if_missing(cursor, "test_cases", "generator_seed", "INTEGER")
+
+    # Bumped whenever the test suite or grading settings of an exercise change, see CURD_ex_data
+    _add_column_if_missing(cursor, "exercises", "suite_version", "INTEGER DEFAULT 0")
+
+    # Per-test verdicts and resource usage of each submission, stored as JSON
+    _add_column_if_missing(cursor, "submissions", "details", "TEXT")
+
+    # Resource usage of each submission over all of its tests
+    _add_column_if_missing(cursor, "submissions", "wall_time", "REAL")
+    _add_column_if_missing(cursor, "submissions", "cpu_time", "REAL")
+    _add_column_if_missing(cursor, "submissions", "max_rss_kb", "INTEGER")
+
+    # Earlier grading results, reused when the same code is submitted again for the same test suite
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS grading_cache (
+        exercise_id INTEGER NOT NULL,
+        source_hash TEXT NOT NULL,
+        suite_version INTEGER NOT NULL,
+        options TEXT NOT NULL,
+        results TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (exercise_id, source_hash, suite_version, options),
+        FOREIGN KEY (exercise_id) REFERENCES exercises(id)
+    )
+    ''')
+
     # Create user progress table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS user_progress (
@@ -70,6 +152,14 @@ def create_tables_if_not_exist():
     conn.close()
 
 
+def _add_column_if_missing(cursor, table, column, definition):
+    """Add a column to an existing table, ignoring the error if it is already there"""
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+
 def _insert_sample_exercises(cursor):
     """Insert sample C++ exercises into the database"""
     # Exercise 1: Hello World
@@ -186,9 +276,26 @@ def save_submission(exercise_id, code, results):
     submission_id = str(uuid.uuid4())
     passed = results['passed_tests'] == results['total_tests']
 
+    # Keep the per-test verdicts for failure statistics and rejudging, with what each test cost
+    # and which version of the test case they are for
+    details = None
+    if results.get('details'):
+        cursor.execute("SELECT id, input, expected_output, input_blob, expected_blob FROM test_cases "
+                       "WHERE exercise_id = ?", (exercise_id,))
+        test_hashes = {row[0]: test_case_hash(*row[1:]) for row in cursor.fetchall()}
+        details = json.dumps([
+            dict({'test_case_id': test['test_id'], 'passed': test['passed'], 'skipped': test.get('skipped', False),
+                  'time': test.get('time'), 'test_hash': test_hashes.get(test['test_id'])},
+                 **{field: test.get(field) for field in USAGE_FIELDS})
+            for test in results['details']
+        ])
+    resources = results.get('resources') or {}
+
     cursor.execute(
-        "INSERT INTO submissions (id, exercise_id, code, passed, feedback) VALUES (?, ?, ?, ?, ?)",
-        (submission_id, exercise_id, code, passed, results['feedback'])
+        "INSERT INTO submissions (id, exercise_id, code, passed, feedback, details, wall_time, cpu_time, max_rss_kb) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (submission_id, exercise_id, code, passed, results['feedback'], details,
+         resources.get('wall_time'), resources.get('cpu_time'), resources.get('max_rss_kb'))
     )
 
     # Update user progress if all tests passed
@@ -204,16 +311,463 @@ def save_submission(exercise_id, code, results):
     return submission_id
 
 
-def check_submission(exercise_id, file_path):
-    """Check a C++ submission against test cases using Docker"""
+def test_case_hash(test_input, expected_output, input_blob=None, expected_blob=None):
+    """Hash of a test case's data, telling whether a stored verdict is still about the same test"""
+    # A blob's hash stands for its whole content, the text column only holds an excerpt of it
+    data = [input_blob or test_input or '', expected_blob or expected_output]
+    return hashlib.sha256(json.dumps(data).encode('utf-8')).hexdigest()
+
+
+def _load_test_cases(exercise_id):
+    """
+    Get all test cases of an exercise as (id, input, expected_output, is_hidden, input_blob, expected_blob,
+    time_limit, memory_limit_kb, reference_time) rows
+    """
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
-    # Get all test cases for the exercise
-    cursor.execute("SELECT id, input, expected_output, is_hidden FROM test_cases WHERE exercise_id = ?", (exercise_id,))
+    cursor.execute("SELECT id, input, expected_output, is_hidden, input_blob, expected_blob, time_limit, "
+                   "memory_limit_kb, reference_time FROM test_cases WHERE exercise_id = ?", (exercise_id,))
     test_cases = cursor.fetchall()
 
     conn.close()
+    return test_cases
+
+
+def _test_data(row):
+    """Test case dict of a _load_test_cases row, for run_cpp.open_test_data and run_cpp.limit_verdict"""
+    return {'input': row[1], 'expected_output': row[2], 'input_blob': row[4], 'expected_blob': row[5],
+            'time_limit': row[6], 'memory_limit_kb': row[7], 'reference_time': row[8]}
+
+
+def get_test_failure_rates(exercise_id, history=500):
+    """
+    Estimate how often each test case of an exercise fails
+
+    Args:
+        exercise_id (int): Exercise ID
+        history (int): Number of most recent submissions to look at
+
+    Returns:
+        dict: test case id -> smoothed failure rate; tests without history get 0.5
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT id FROM test_cases WHERE exercise_id = ?", (exercise_id,))
+    counts = {row[0]: [0, 0] for row in cursor.fetchall()}  # id -> [failures, runs]
+
+    cursor.execute(
+        "SELECT details FROM submissions WHERE exercise_id = ? AND details IS NOT NULL "
+        "ORDER BY submitted_at DESC LIMIT ?",
+        (exercise_id, history)
+    )
+    for (details,) in cursor.fetchall():
+        for test in json.loads(details):
+            if test['test_case_id'] in counts and not test.get('skipped'):
+                counts[test['test_case_id']][1] += 1
+                if not test['passed']:
+                    counts[test['test_case_id']][0] += 1
+
+    conn.close()
+
+    # Laplace smoothing keeps new tests in the middle of the order
+    return {test_id: (failures + 1) / (runs + 2) for test_id, (failures, runs) in counts.items()}
+
+
+def order_tests_by_failure_rate(exercise_id, test_cases):
+    """
+    Order test case rows so that the ones most likely to fail run first
+
+    Args:
+        exercise_id (int): Exercise ID
+        test_cases (list): Rows from the test_cases table, starting with the test case id
+
+    Returns:
+        list: Indexes into test_cases in the order they should run
+    """
+    rates = get_test_failure_rates(exercise_id)
+    return sorted(range(len(test_cases)), key=lambda i: -rates.get(test_cases[i][0], 0.5))
+
+
+def get_grading_settings(exercise_id):
+    """
+    Get how an exercise's submissions are compiled and checked
+
+    Args:
+        exercise_id (int): Exercise ID
+
+    Returns:
+        dict: 'compile_profile', 'compare_mode' and 'checker_code' (None means the default), and
+            the 'suite_version' of its test suite
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT compile_profile, compare_mode, checker_code, suite_version FROM exercises WHERE id = ?",
+                   (exercise_id,))
+    row = cursor.fetchone() or (None, None, None, 0)
+    conn.close()
+    return {'compile_profile': row[0], 'compare_mode': row[1], 'checker_code': row[2], 'suite_version': row[3] or 0}
+
+
+def normalize_source(code):
+    """Normalize source code before hashing, so line endings and trailing whitespace do not matter"""
+    lines = code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+
+def source_hash(code):
+    """Hash of the normalized source code, the key of a submission in the result cache"""
+    return hashlib.sha256(normalize_source(code).encode('utf-8')).hexdigest()
+
+
+def _result_cache_options(timeout, max_failures, final, output_limit):
+    """The grading options that change results, as part of the result cache key"""
+    return json.dumps({
+        'timeout': timeout,
+        # Final grading ignores max_failures
+        'max_failures': None if final else max_failures,
+        'final': bool(final),
+        'output_limit': output_limit
+    }, sort_keys=True)
+
+
+def _load_cached_result(exercise_id, code_hash, suite_version, options):
+    """Get a cached grading result, or None if this code was not graded against this test suite"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT results FROM grading_cache WHERE exercise_id = ? AND source_hash = ? AND suite_version = ? "
+            "AND options = ?",
+            (exercise_id, code_hash, suite_version, options)
+        )
+        row = cursor.fetchone()
+    except sqlite3.OperationalError:
+        row = None  # Table not created yet
+    conn.close()
+
+    if row is None:
+        _result_cache_stats['misses'] += 1
+        return None
+    _result_cache_stats['hits'] += 1
+    return json.loads(row[0])
+
+
+def _store_cached_result(exercise_id, code_hash, suite_version, options, results, compilation):
+    """
+    Cache a grading result for later submissions of the same code
+
+    Results that depend on luck rather than the code are not cached: runs with a timed
+    out test or one over its time or memory limit, and grading that failed with an error.
+    """
+    if results['feedback'].startswith("Error:") or compilation is None:
+        return
+    if any(test.get('timed_out') or test.get('limit_exceeded') for test in results['details']):
+        return
+
+    entry = {
+        'compilation': {'returncode': compilation['returncode'], 'stderr': compilation.get('stderr', '')},
+        'results': results
+    }
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT OR REPLACE INTO grading_cache (exercise_id, source_hash, suite_version, options, results) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (exercise_id, code_hash, suite_version, options, json.dumps(entry))
+        )
+        conn.commit()
+    except sqlite3.OperationalError:
+        pass  # Table not created yet
+    conn.close()
+
+
+def _replay_cached_result(entry, on_event=None):
+    """Send the events of a cached grading result and return its result dict"""
+    results = entry['results']
+    results['cached'] = True
+    if on_event:
+        # 'cached_result' tells a replayed grading apart from a compile cache hit ('cached')
+        on_event({'event': 'compile', 'compilation': dict(entry['compilation'], cached=True),
+                  'cached_result': True})
+        for index, test in enumerate(results['details']):
+            on_event({'event': 'test', 'index': index, 'test': test})
+    return results
+
+
+def get_result_cache_stats():
+    """
+    Get how well the grading result cache is doing
+
+    Returns:
+        dict: 'hits' and 'misses' since startup, their 'hit_rate', and the number of cached 'entries'
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM grading_cache")
+        entries = cursor.fetchone()[0]
+    except sqlite3.OperationalError:
+        entries = 0
+    conn.close()
+
+    lookups = _result_cache_stats['hits'] + _result_cache_stats['misses']
+    return {
+        'hits': _result_cache_stats['hits'],
+        'misses': _result_cache_stats['misses'],
+        'hit_rate': _result_cache_stats['hits'] / lookups if lookups else 0.0,
+        'entries': entries
+    }
+
+
+def _read_source(file_path):
+    """Read a submitted source file for hashing"""
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def _prepare_checker(settings, results):
+    """
+    Compile the exercise's checker, if it has one, into a fresh directory
+
+    Returns:
+        tuple: (directory, checker path), both None without a checker or when it does not
+            compile (then the error is put in results['feedback'])
+    """
+    if not settings['checker_code']:
+        return None, None
+    checker_dir = tempfile.mkdtemp()
+    checker_path, checker_output = compile_checker(settings['checker_code'], checker_dir, get_compile_cache())
+    return _checker_ready(checker_dir, checker_path, checker_output, results)
+
+
+async def _prepare_checker_async(settings, results):
+    """Coroutine version of _prepare_checker; cancelling it kills the compiler"""
+    if not settings['checker_code']:
+        return None, None
+    checker_dir = tempfile.mkdtemp()
+    # Same source name and flags as compile_checker, so both share the cached checker
+    source_path = os.path.join(checker_dir, "checker.cpp")
+    try:
+        with open(source_path, 'w') as f:
+            f.write(settings['checker_code'])
+        checker_output = await compile_source_async(source_path, f"{source_path}.out",
+                                                    flags=compile_flags(CHECKER_PROFILE), cache=get_compile_cache())
+    except BaseException:
+        shutil.rmtree(checker_dir, ignore_errors=True)
+        raise
+    return _checker_ready(checker_dir, f"{source_path}.out", checker_output, results)
+
+
+def _checker_ready(checker_dir, checker_path, checker_output, results):
+    """Result of _prepare_checker once the checker was compiled"""
+    if checker_output['returncode'] != 0:
+        shutil.rmtree(checker_dir, ignore_errors=True)
+        results['feedback'] = f"Error: the exercise's checker program does not compile:\n{checker_output['stderr']}"
+        return None, None
+    return checker_dir, checker_path
+
+
+def _test_details(test_id, passed, test_input, expected_output, actual_output, is_hidden, run_result=None,
+                  mismatch=None, limit_exceeded=None):
+    """Build the details entry of one test case, hiding the data of hidden tests"""
+    details = {
+        'test_id': test_id,
+        'passed': passed,
+        'input': test_input if not is_hidden else "[Hidden]",
+        'expected': expected_output if not is_hidden else "[Hidden]",
+        # Only an excerpt, so runaway output cannot bloat the feedback column
+        'actual': truncate_output(actual_output) if not is_hidden else "[Hidden]",
+        'output_limit_exceeded': bool(run_result and run_result.get('output_limit_exceeded')),
+        # Where the output first differs from the expected one
+        'mismatch': mismatch if not is_hidden else None,
+        # Calibrated time or memory limit the run broke
+        'limit_exceeded': limit_exceeded,
+        'timed_out': bool(run_result and run_result.get('timed_out')),
+        'time': run_result['time'] if run_result else None
+    }
+    # CPU time, peak memory and exit signal of the run
+    for field in USAGE_FIELDS:
+        details[field] = run_result.get(field) if run_result else None
+    return details
+
+
+def _resource_summary(details):
+    """Wall time, CPU time and peak memory of a submission over the tests that ran"""
+    ran = [test for test in details if test.get('time') is not None]
+    resources = {'wall_time': sum(test['time'] for test in ran) if ran else None}
+    resources.update(usage_summary(ran))
+    return resources
+
+
+def _build_feedback(results):
+    """Generate the feedback text shown to the student"""
+    feedback = []
+    feedback.append(f"Test Results: {results['passed_tests']}/{results['total_tests']} passed\n")
+
+    for i, test in enumerate(results['details']):
+        if test.get('skipped'):
+            feedback.append(f"Test {i + 1}: ⏭️ Skipped")
+            continue
+
+        status = "✅ Passed" if test['passed'] else "❌ Failed"
+        usage = format_usage(test)
+        feedback.append(f"Test {i + 1}: {status}" + (f" ({usage})" if usage else ""))
+
+        if not test['passed']:
+            feedback.append(f"  Input: {test['input']}")
+            feedback.append(f"  Expected: {test['expected']}")
+            feedback.append(f"  Your output: {test['actual']}")
+            if test.get('mismatch'):
+                feedback.append(f"  First difference: {test['mismatch']}")
+            if test.get('limit_exceeded'):
+                feedback.append(f"  {test['limit_exceeded']}")
+            if test.get('output_limit_exceeded'):
+                feedback.append("  Output limit exceeded - your program printed too much output")
+            if test.get('signal'):
+                feedback.append(f"  Program was killed by {test['signal']}")
+            feedback.append("")
+
+    return "\n".join(feedback)
+
+
+def _skipped_details(test_id, test_input, expected_output, is_hidden):
+    """Details entry of a test case that fail-fast grading did not run"""
+    details = _test_details(test_id, False, test_input, expected_output,
+                            "Skipped - grading stopped after earlier failures", is_hidden)
+    details['skipped'] = True
+    return details
+
+
+def _run_order(exercise_id, test_cases, max_failures, final):
+    """Test case indexes in the order to run them: likely failures first when failing fast"""
+    if final or not max_failures:
+        return list(range(len(test_cases)))
+    return order_tests_by_failure_rate(exercise_id, test_cases)
+
+
+def _grading_steps(exercise_id, test_cases, settings, timeout, max_failures, final, repeat, checker_path):
+    """
+    Per-test grading flow shared by _grade_submission and _grade_submission_async
+
+    A generator that leaves running programs to its caller: it yields
+    ('run', test, timeout) to have the submission run on a test and
+    ('check', test, output) to have the exercise's checker judge an output,
+    and is sent back the run result or verdict; it yields
+    ('test', index, details) once a test case is decided.
+
+    Returns:
+        list: Details of every test case, in test order
+    """
+    details = [None] * len(test_cases)
+    failures = 0
+    for index in _run_order(exercise_id, test_cases, max_failures, final):
+        test_id, test_input, expected_output, is_hidden = test_cases[index][:4]
+        test = _test_data(test_cases[index])
+
+        if max_failures and not final and failures >= max_failures:
+            details[index] = _skipped_details(test_id, test_input, expected_output, is_hidden)
+            yield 'test', index, details[index]
+            continue
+
+        # A calibrated exercise gives each test its own time limit
+        test_timeout = test['time_limit'] or timeout
+        run_result = yield 'run', test, test_timeout
+
+        limit_exceeded = limit_verdict(test, run_result)
+        if run_result.get('timed_out'):
+            details[index] = _test_details(
+                test_id, False, test_input, expected_output,
+                "Timeout - Program took too long to execute", is_hidden, run_result,
+                limit_exceeded=limit_exceeded
+            )
+        else:
+            # Check if output matches expected
+            if checker_path and not run_result.get('output_limit_exceeded'):
+                comparison = yield 'check', test, run_result['stdout']
+            else:
+                with open_test_data(test, 'expected_output') as expected:
+                    comparison = compare_output(run_result['stdout'], expected, settings['compare_mode'])
+            passed = comparison['passed'] and not run_result.get('output_limit_exceeded') and not limit_exceeded
+
+            # Add test case details
+            details[index] = _test_details(test_id, passed, test_input, expected_output.strip(),
+                                           run_result['stdout'].strip(), is_hidden, run_result,
+                                           comparison['message'] if not run_result.get('output_limit_exceeded')
+                                           else None, limit_exceeded)
+
+            if passed and repeat > 1:
+                times = [run_result['time']]
+                for _ in range(repeat - 1):
+                    rerun = yield 'run', test, test_timeout
+                    times.append(rerun['time'])
+                details[index]['median_time'], details[index]['runs'] = statistics.median(times), len(times)
+        details[index]['reference_time'] = test['reference_time']
+
+        if not details[index]['passed']:
+            failures += 1
+        yield 'test', index, details[index]
+    return details
+
+
+def _finish_results(results, details):
+    """Fill in the per-test details, totals and feedback of a graded submission"""
+    results['details'] = details
+    results['passed_tests'] = sum(1 for test in details if test['passed'])
+    results['resources'] = _resource_summary(details)
+    results['feedback'] = _build_feedback(results)
+
+
+def check_submission(exercise_id, file_path, timeout=5, on_event=None, max_failures=None, final=False,
+                     output_limit=OUTPUT_LIMIT, repeat=1):
+    """
+    Check a C++ submission against test cases using Docker
+
+    Args:
+        exercise_id (int): Exercise ID
+        file_path (str): Path of the submitted C++ file
+        timeout (int): Timeout in seconds for test cases without a calibrated time limit
+        on_event (callable, optional): Called with a 'compile' event and then a 'test'
+            event per test case as soon as each one is known; the 'compile' event has
+            'cached_result' when the whole result is replayed from the result cache
+        max_failures (int, optional): Stop after this many failed tests, running the tests
+            that fail most often first; the rest are reported as skipped
+        final (bool): Final-submission grading, which always runs every test in order
+        output_limit (int): Bytes of output after which a test is stopped and fails
+        repeat (int): Run each passing test this many times and report its median time
+            ('median_time'), for students optimizing their solution
+
+    Returns:
+        dict: passed_tests, total_tests, per-test details (in test order) with their time, CPU
+            time and peak memory, the submission's total 'resources' and feedback; 'cached' is
+            True when the same code was already graded against the same test suite
+    """
+    settings = get_grading_settings(exercise_id)
+    if repeat > 1:
+        # Timing runs are measured afresh every time
+        results, _ = _grade_submission(exercise_id, file_path, settings, timeout, on_event, max_failures, final,
+                                       output_limit, repeat)
+        return results
+
+    code_hash = source_hash(_read_source(file_path))
+    options = _result_cache_options(timeout, max_failures, final, output_limit)
+
+    cached = _load_cached_result(exercise_id, code_hash, settings['suite_version'], options)
+    if cached:
+        return _replay_cached_result(cached, on_event)
+
+    results, compile_output = _grade_submission(exercise_id, file_path, settings, timeout, on_event, max_failures,
+                                                final, output_limit)
+    _store_cached_result(exercise_id, code_hash, settings['suite_version'], options, results, compile_output)
+    return results
+
+
+def _grade_submission(exercise_id, file_path, settings, timeout, on_event, max_failures, final, output_limit,
+                      repeat=1):
+    """Grade a submission for check_submission, returning (results, compile output)"""
+    test_cases = _load_test_cases(exercise_id)
 
     results = {
         'passed_tests': 0,
@@ -222,82 +776,52 @@ def check_submission(exercise_id, file_path):
         'feedback': ''
     }
 
+    checker_dir = None
+    compile_output = None
+
     # Compile the code (Replace this with Docker execution in production)
     # For now, we'll simulate compilation and execution for demonstration
     try:
         # Compile (in a real scenario, this would be done in Docker)
-        compile_output = subprocess.run(['g++', file_path, '-o', f"{file_path}.out"],
-                                        capture_output=True, text=True)
+        compile_output = compile_source(file_path, f"{file_path}.out",
+                                        flags=compile_flags(settings['compile_profile']),
+                                        cache=get_compile_cache())
+        if on_event:
+            on_event({'event': 'compile', 'compilation': compile_output})
 
-        if compile_output.returncode != 0:
+        if compile_output['returncode'] != 0:
             # Compilation error
-            results['feedback'] = f"Compilation Error:\n{compile_output.stderr}"
-            return results
-
-        # For each test case
-        for test_id, test_input, expected_output, is_hidden in test_cases:
-            # Create temporary input file
-            with tempfile.NamedTemporaryFile('w', delete=False) as input_file:
-                input_file.write(test_input)
-                input_path = input_file.name
-
-            # Run the compiled program
+            results['feedback'] = f"Compilation Error:\n{compile_output['stderr']}"
+            return results, compile_output
+
+        # Compiled once per exercise thanks to the compile cache
+        checker_dir, checker_path = _prepare_checker(settings, results)
+        if settings['checker_code'] and not checker_path:
+            return results, compile_output
+
+        steps = _grading_steps(exercise_id, test_cases, settings, timeout, max_failures, final, repeat,
+                               checker_path)
+        reply = None
+        while True:
             try:
-                with open(input_path, 'r') as stdin:
-                    process = subprocess.run([f"{file_path}.out"],
-                                             stdin=stdin,
-                                             capture_output=True,
-                                             text=True,
-                                             timeout=5)  # 5 second timeout
-
-                # Get output and strip whitespace
-                actual_output = process.stdout.strip()
-                expected_output = expected_output.strip()
-
-                # Check if output matches expected
-                passed = actual_output == expected_output
-
-                if passed:
-                    results['passed_tests'] += 1
-
-                # Add test case details
-                test_result = {
-                    'test_id': test_id,
-                    'passed': passed,
-                    'input': test_input if not is_hidden else "[Hidden]",
-                    'expected': expected_output if not is_hidden else "[Hidden]",
-                    'actual': actual_output if not is_hidden else "[Hidden]"
-                }
-
-                results['details'].append(test_result)
-
-            except subprocess.TimeoutExpired:
-                results['details'].append({
-                    'test_id': test_id,
-                    'passed': False,
-                    'input': test_input if not is_hidden else "[Hidden]",
-                    'expected': expected_output if not is_hidden else "[Hidden]",
-                    'actual': "Timeout - Program took too long to execute"
-                })
-
-            # Clean up input file
-            os.unlink(input_path)
-
-        # Generate feedback
-        feedback = []
-        feedback.append(f"Test Results: {results['passed_tests']}/{results['total_tests']} passed\n")
-
-        for i, test in enumerate(results['details']):
-            status = "✅ Passed" if test['passed'] else "❌ Failed"
-            feedback.append(f"Test {i + 1}: {status}")
-
-            if not test['passed']:
-                feedback.append(f"  Input: {test['input']}")
-                feedback.append(f"  Expected: {test['expected']}")
-                feedback.append(f"  Your output: {test['actual']}")
-                feedback.append("")
-
-        results['feedback'] = "\n".join(feedback)
+                step = steps.send(reply)
+            except StopIteration as done:
+                details = done.value
+                break
+            reply = None
+            if step[0] == 'run':
+                # Run the compiled program, piping the input (streamed from the blob store if large) into it
+                with open_test_data(step[1], 'input', binary=True) as input_data:
+                    reply = run_with_timeout([f"{file_path}.out"], input_data, timeout=step[2],
+                                             output_limit=output_limit)
+            elif step[0] == 'check':
+                with open_test_data(step[1], 'input') as checker_input, \
+                        open_test_data(step[1], 'expected_output') as expected:
+                    reply = run_checker(checker_path, checker_input, step[2], expected)
+            elif on_event:
+                on_event({'event': 'test', 'index': step[1], 'test': step[2]})
+
+        _finish_results(results, details)
 
     except Exception as e:
         results['feedback'] = f"Error: {str(e)}"
@@ -307,10 +831,138 @@ def check_submission(exercise_id, file_path):
         os.unlink(f"{file_path}.out")
     except:
         pass
-
+    if checker_dir:
+        shutil.rmtree(checker_dir, ignore_errors=True)
+
+    return results, compile_output
+
+
+def iter_submission(exercise_id, file_path, timeout=5, max_failures=None, final=False, repeat=1):
+    """
+    Check a C++ submission, yielding progress as it happens
+
+    Args:
+        exercise_id (int): Exercise ID
+        file_path (str): Path of the submitted C++ file
+        timeout (int): Timeout in seconds for each test case
+        max_failures (int, optional): Stop after this many failed tests, see check_submission
+        final (bool): Final-submission grading, which always runs every test in order
+        repeat (int): Runs of each passing test, see check_submission
+
+    Yields:
+        dict: {'event': 'compile', 'compilation': ...}, then {'event': 'test', 'index': i, 'test': ...}
+            per test case, and finally {'event': 'result', 'results': <check_submission dict>}
+    """
+    yield from iter_events(check_submission, exercise_id, file_path, timeout=timeout,
+                           max_failures=max_failures, final=final, repeat=repeat)
+
+
+async def check_submission_async(exercise_id, file_path, timeout=5, max_failures=None, final=False,
+                                 output_limit=OUTPUT_LIMIT, repeat=1):
+    """
+    Coroutine version of check_submission built on asyncio subprocesses
+
+    Cancelling the task kills the compiler or test program that is running, so it
+    can be wrapped in asyncio.wait_for or awaited together with other submissions.
+
+    Args:
+        exercise_id (int): Exercise ID
+        file_path (str): Path of the submitted C++ file
+        timeout (int): Timeout in seconds for test cases without a calibrated time limit
+        max_failures (int, optional): Stop after this many failed tests, see check_submission
+        final (bool): Final-submission grading, which always runs every test in order
+        output_limit (int): Bytes of output after which a test is stopped and fails
+        repeat (int): Runs of each passing test, see check_submission
+
+    Returns:
+        dict: Same result dict as check_submission
+    """
+    settings = get_grading_settings(exercise_id)
+    if repeat > 1:
+        # Timing runs are measured afresh every time
+        results, _ = await _grade_submission_async(exercise_id, file_path, settings, timeout, max_failures, final,
+                                                   output_limit, repeat)
+        return results
+
+    code_hash = source_hash(_read_source(file_path))
+    options = _result_cache_options(timeout, max_failures, final, output_limit)
+
+    cached = _load_cached_result(exercise_id, code_hash, settings['suite_version'], options)
+    if cached:
+        return _replay_cached_result(cached)
+
+    results, compile_output = await _grade_submission_async(exercise_id, file_path, settings, timeout, max_failures,
+                                                            final, output_limit)
+    _store_cached_result(exercise_id, code_hash, settings['suite_version'], options, results, compile_output)
     return results
 
 
+async def _grade_submission_async(exercise_id, file_path, settings, timeout, max_failures, final, output_limit,
+                                  repeat=1):
+    """Grade a submission for check_submission_async, returning (results, compile output)"""
+    test_cases = _load_test_cases(exercise_id)
+
+    results = {
+        'passed_tests': 0,
+        'total_tests': len(test_cases),
+        'details': [],
+        'feedback': ''
+    }
+
+    checker_dir = None
+    compile_output = None
+    try:
+        compile_output = await compile_source_async(file_path, f"{file_path}.out",
+                                                    flags=compile_flags(settings['compile_profile']),
+                                                    cache=get_compile_cache())
+
+        if compile_output['returncode'] != 0:
+            # Compilation error
+            results['feedback'] = f"Compilation Error:\n{compile_output['stderr']}"
+            return results, compile_output
+
+        checker_dir, checker_path = await _prepare_checker_async(settings, results)
+        if settings['checker_code'] and not checker_path:
+            return results, compile_output
+
+        steps = _grading_steps(exercise_id, test_cases, settings, timeout, max_failures, final, repeat,
+                               checker_path)
+        reply = None
+        while True:
+            try:
+                step = steps.send(reply)
+            except StopIteration as done:
+                details = done.value
+                break
+            reply = None
+            if step[0] == 'run':
+                # Feed the input straight through the pipe
+                with open_test_data(step[1], 'input', binary=True) as input_data:
+                    reply = await run_with_timeout_async([f"{file_path}.out"], input_data, timeout=step[2],
+                                                         output_limit=output_limit)
+            elif step[0] == 'check':
+                with open_test_data(step[1], 'input') as checker_input, \
+                        open_test_data(step[1], 'expected_output') as expected:
+                    reply = await run_checker_async(checker_path, checker_input, step[2], expected)
+
+        _finish_results(results, details)
+
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        results['feedback'] = f"Error: {str(e)}"
+    finally:
+        # Clean up compiled file
+        try:
+            os.unlink(f"{file_path}.out")
+        except OSError:
+            pass
+        if checker_dir:
+            shutil.rmtree(checker_dir, ignore_errors=True)
+
+    return results, compile_output
+
+
 def get_user_progress():
     """Get the number of completed exercises"""
     conn = sqlite3.connect(DB_PATH)
@@ -336,6 +988,10 @@ def import_exercise_from_file(file_path):
             # Process as CSV
             title = lines[0].split(',')[0].strip()
             difficulty = lines[0].split(',')[1].strip()
+            compile_profile = None
+            compare_mode = None
+            checker_code = None
+            reference_code = None
             description = '\n'.join(lines[1:lines.index("TEST CASES")])
             test_case_lines = lines[lines.index("TEST CASES") + 1:]
 
@@ -387,22 +1043,31 @@ def import_exercise_from_file(file_path):
             difficulty = data_dict.get('difficulty', 'Medium')
             description = data_dict.get('description', '')
             test_cases = data_dict.get('test_cases', [])
+            compile_profile = data_dict.get('compile_profile')
+            compare_mode = data_dict.get('compare_mode')
+            checker_code = data_dict.get('checker_code')
+            reference_code = data_dict.get('reference_code')
 
         # Save to database
         conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
 
         cursor.execute(
-            "INSERT INTO exercises (title, description, difficulty) VALUES (?, ?, ?)",
-            (title, description, difficulty)
+            "INSERT INTO exercises (title, description, difficulty, compile_profile, compare_mode, checker_code, "
+            "reference_code) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (title, description, difficulty, compile_profile, compare_mode, checker_code, reference_code)
         )
 
         exercise_id = cursor.lastrowid
 
         for tc in test_cases:
+            # Large inputs and outputs go to the blob store
+            test_input, input_blob = split_test_data(tc['input'])
+            expected_output, expected_blob = split_test_data(tc['expected_output'])
             cursor.execute(
-                "INSERT INTO test_cases (exercise_id, input, expected_output, is_hidden) VALUES (?, ?, ?, ?)",
-                (exercise_id, tc['input'], tc['expected_output'], tc.get('is_hidden', False))
+                "INSERT INTO test_cases (exercise_id, input, expected_output, is_hidden, input_blob, expected_blob) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (exercise_id, test_input, expected_output, tc.get('is_hidden', False), input_blob, expected_blob)
             )
 
         conn.commit()
@@ -0,0 +1,208 @@
+"""
+Test-data generation from a generator program and an exercise's reference solution.
+
+The generator is a C++ program that prints one test input to stdout and takes
+a seed as its only argument (argv[1]); it must print the same input for the same
+seed. Test i of a run gets seed SEED + i, its expected output is whatever the
+reference solution (exercises.reference_code, or one given explicitly) prints
+for that input. Generator and reference run in parallel workers under the
+local sandbox's rlimits and network isolation, and the new test cases are
+inserted in one transaction: a generator or reference that fails on any seed
+leaves the exercise unchanged.
+
+Every generated test case records its seed (test_cases.generator_seed) and the
+generator is stored with the exercise (exercises.generator_code), so running
+this again with the same count and seed rebuilds the same suite. By default the
+earlier generated tests are replaced; hand-written ones are always kept. Stored
+submissions keep their verdicts until rejudge.py is run.
+
+Usage:
+    python generate_tests.py EXERCISE_ID --count N [--generator GEN.cpp] [--reference REF.cpp]
+                             [--seed S] [--visible] [--append] [--workers N]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import exercise_handler
+from CURD_ex_data import add_test_cases, update_exercise
+from local_sandbox import COMPILE_MEMORY, isolation_prefix, network_isolation_prefix, rlimit_prefix
+from run_cpp import CHECKER_PROFILE, compile_flags, compile_source, cpu_allowance, run_with_timeout
+
+DEFAULT_SEED = 1
+# Per run of the generator or the reference solution
+GENERATION_TIMEOUT = 10
+# Largest input or expected output a run may print; bigger data ends up in the blob store
+GENERATED_OUTPUT_LIMIT = 64 * 1024 * 1024
+# Generators are test tooling, built like checkers rather than like the exercise
+GENERATOR_PROFILE = CHECKER_PROFILE
+
+
+def _compile(code, name, work_dir, flags):
+    """
+    Compile a program for generation
+
+    Returns:
+        tuple: (path of the executable, None) or (None, compiler errors)
+    """
+    code_path = os.path.join(work_dir, f"{name}.cpp")
+    with open(code_path, 'w') as f:
+        f.write(code)
+    compilation = compile_source(code_path, f"{code_path}.out", flags=flags,
+                                 cache=exercise_handler.get_compile_cache(),
+                                 prefix=rlimit_prefix(60, memory=COMPILE_MEMORY))
+    if compilation['returncode'] != 0:
+        return None, compilation['stderr']
+    return f"{code_path}.out", None
+
+
+def _run_sandboxed(cmd, input_data, timeout, work_dir):
+    """
+    Run a generator or reference solution under the local sandbox's limits
+
+    Returns:
+        tuple: (stdout, None) or (None, why the run failed)
+    """
+    isolation = isolation_prefix(work_dir) if work_dir else network_isolation_prefix()
+    prefix = isolation + rlimit_prefix(int(timeout) + 1)
+    result = run_with_timeout(prefix + cmd, input_data, timeout=timeout, cwd=work_dir,
+                              output_limit=GENERATED_OUTPUT_LIMIT)
+    if result.get('timed_out'):
+        return None, f"timed out after {timeout}s"
+    if result.get('output_limit_exceeded'):
+        return None, f"printed more than {GENERATED_OUTPUT_LIMIT} bytes"
+    if result['returncode'] != 0:
+        stderr = result['stderr'].strip()
+        return None, f"exited with code {result['returncode']}" + (f": {stderr[:500]}" if stderr else "")
+    return result['stdout'], None
+
+
+def generate_case(generator_path, reference_path, seed, timeout=GENERATION_TIMEOUT, work_dir=None):
+    """
+    Build one test case
+
+    Args:
+        generator_path (str): Compiled generator
+        reference_path (str): Compiled reference solution
+        seed (int): Seed passed to the generator
+        timeout (int): Timeout in seconds for each of the two runs
+        work_dir (str, optional): Working directory of the runs
+
+    Returns:
+        tuple: ({'input', 'expected_output', 'generator_seed'}, None) or (None, error message)
+    """
+    test_input, error = _run_sandboxed([generator_path, str(seed)], None, timeout, work_dir)
+    if error:
+        return None, f"Generator failed for seed {seed}: {error}"
+    expected_output, error = _run_sandboxed([reference_path], test_input, timeout, work_dir)
+    if error:
+        return None, f"Reference solution failed for seed {seed}: {error}"
+    return {'input': test_input, 'expected_output': expected_output, 'generator_seed': seed}, None
+
+
+def generate_test_cases(exercise_id, count, generator_code=None, reference_code=None, seed=DEFAULT_SEED,
+                        hidden=True, replace=True, workers=None, timeout=GENERATION_TIMEOUT):
+    """
+    Generate test cases for an exercise and add them to its suite
+
+    Args:
+        exercise_id (int): Exercise ID
+        count (int): Number of test cases to generate
+        generator_code (str, optional): Generator program, the exercise's stored one if omitted;
+            stored with the exercise once generation succeeds
+        reference_code (str, optional): Solution computing the expected outputs, the exercise's
+            reference_code if omitted
+        seed (int): Seed of the first test case, the others get the following seeds
+        hidden (bool): Whether the new test cases are hidden
+        replace (bool): Delete the exercise's earlier generated test cases
+        workers (int, optional): Parallel runs, the available CPUs if omitted
+        timeout (int): Timeout in seconds for each run of the generator or reference
+
+    Returns:
+        tuple: (success bool, message string); nothing is stored unless every test case
+            could be generated
+    """
+    conn = sqlite3.connect(exercise_handler.DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT generator_code, reference_code, compile_profile FROM exercises WHERE id = ?",
+                   (exercise_id,))
+    exercise = cursor.fetchone()
+    conn.close()
+
+    if not exercise:
+        return False, f"Exercise with ID {exercise_id} not found"
+    stored_generator, stored_reference, compile_profile = exercise
+    generator_code = generator_code or stored_generator
+    reference_code = reference_code or stored_reference
+    if not generator_code:
+        return False, f"Exercise with ID {exercise_id} has no generator program"
+    if not reference_code:
+        return False, f"Exercise with ID {exercise_id} has no reference solution"
+    if count < 1:
+        return False, "Nothing to generate"
+
+    work_dir = tempfile.mkdtemp(prefix="generate-")
+    try:
+        generator_path, error = _compile(generator_code, "generator", work_dir, compile_flags(GENERATOR_PROFILE))
+        if error:
+            return False, f"Generator does not compile:\n{error}"
+        reference_path, error = _compile(reference_code, "reference", work_dir, compile_flags(compile_profile))
+        if error:
+            return False, f"Reference solution does not compile:\n{error}"
+
+        with ThreadPoolExecutor(max_workers=workers or cpu_allowance()) as executor:
+            futures = [executor.submit(generate_case, generator_path, reference_path, seed + i, timeout, work_dir)
+                       for i in range(count)]
+            test_cases = []
+            for future in futures:
+                test_case, error = future.result()
+                if error:
+                    for pending in futures:
+                        pending.cancel()
+                    return False, error
+                test_case['is_hidden'] = hidden
+                test_cases.append(test_case)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    success, message = add_test_cases(exercise_id, test_cases, replace_generated=replace)
+    if not success:
+        return False, message
+    if generator_code != stored_generator:
+        update_exercise(exercise_id, generator_code=generator_code)
+    return True, f"{message} (seeds {seed} to {seed + count - 1})"
+
+
+def _read_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate test cases from a generator and a reference solution")
+    parser.add_argument("exercise_id", type=int, help="Exercise to add the test cases to")
+    parser.add_argument("--count", type=int, required=True, help="Number of test cases")
+    parser.add_argument("--generator", help="Generator source, the exercise's stored generator if omitted")
+    parser.add_argument("--reference", help="Reference solution source, the exercise's reference_code if omitted")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Seed of the first test case")
+    parser.add_argument("--visible", action="store_true", help="Show the test cases to students")
+    parser.add_argument("--append", action="store_true", help="Keep earlier generated test cases")
+    parser.add_argument("--workers", type=int, help="Parallel runs, the available CPUs by default")
+    args = parser.parse_args()
+
+    exercise_handler.create_tables_if_not_exist()
+    success, message = generate_test_cases(
+        args.exercise_id, args.count,
+        generator_code=_read_file(args.generator) if args.generator else None,
+        reference_code=_read_file(args.reference) if args.reference else None,
+        seed=args.seed, hidden=not args.visible, replace=not args.append, workers=args.workers
+    )
+    print(message)
+    raise SystemExit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
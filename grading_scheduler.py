@@ -0,0 +1,260 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from run_cpp import cpu_allowance
+
+# Lower numbers are graded first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REJUDGE = 10
+
+# Sorts after every real job so workers finish the queue before stopping
+_STOP = float("inf")
+
+
+def _local_backend(*args, **kwargs):
+    from exercise_handler import check_submission
+    return check_submission(*args, **kwargs)
+
+
+def _docker_backend(*args, **kwargs):
+    from docker_runner import run_code_in_docker
+    return run_code_in_docker(*args, **kwargs)
+
+
+def _sandbox_backend(*args, **kwargs):
+    from local_sandbox import run_code_in_sandbox
+    return run_code_in_sandbox(*args, **kwargs)
+
+
+# Executor backends a scheduler can dispatch to
+BACKENDS = {
+    "local": _local_backend,  # check_submission(exercise_id, file_path)
+    "docker": _docker_backend,  # run_code_in_docker(code_str, test_cases, timeout=5)
+    "sandbox": _sandbox_backend,  # run_code_in_sandbox(code_str, test_cases, timeout=5)
+}
+
+
+def _backend_function(backend):
+    """The grading function of a backend given by name (see BACKENDS) or as a callable"""
+    return BACKENDS[backend] if isinstance(backend, str) else backend
+
+
+class GradingScheduler:
+    """
+    Bounded, prioritised queue of grading jobs served by a fixed number of workers
+
+    Each job calls a backend (check_submission, run_code_in_docker,
+    run_code_in_sandbox or any callable returning a result dict), the
+    scheduler's own unless the job names another, and resolves a
+    concurrent.futures.Future.
+    """
+
+    def __init__(self, backend="local", workers=None, max_queue=100):
+        self.backend = _backend_function(backend)
+        self.workers = workers or cpu_allowance()
+        self._queue = queue.PriorityQueue(maxsize=max_queue)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'busy': 0,
+            'total_wait': 0.0,
+            'max_wait': 0.0,
+            'total_service': 0.0,
+            'max_service': 0.0
+        }
+
+        self._threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"grader-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, *args, priority=PRIORITY_INTERACTIVE, block=True, timeout=None, backend=None, **kwargs):
+        """
+        Queue a grading job
+
+        Args:
+            *args: Positional arguments for the backend
+            priority (int): PRIORITY_INTERACTIVE, PRIORITY_REJUDGE or any number (lower runs first)
+            block (bool): Wait for room when the queue is full instead of raising queue.Full
+            timeout (float, optional): Seconds to wait for room in the queue
+            backend (str | callable, optional): Backend of this job, the scheduler's own if omitted
+            **kwargs: Keyword arguments for the backend
+
+        Returns:
+            Future: Resolves to the backend's result dict
+        """
+        future = Future()
+        job = (_backend_function(backend) if backend else self.backend, args, kwargs, future, time.monotonic())
+        # The sequence number keeps jobs of equal priority in FIFO order
+        self._queue.put((priority, next(self._sequence), job), block=block, timeout=timeout)
+        with self._lock:
+            self._stats['submitted'] += 1
+        return future
+
+    def stream(self, *args, priority=PRIORITY_INTERACTIVE, backend=None, **kwargs):
+        """
+        Queue a grading job and yield its progress events as they happen
+
+        The backend must accept an `on_event` callback (all of the BACKENDS do).
+        The last event is {'event': 'result', 'results': ...}.
+
+        Args:
+            *args: Positional arguments for the backend
+            priority (int): Queue priority, see submit()
+            backend (str | callable, optional): Backend of this job, see submit()
+            **kwargs: Keyword arguments for the backend
+
+        Yields:
+            dict: 'compile' and 'test' events, then the 'result' event
+        """
+        events = queue.Queue()
+        future = self.submit(*args, priority=priority, backend=backend, on_event=events.put, **kwargs)
+        yield from _drain_events(events, future)
+
+    def _work(self):
+        while True:
+            priority, _, job = self._queue.get()
+            if priority == _STOP:
+                return
+
+            backend, args, kwargs, future, enqueued = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            started = time.monotonic()
+            waited = started - enqueued
+            with self._lock:
+                self._stats['busy'] += 1
+                self._stats['total_wait'] += waited
+                self._stats['max_wait'] = max(self._stats['max_wait'], waited)
+
+            try:
+                future.set_result(backend(*args, **kwargs))
+                failed = False
+            except Exception as e:
+                future.set_exception(e)
+                failed = True
+
+            service = time.monotonic() - started
+            with self._lock:
+                self._stats['busy'] -= 1
+                self._stats['completed' if not failed else 'failed'] += 1
+                self._stats['total_service'] += service
+                self._stats['max_service'] = max(self._stats['max_service'], service)
+
+    def stats(self):
+        """
+        Report queue depth, wait time and service time
+
+        Returns:
+            dict: Worker count, queue depth, job counters and wait/service times in seconds
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        finished = stats['completed'] + stats['failed']
+        started = finished + stats['busy']
+        stats['workers'] = self.workers
+        stats['queue_depth'] = self._queue.qsize()
+        stats['avg_wait'] = stats['total_wait'] / started if started else 0.0
+        stats['avg_service'] = stats['total_service'] / finished if finished else 0.0
+        return stats
+
+    def shutdown(self, wait=True):
+        """Stop the workers once the jobs already queued have been graded"""
+        for _ in self._threads:
+            self._queue.put((_STOP, next(self._sequence), None))
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+def _drain_events(events, future):
+    """Yield events from a queue until the job's future is done, then its result"""
+    while True:
+        try:
+            yield events.get(timeout=0.05)
+        except queue.Empty:
+            if future.done() and events.empty():
+                break
+    yield {'event': 'result', 'results': future.result()}
+
+
+def iter_events(func, *args, **kwargs):
+    """
+    Run a grading function on a background thread and yield its progress events
+
+    Args:
+        func (callable): Grading function accepting an `on_event` callback
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+
+    Yields:
+        dict: 'compile' and 'test' events, then {'event': 'result', 'results': ...}
+    """
+    events = queue.Queue()
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(func(*args, on_event=events.put, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    yield from _drain_events(events, future)
+
+
+class BackendScheduler:
+    """A backend's handle on a shared GradingScheduler: its jobs go into the shared queue"""
+
+    def __init__(self, scheduler, backend):
+        self.scheduler = scheduler
+        self.backend = backend
+
+    def submit(self, *args, **kwargs):
+        """Queue a job for this backend, see GradingScheduler.submit"""
+        return self.scheduler.submit(*args, backend=self.backend, **kwargs)
+
+    def stream(self, *args, **kwargs):
+        """Queue a job for this backend and yield its events, see GradingScheduler.stream"""
+        return self.scheduler.stream(*args, backend=self.backend, **kwargs)
+
+    def stats(self):
+        """Statistics of the shared scheduler"""
+        return self.scheduler.stats()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(backend="local"):
+    """
+    Get the process-wide scheduler for a backend
+
+    Every backend shares one priority queue and one set of workers, so
+    interactive submissions are graded before rejudges whichever backends they
+    use, and the backends together never run more jobs than there are workers.
+    The worker count defaults to the available cores and can be set with the
+    GRADING_WORKERS environment variable.
+
+    Args:
+        backend (str): Name of a backend in BACKENDS
+
+    Returns:
+        BackendScheduler: Submits the backend's jobs to the shared scheduler
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            workers = int(os.environ.get("GRADING_WORKERS", "0")) or None
+            _scheduler = GradingScheduler(backend, workers=workers)
+    return BackendScheduler(_scheduler, backend)
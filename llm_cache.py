@@ -0,0 +1,188 @@
+"""
+Persistent cache of model replies for prompts that do not depend on a conversation.
+
+Code reviews of the same code with the same test results, and the first
+question of a chat session ("what is a pointer"), come up again and again.
+Their replies are stored in a SQLite file keyed by the model, the version of
+the system prompt and the normalized prompt, so a repeat is answered without
+asking the model. Entries expire after `ttl` seconds, and beyond `max_entries`
+the least recently used ones are evicted.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_DB = os.environ.get("LLM_CACHE_DB", "dataBase/llm_cache.db")
+DEFAULT_TTL = int(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt, casefold=False):
+    """
+    Normalize a prompt before hashing, so spacing (and optionally case) does not matter
+
+    Args:
+        prompt (str): The prompt
+        casefold (bool): Also ignore case and trailing punctuation, for questions typed
+            by hand; prompts with a code fence in them only get their spacing normalized
+
+    Returns:
+        str: Normalized prompt
+    """
+    prompt = _WHITESPACE.sub(" ", prompt).strip()
+    # Case matters in code, `int X` and `int x` are different questions
+    if casefold and "```" not in prompt:
+        prompt = prompt.casefold().rstrip(" ?!.")
+    return prompt
+
+
+def make_response_key(model, prompt_version, prompt, casefold=False):
+    """
+    Build the cache key of a prompt
+
+    Args:
+        model (str): Model name
+        prompt_version (str): Version of the system prompt the reply was given under
+        prompt (str): The prompt
+        casefold (bool): See normalize_prompt
+
+    Returns:
+        str: Hex digest identifying the reply
+    """
+    data = [model, prompt_version, normalize_prompt(prompt, casefold)]
+    return hashlib.sha256(json.dumps(data).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed LRU cache of model replies with a time to live"""
+
+    def __init__(self, db_path=DEFAULT_CACHE_DB, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # kind -> {'hits', 'misses'}, e.g. 'chat' and 'review'
+        self._stats = {}
+        self._evictions = 0
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            kind TEXT,
+            reply TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used)")
+        conn.commit()
+        conn.close()
+
+    def _count(self, kind, name):
+        with self._lock:
+            counters = self._stats.setdefault(kind, {'hits': 0, 'misses': 0})
+            counters[name] += 1
+
+    def get(self, key, kind="default"):
+        """
+        Look up a reply
+
+        Args:
+            key (str): Key from make_response_key
+            kind (str): What the prompt is, for the hit rates in stats()
+
+        Returns:
+            str: The cached reply, or None on a miss or when it has expired
+        """
+        now = time.time()
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute("SELECT reply, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row and now - row[1] > self.ttl:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            row = None
+        elif row:
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        conn.commit()
+        conn.close()
+
+        self._count(kind, 'hits' if row else 'misses')
+        return row[0] if row else None
+
+    def put(self, key, reply, kind="default"):
+        """Store a reply, evicting expired and least recently used entries beyond max_entries"""
+        now = time.time()
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, kind, reply, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, kind, reply, now, now)
+        )
+        evicted = conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)).rowcount
+        evicted += conn.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        ).rowcount
+        conn.commit()
+        conn.close()
+
+        if evicted:
+            with self._lock:
+                self._evictions += evicted
+
+    def clear(self):
+        """Remove every cached reply, e.g. after changing the prompts"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DELETE FROM responses")
+        conn.commit()
+        conn.close()
+
+    def stats(self):
+        """
+        Report hit/miss counters since startup
+
+        Returns:
+            dict: Hits, misses and hit rate overall and per kind ('by_kind'), evictions
+                and the number of cached entries
+        """
+        conn = sqlite3.connect(self.db_path)
+        entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        conn.close()
+
+        with self._lock:
+            by_kind = {kind: dict(counters) for kind, counters in self._stats.items()}
+            evictions = self._evictions
+        for counters in by_kind.values():
+            lookups = counters['hits'] + counters['misses']
+            counters['hit_rate'] = counters['hits'] / lookups if lookups else 0.0
+        hits = sum(counters['hits'] for counters in by_kind.values())
+        lookups = hits + sum(counters['misses'] for counters in by_kind.values())
+        return {
+            'hits': hits,
+            'misses': lookups - hits,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'by_kind': by_kind,
+            'evictions': evictions,
+            'entries': entries
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Get the process-wide response cache, creating it on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
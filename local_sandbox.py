@@ -0,0 +1,193 @@
+"""
+Container-free executor: compiles and runs submissions directly on the host.
+
+Sits between check_submission (no isolation) and run_code_in_docker (full
+isolation, but a container round trip per submission). Every job gets a fresh
+temporary working directory, g++ and the test programs run under rlimits (CPU
+time, address space, file size, process count) set with util-linux `prlimit`.
+Where the kernel allows unprivileged user namespaces, the test programs also
+get an empty network namespace and a mount namespace in which everything but
+the job's directory is read-only, so they cannot touch the application's
+databases, compile cache or code.
+"""
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from blob_store import DEFAULT_BLOB_DIR
+from compile_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from docker_runner import error_results, format_results, longest_run
+from run_cpp import OUTPUT_LIMIT, compile_flags, run_job
+
+# Limits for the test programs, matching the runner containers where they can
+SANDBOX_MEMORY = 512 * 1024 * 1024  # Address space in bytes
+SANDBOX_FILE_SIZE = 16 * 1024 * 1024  # Largest file a program may write
+SANDBOX_EXTRA_PROCESSES = 64  # Processes a program may start on top of the user's current ones
+
+# g++ needs far more address space than the programs it builds
+COMPILE_MEMORY = 2 * 1024 * 1024 * 1024
+
+# Runs a command under rlimits when prlimit is not installed
+_RLIMIT_SHIM = (
+    "import os, resource, sys\n"
+    "for name, value in zip(('RLIMIT_CPU', 'RLIMIT_AS', 'RLIMIT_FSIZE', 'RLIMIT_NPROC'), sys.argv[1:5]):\n"
+    "    resource.setrlimit(getattr(resource, name), (int(value), int(value)))\n"
+    "os.execvp(sys.argv[5], sys.argv[5:])\n"
+)
+
+# Run by `unshare -rmn` with the job directory as $1: keeps it writable, makes
+# every other mount read-only and runs the program in a nested user namespace,
+# where those mounts are locked and can no longer be remounted or unmounted
+_READ_ONLY_SCRIPT = """
+job=$1
+shift
+mount --bind "$job" "$job" || exit 126
+for target in $(awk '$3 != "proc" { print $2 }' /proc/self/mounts); do
+    target=$(printf '%b' "$target")
+    [ "$target" = "$job" ] || mount -o remount,bind,ro "$target" 2>/dev/null
+done
+exec unshare -r "$@"
+"""
+
+_network_prefix = None
+_read_only_mounts = None
+
+
+def network_isolation_prefix():
+    """
+    Command prefix that runs a program without network access, if this host supports it
+
+    Returns:
+        list: ['unshare', '-rn'] when unprivileged network namespaces work, else []
+    """
+    global _network_prefix
+    if _network_prefix is None:
+        _network_prefix = []
+        if shutil.which("unshare"):
+            try:
+                probe = subprocess.run(["unshare", "-rn", "true"], capture_output=True, timeout=5)
+                if probe.returncode == 0:
+                    _network_prefix = ["unshare", "-rn"]
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+    return _network_prefix
+
+
+def isolation_prefix(writable_dir):
+    """
+    Command prefix that runs a program without network access and with only `writable_dir` writable
+
+    Args:
+        writable_dir (str): Directory the program may write to
+
+    Returns:
+        list: The `unshare -rmn` prefix when this host supports it, else network_isolation_prefix()
+    """
+    global _read_only_mounts
+    if _read_only_mounts is None:
+        _read_only_mounts = False
+        if shutil.which("unshare") and shutil.which("mount"):
+            with tempfile.TemporaryDirectory(prefix="sandbox-probe-") as probe_dir:
+                try:
+                    probe = subprocess.run(["unshare", "-rmn", "sh", "-c", _READ_ONLY_SCRIPT, "sh",
+                                            os.path.realpath(probe_dir), "true"], capture_output=True, timeout=5)
+                    _read_only_mounts = probe.returncode == 0
+                except (OSError, subprocess.TimeoutExpired):
+                    pass
+        if not _read_only_mounts:
+            print("Local sandbox: mount namespaces are not available, test programs can write "
+                  "wherever this user can")
+    if not _read_only_mounts:
+        return network_isolation_prefix()
+    # Mount points are listed with symlinks resolved
+    return ["unshare", "-rmn", "sh", "-c", _READ_ONLY_SCRIPT, "sh", os.path.realpath(writable_dir)]
+
+
+def _count_user_processes():
+    """Number of processes the current user already runs (RLIMIT_NPROC counts them all)"""
+    uid = os.getuid()
+    count = 0
+    for pid in os.listdir("/proc"):
+        if pid.isdigit():
+            try:
+                if os.stat(f"/proc/{pid}").st_uid == uid:
+                    count += 1
+            except OSError:
+                pass
+    return count
+
+
+def rlimit_prefix(cpu_seconds, memory=SANDBOX_MEMORY, file_size=SANDBOX_FILE_SIZE,
+                  extra_processes=SANDBOX_EXTRA_PROCESSES):
+    """
+    Command prefix that runs a program under resource limits
+
+    Args:
+        cpu_seconds (int): CPU time limit
+        memory (int): Address space limit in bytes
+        file_size (int): Largest file the program may write, in bytes
+        extra_processes (int): Processes the program may start
+
+    Returns:
+        list: Command to put in front of the program's own
+    """
+    processes = _count_user_processes() + extra_processes
+    if shutil.which("prlimit"):
+        return [
+            "prlimit", f"--cpu={cpu_seconds}", f"--as={memory}", f"--fsize={file_size}", f"--nproc={processes}", "--"
+        ]
+    return [sys.executable, "-c", _RLIMIT_SHIM, str(cpu_seconds), str(memory), str(file_size), str(processes)]
+
+
+def run_code_in_sandbox(code_str, test_cases, timeout=5, parallel=False, on_event=None, max_failures=None,
+                        compile_profile=None, compare_mode=None, checker_code=None, repeat=1):
+    """
+    Run C++ code on the host inside the local sandbox
+
+    Takes the same arguments as docker_runner.run_code_in_docker and returns the
+    same result dict, so the two can be swapped.
+
+    Args:
+        code_str (str): C++ code as a string
+        test_cases (list): List of test case dictionaries with 'input' and 'expected_output' keys
+        timeout (int): Timeout in seconds for each test case
+        parallel (bool): Run the test cases concurrently, capped at the available CPUs
+        on_event (callable, optional): Called with 'compile' and 'test' events as they happen
+        max_failures (int, optional): Stop after this many failed tests and skip the rest
+        compile_profile (str, optional): Compiler flag profile of the exercise (see run_cpp.COMPILE_PROFILES)
+        compare_mode (str, optional): Output compare mode of the exercise (see output_compare)
+        checker_code (str, optional): C++ checker program judging the outputs instead of compare_mode
+        repeat (int): Runs of each passing test, reporting their median time
+
+    Returns:
+        dict: Results of code execution
+    """
+    # The CPU limit backs up the wall-clock timeout for programs that fork
+    cpu_seconds = math.ceil(longest_run(test_cases, timeout)) + 1
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="sandbox-") as work_dir:
+            config = {
+                "code": code_str,
+                "test_cases": test_cases,
+                "timeout": timeout,
+                "parallel": parallel,
+                "max_failures": max_failures,
+                "repeat": repeat,
+                "compile_flags": compile_flags(compile_profile),
+                "output_limit": OUTPUT_LIMIT,
+                "compare_mode": compare_mode,
+                "checker_code": checker_code,
+                "cache_dir": DEFAULT_CACHE_DIR,
+                "cache_max_bytes": DEFAULT_MAX_BYTES,
+                "blob_dir": os.path.abspath(DEFAULT_BLOB_DIR),
+                "compile_prefix": rlimit_prefix(60, memory=COMPILE_MEMORY),
+                # The programs may only write to their job's directory
+                "run_prefix": isolation_prefix(work_dir) + rlimit_prefix(cpu_seconds)
+            }
+            return format_results(run_job(config, work_dir, on_event))
+    except Exception as e:
+        return error_results(str(e), test_cases)
@@ -0,0 +1,245 @@
+"""
+Comparison of a program's output with the expected output.
+
+Both sides can be strings or file objects. Every mode reads them as streams,
+a chunk at a time, and stops at the first difference, which is reported by line (and
+column or token) so feedback never has to diff whole outputs. Modes, chosen
+per exercise:
+
+    exact       whole outputs equal apart from leading/trailing whitespace (the
+                historical behaviour)
+    whitespace  same whitespace-separated tokens, however they are spaced
+    lines       same lines, ignoring trailing spaces, CR/LF line endings and
+                trailing blank lines
+    float       like whitespace, but numbers match within a tolerance; the
+                tolerance can be given as "float:1e-4"
+
+This module is also copied into the cpp-runner image next to run_cpp.py.
+"""
+import io
+import math
+import os
+
+COMPARE_MODES = ('exact', 'whitespace', 'lines', 'float')
+DEFAULT_COMPARE_MODE = 'exact'
+DEFAULT_FLOAT_TOLERANCE = 1e-6
+
+READ_CHUNK = 64 * 1024
+# Longest token quoted in a mismatch message
+MAX_QUOTED = 40
+
+
+def parse_compare_mode(spec):
+    """
+    Split a compare mode spec such as "float:1e-4" into its mode and tolerance
+
+    Args:
+        spec (str): Mode name from COMPARE_MODES, optionally followed by ":<tolerance>" for float
+
+    Returns:
+        tuple: (mode, tolerance)
+
+    Raises:
+        ValueError: If the mode or tolerance is not valid
+    """
+    mode, _, tolerance = (spec or DEFAULT_COMPARE_MODE).partition(':')
+    if mode not in COMPARE_MODES:
+        raise ValueError(f"Unknown compare mode '{mode}'")
+    if tolerance and mode != 'float':
+        raise ValueError(f"Compare mode '{mode}' does not take a tolerance")
+    return mode, float(tolerance) if tolerance else DEFAULT_FLOAT_TOLERANCE
+
+
+def is_valid_compare_mode(spec):
+    """Check a compare mode spec before storing it"""
+    try:
+        parse_compare_mode(spec)
+        return True
+    except ValueError:
+        return False
+
+
+def _open(source):
+    return io.StringIO(source) if isinstance(source, str) else source
+
+
+def _chunks(source):
+    stream = _open(source)
+    while True:
+        chunk = stream.read(READ_CHUNK)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _stripped_chunks(source):
+    """Yield the text of a source a chunk at a time, without its leading and trailing whitespace"""
+    started = False
+    # Whitespace that only counts if more text follows it
+    held = ''
+    for chunk in _chunks(source):
+        if not started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            started = True
+        body = chunk.rstrip()
+        if body:
+            yield held + body
+            held = chunk[len(body):]
+        else:
+            held += chunk
+
+
+def _fill(buffer, chunks, size):
+    """Extend a buffer from a chunk stream until it holds at least `size` characters or the stream ends"""
+    while len(buffer) < size:
+        chunk = next(chunks, '')
+        if not chunk:
+            break
+        buffer += chunk
+    return buffer
+
+
+def iter_lines(source):
+    """Yield (line number, line) with line endings and trailing spaces removed, skipping trailing blank lines"""
+    line_number = 0
+    blank_run = []
+    pending = ''
+    for chunk in _chunks(source):
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            line_number += 1
+            line = line.rstrip()
+            if not line:
+                # Only counts if something follows it
+                blank_run.append(line_number)
+                continue
+            for blank in blank_run:
+                yield blank, ''
+            blank_run = []
+            yield line_number, line
+
+    line = pending.rstrip()
+    if line:
+        for blank in blank_run:
+            yield blank, ''
+        yield line_number + 1, line
+
+
+def iter_tokens(source):
+    """Yield (line number, token) for every whitespace-separated token"""
+    line_number = 1
+    pending = ''
+    for chunk in _chunks(source):
+        text = pending + chunk
+        # A token may continue in the next chunk
+        cut = len(text)
+        while cut and not text[cut - 1].isspace():
+            cut -= 1
+        text, pending = text[:cut], text[cut:]
+        for line in text.split('\n'):
+            for token in line.split():
+                yield line_number, token
+            line_number += 1
+        line_number -= 1
+    if pending:
+        yield line_number, pending
+
+
+def _quote(token):
+    if len(token) > MAX_QUOTED:
+        token = token[:MAX_QUOTED] + "..."
+    return repr(token)
+
+
+def _numbers_match(actual, expected, tolerance):
+    try:
+        a, b = float(actual), float(expected)
+    except ValueError:
+        return False
+    if math.isnan(a) or math.isnan(b):
+        return math.isnan(a) and math.isnan(b)
+    return math.isclose(a, b, rel_tol=tolerance, abs_tol=tolerance)
+
+
+def _result(passed, message=None, line=None, token=None):
+    return {'passed': passed, 'message': message, 'line': line, 'token': token}
+
+
+def _compare_items(actual_items, expected_items, match):
+    """Walk two (line, item) streams side by side and describe the first difference"""
+    sentinel = (None, None)
+    index = 0
+    while True:
+        index += 1
+        actual_line, actual = next(actual_items, sentinel)
+        expected_line, expected = next(expected_items, sentinel)
+        if actual is None and expected is None:
+            return _result(True)
+        if actual is None:
+            return _result(False, f"Output ended early: expected {_quote(expected)} on line {expected_line}",
+                           expected_line, index)
+        if expected is None:
+            return _result(False, f"Unexpected extra output on line {actual_line}: {_quote(actual)}",
+                           actual_line, index)
+        if actual != expected and not match(actual, expected):
+            return _result(False, f"Line {actual_line}: expected {_quote(expected)}, got {_quote(actual)}",
+                           actual_line, index)
+
+
+def _compare_exact(actual, expected):
+    actual_chunks, expected_chunks = _stripped_chunks(actual), _stripped_chunks(expected)
+    actual_buffer, expected_buffer = '', ''
+    # Position of the first unmatched character
+    line, column = 1, 1
+    while True:
+        actual_buffer = _fill(actual_buffer, actual_chunks, 1)
+        expected_buffer = _fill(expected_buffer, expected_chunks, 1)
+        if not actual_buffer or not expected_buffer:
+            break
+        common = len(os.path.commonprefix([actual_buffer, expected_buffer]))
+        matched = actual_buffer[:common]
+        newlines = matched.count('\n')
+        line += newlines
+        column = len(matched) - matched.rfind('\n') if newlines else column + len(matched)
+        actual_buffer, expected_buffer = actual_buffer[common:], expected_buffer[common:]
+        if actual_buffer and expected_buffer:
+            break
+
+    if not actual_buffer and not expected_buffer:
+        return _result(True)
+    if not actual_buffer:
+        return _result(False, f"Output ended early at line {line}, column {column}", line)
+    if not expected_buffer:
+        return _result(False, f"Unexpected extra output at line {line}, column {column}", line)
+    expected_excerpt = _fill(expected_buffer, expected_chunks, 20)[:20]
+    actual_excerpt = _fill(actual_buffer, actual_chunks, 20)[:20]
+    return _result(False, f"Line {line}, column {column}: expected {_quote(expected_excerpt)}, "
+                          f"got {_quote(actual_excerpt)}", line)
+
+
+def compare_output(actual, expected, mode=DEFAULT_COMPARE_MODE):
+    """
+    Compare a program's output with the expected output
+
+    Args:
+        actual (str | file): Program output
+        expected (str | file): Expected output
+        mode (str): Compare mode spec, see parse_compare_mode
+
+    Returns:
+        dict: 'passed', and for a mismatch a 'message' describing the first difference with
+            its 'line' and 'token' (the line or token index in 'lines' mode) position
+    """
+    mode, tolerance = parse_compare_mode(mode)
+
+    if mode == 'exact':
+        return _compare_exact(actual, expected)
+    if mode == 'lines':
+        return _compare_items(iter_lines(actual), iter_lines(expected), lambda a, b: False)
+    if mode == 'float':
+        return _compare_items(iter_tokens(actual), iter_tokens(expected),
+                              lambda a, b: _numbers_match(a, b, tolerance))
+    return _compare_items(iter_tokens(actual), iter_tokens(expected), lambda a, b: False)
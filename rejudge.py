@@ -0,0 +1,222 @@
+"""
+Incremental rejudging of stored submissions after an exercise's test cases change.
+
+Every submission keeps its per-test verdicts (submissions.details) together with
+a hash of the test case each verdict is for. Rejudging runs a submission only
+against the test cases it has no valid verdict for (new tests, tests whose data
+changed, tests skipped by fail-fast grading) and keeps the stored verdicts for
+the rest, so adding one test to an exercise costs one test run per submission.
+Verdicts of deleted tests are dropped without running anything.
+
+Jobs go through the grading scheduler at PRIORITY_REJUDGE, so its workers
+grade submissions in parallel and interactive submits go first, whichever
+backend they use. Submissions and user_progress are updated a batch at a time.
+
+Usage:
+    python rejudge.py EXERCISE_ID [--full] [--backend sandbox|docker] [--batch-size N]
+"""
+import argparse
+import json
+import sqlite3
+
+import exercise_handler
+from exercise_handler import get_grading_settings, test_case_hash
+from grading_scheduler import PRIORITY_REJUDGE, get_scheduler
+from run_cpp import USAGE_FIELDS
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def _load_suite(cursor, exercise_id):
+    """Test cases of an exercise as dicts, in test order, with their hashes"""
+    cursor.execute("SELECT id, input, expected_output, is_hidden, input_blob, expected_blob, time_limit, "
+                   "memory_limit_kb, reference_time FROM test_cases WHERE exercise_id = ? ORDER BY id", (exercise_id,))
+    return [
+        {'id': row[0], 'input': row[1] or '', 'expected_output': row[2], 'is_hidden': bool(row[3]),
+         'input_blob': row[4], 'expected_blob': row[5], 'time_limit': row[6], 'memory_limit_kb': row[7],
+         'reference_time': row[8], 'hash': test_case_hash(row[1], row[2], row[4], row[5])}
+        for row in cursor.fetchall()
+    ]
+
+
+def _reusable_verdicts(details, suite, full=False):
+    """
+    Split a submission's stored verdicts into the ones still valid and the tests left to run
+
+    Verdicts stored before test hashes were recorded are trusted as long as the
+    test case still exists.
+
+    Returns:
+        tuple: (test case id -> stored verdict, test cases to run, number of stored
+            verdicts no longer valid)
+    """
+    stored = {}
+    if details and not full:
+        for verdict in json.loads(details):
+            stored[verdict['test_case_id']] = verdict
+
+    reused, to_run = {}, []
+    for test in suite:
+        verdict = stored.get(test['id'])
+        if verdict and not verdict.get('skipped') and verdict.get('test_hash') in (None, test['hash']):
+            reused[test['id']] = verdict
+        else:
+            to_run.append(test)
+    return reused, to_run, len(stored) - len(reused)
+
+
+def _new_verdict(test, result):
+    """Stored verdict of a test case from a run_cpp test result"""
+    verdict = {'test_case_id': test['id'], 'passed': bool(result['passed']), 'skipped': False,
+               'time': result.get('time'), 'test_hash': test['hash']}
+    for field in USAGE_FIELDS:
+        verdict[field] = result.get(field)
+    return verdict
+
+
+def _merge(suite, reused, to_run, results):
+    """
+    Combine stored and new verdicts into the submission's updated row
+
+    Returns:
+        tuple: (passed, feedback, details JSON)
+    """
+    new = {}
+    test_results = results.get('test_results', []) if results else []
+    for position, test in enumerate(to_run):
+        if position < len(test_results):
+            new[test['id']] = _new_verdict(test, test_results[position])
+        else:
+            # Not run because the submission no longer compiles
+            new[test['id']] = dict(_new_verdict(test, {'passed': False}), time=None)
+
+    details = [reused.get(test['id']) or new[test['id']] for test in suite]
+    passed_tests = sum(1 for verdict in details if verdict['passed'])
+
+    feedback = (f"Rejudged after the exercise's test cases changed: {passed_tests}/{len(suite)} passed "
+                f"({len(reused)} earlier verdicts kept)")
+    if results:
+        feedback += f"\n\nNew tests:\n{results['feedback']}"
+    return passed_tests == len(suite), feedback, json.dumps(details)
+
+
+def _update_progress(cursor, exercise_id):
+    """Recompute whether an exercise is completed from its submissions"""
+    cursor.execute("SELECT 1 FROM submissions WHERE exercise_id = ? AND passed = 1 LIMIT 1", (exercise_id,))
+    if cursor.fetchone():
+        cursor.execute("SELECT completed_at FROM user_progress WHERE exercise_id = ? AND completed = 1",
+                       (exercise_id,))
+        row = cursor.fetchone()
+        if not row:
+            cursor.execute(
+                "INSERT OR REPLACE INTO user_progress (exercise_id, completed, completed_at) "
+                "VALUES (?, 1, CURRENT_TIMESTAMP)",
+                (exercise_id,)
+            )
+    else:
+        cursor.execute("UPDATE user_progress SET completed = 0, completed_at = NULL WHERE exercise_id = ?",
+                       (exercise_id,))
+
+
+def _write_batch(exercise_id, updates):
+    """Store the rejudged rows of one batch and refresh user_progress, in one transaction"""
+    conn = sqlite3.connect(exercise_handler.DB_PATH)
+    cursor = conn.cursor()
+    cursor.executemany("UPDATE submissions SET passed = ?, feedback = ?, details = ? WHERE id = ?", updates)
+    _update_progress(cursor, exercise_id)
+    conn.commit()
+    conn.close()
+
+
+def rejudge_exercise(exercise_id, backend="sandbox", batch_size=DEFAULT_BATCH_SIZE, full=False, timeout=5,
+                     scheduler=None):
+    """
+    Bring the stored submissions of an exercise up to date with its current test cases
+
+    Args:
+        exercise_id (int): Exercise ID
+        backend (str): Scheduler backend taking (code_str, test_cases), "sandbox" or "docker"
+        batch_size (int): Submissions graded and written per batch
+        full (bool): Ignore stored verdicts and rerun every test, e.g. after the compare
+            mode or checker changed
+        timeout (int): Timeout in seconds for each test case
+        scheduler (GradingScheduler, optional): Scheduler to use instead of the shared one
+
+    Returns:
+        dict: Counts of 'submissions', 'rejudged' (had tests to run), 'changed' (verdict
+            flipped), 'test_runs', 'reused_verdicts' and 'errors' (left unchanged)
+    """
+    scheduler = scheduler or get_scheduler(backend)
+    settings = get_grading_settings(exercise_id)
+
+    conn = sqlite3.connect(exercise_handler.DB_PATH)
+    cursor = conn.cursor()
+    suite = _load_suite(cursor, exercise_id)
+    # Read everything up front so batch writes do not wait on this reader
+    cursor.execute("SELECT id, code, passed, details FROM submissions WHERE exercise_id = ?", (exercise_id,))
+    submissions = cursor.fetchall()
+    conn.close()
+
+    stats = {'submissions': len(submissions), 'rejudged': 0, 'changed': 0, 'test_runs': 0, 'reused_verdicts': 0,
+             'errors': 0}
+
+    for start in range(0, len(submissions), batch_size):
+        jobs = []
+        for submission_id, code, was_passed, details in submissions[start:start + batch_size]:
+            reused, to_run, dropped = _reusable_verdicts(details, suite, full)
+            if not to_run and not dropped:
+                # Still up to date
+                stats['reused_verdicts'] += len(reused)
+                continue
+            future = None
+            if to_run:
+                future = scheduler.submit(
+                    code, [{key: value for key, value in test.items() if key not in ('id', 'hash')}
+                           for test in to_run],
+                    timeout=timeout, compile_profile=settings['compile_profile'],
+                    compare_mode=settings['compare_mode'], checker_code=settings['checker_code'],
+                    priority=PRIORITY_REJUDGE
+                )
+            jobs.append((submission_id, bool(was_passed), reused, to_run, future))
+
+        updates = []
+        for submission_id, was_passed, reused, to_run, future in jobs:
+            results = None
+            if future:
+                try:
+                    results = future.result()
+                except Exception:
+                    results = {'error': True}
+                # A broken checker is the exercise's fault, not the submission's
+                if results.get('error') or results['feedback'].startswith("Error:"):
+                    stats['errors'] += 1
+                    continue
+                stats['rejudged'] += 1
+                stats['test_runs'] += len(results.get('test_results', []))
+
+            stats['reused_verdicts'] += len(reused)
+            passed, feedback, details = _merge(suite, reused, to_run, results)
+            if passed != was_passed:
+                stats['changed'] += 1
+            updates.append((passed, feedback, details, submission_id))
+
+        if updates:
+            _write_batch(exercise_id, updates)
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejudge the stored submissions of an exercise")
+    parser.add_argument("exercise_id", type=int, help="Exercise whose test cases changed")
+    parser.add_argument("--full", action="store_true", help="Rerun every test instead of only new or changed ones")
+    parser.add_argument("--backend", default="sandbox", choices=["sandbox", "docker"], help="Executor backend")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Submissions per batch")
+    args = parser.parse_args()
+
+    stats = rejudge_exercise(args.exercise_id, backend=args.backend, batch_size=args.batch_size, full=args.full)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
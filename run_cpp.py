@@ -0,0 +1,1369 @@
+#!/usr/bin/env python3
+"""
+C++ test runner shipped inside the cpp-runner Docker image.
+
+Usage:
+    python3 run_cpp.py <path-to-config-json>   # grade one job and print the results
+    python3 run_cpp.py --serve                 # grade one JSON job per stdin line
+    python3 run_cpp.py --build-pch [dir]       # precompile common headers (image build)
+    python3 run_cpp.py --build-rusage-helper [path]   # build the usage helper (image build)
+
+With "stream": true in the job, progress events are printed as JSON lines
+before the final results line.
+
+Serve mode keeps the runner alive between jobs so a warm container can grade
+many submissions. Each job gets a fresh work directory which is removed before
+the next job starts. As the container's PID 1, the runner also kills every
+other process in it between jobs, including programs that escaped their
+test's process group with setsid.
+"""
+import asyncio
+import atexit
+import contextlib
+import subprocess
+import json
+import math
+import os
+import resource
+import shutil
+import signal
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from blob_store import get_blob_store
+from compile_cache import CompileCache, make_cache_key
+from output_compare import DEFAULT_COMPARE_MODE, compare_output
+
+# Root directory for per-job work directories; the runner image points it at its tmpfs scratch mount
+WORK_ROOT = os.environ.get("RUNNER_WORK_ROOT", tempfile.gettempdir())
+# Writable places a program can leave files in, emptied after every job of a serving runner container
+LEFTOVER_DIRS = list(dict.fromkeys([WORK_ROOT, "/tmp", "/var/tmp", "/dev/shm"]))
+
+# Compiler flag profiles an exercise can choose from
+COMPILE_PROFILES = {
+    'c++11': ['-std=c++11'],
+    'c++14': ['-std=c++14'],
+    'c++17': ['-std=c++17'],
+    'c++17-O2': ['-std=c++17', '-O2'],
+    'c++20-O2': ['-std=c++20', '-O2'],
+}
+DEFAULT_COMPILE_PROFILE = 'c++11'
+DEFAULT_COMPILE_FLAGS = COMPILE_PROFILES[DEFAULT_COMPILE_PROFILE]
+COMPILE_TIMEOUT = 30
+
+# Precompiled standard headers, one variant per profile (see build_pch)
+PCH_DIR = os.environ.get("RUNNER_PCH_DIR", "/opt/pch")
+PCH_HEADERS = ['bits/stdc++.h', 'iostream', 'vector']
+
+# Programs printing more than this to stdout are stopped ("output limit exceeded")
+OUTPUT_LIMIT = int(os.environ.get("RUNNER_OUTPUT_LIMIT", str(8 * 1024 * 1024)))
+# stderr beyond this is dropped without failing the run
+STDERR_LIMIT = 64 * 1024
+# Characters of a program's output kept in results and feedback
+OUTPUT_EXCERPT = 2000
+READ_CHUNK = 64 * 1024
+
+# Exercise checker programs: compiled with this profile and given this long per test
+CHECKER_PROFILE = 'c++17-O2'
+CHECKER_TIMEOUT = 10
+
+# Per-test limits derived from an exercise's reference solution (see calibrate.py)
+LIMIT_FIELDS = ('time_limit', 'memory_limit_kb', 'reference_time')
+
+# Helper measuring a program's resource usage (see _RusagePopen); the runner image builds it here
+RUSAGE_HELPER = os.environ.get("RUNNER_RUSAGE_HELPER", "/opt/rusage-helper")
+# User the submissions run as, through the setuid usage helper (runner image only)
+TEST_USER = os.environ.get("RUNNER_TEST_USER")
+
+# Forks the command given after the pipe fd in its own process group, writes the
+# child's pid to the pipe, reaps it with wait4, writes "maxrss utime stime" and
+# then exits the way the child did.
+#
+# Built with -DTEST_USER=... it is installed setuid root in the runner image:
+# `helper --drop FD cmd...` then runs the program as the test user, who cannot
+# touch the runner, its caches or its other jobs, and every other command as
+# the user who started the helper. SIGUSR1 makes it kill the program's process
+# group, which the runner itself may no longer signal, and `helper --kill-all`
+# kills every process of the container except the caller's PID 1.
+_RUSAGE_HELPER_SOURCE = r"""
+#include <errno.h>
+#include <grp.h>
+#include <pwd.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/resource.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+static volatile pid_t child = 0;
+
+static void kill_child(int sig) {
+    if (child > 0) kill(-child, SIGKILL);
+}
+
+/* Give up root in the forked program, for good */
+static int become(uid_t uid, gid_t gid) {
+    if (setgroups(0, NULL) < 0 && geteuid() == 0) return -1;
+    if (setgid(gid) < 0 || setuid(uid) < 0) return -1;
+    return (uid != 0 && setuid(0) == 0) ? -1 : 0;
+}
+
+int main(int argc, char **argv) {
+    uid_t invoker = getuid();
+    gid_t invoker_group = getgid();
+    int drop = 0;
+#ifdef TEST_USER
+    struct passwd *test_user = getpwnam(TEST_USER);
+    if (!test_user) {
+        fprintf(stderr, "no user %s\n", TEST_USER);
+        return 127;
+    }
+    if (argc == 2 && strcmp(argv[1], "--kill-all") == 0) {
+        /* Only for the runner, never for the programs it runs */
+        if (invoker == test_user->pw_uid) return 2;
+        return kill(-1, SIGKILL) == 0 ? 0 : 1;
+    }
+#endif
+    if (argc > 1 && strcmp(argv[1], "--drop") == 0) {
+        drop = 1;
+        argv++;
+        argc--;
+    }
+    if (argc < 3) return 127;
+    int fd = atoi(argv[1]);
+
+    struct sigaction on_usr1;
+    memset(&on_usr1, 0, sizeof(on_usr1));
+    on_usr1.sa_handler = kill_child;
+    sigaction(SIGUSR1, &on_usr1, NULL);
+
+    pid_t pid = fork();
+    if (pid < 0) {
+        perror("fork");
+        return 127;
+    }
+    if (pid == 0) {
+        close(fd);
+        setpgid(0, 0);
+        signal(SIGUSR1, SIG_DFL);
+        int dropped = 0;
+#ifdef TEST_USER
+        if (drop) dropped = become(test_user->pw_uid, test_user->pw_gid);
+        else dropped = become(invoker, invoker_group);
+#else
+        (void)drop;
+        if (geteuid() != invoker) dropped = become(invoker, invoker_group);
+#endif
+        if (dropped < 0) {
+            perror("setuid");
+            _exit(127);
+        }
+        execvp(argv[2], argv + 2);
+        fprintf(stderr, "%s: %s\n", argv[2], strerror(errno));
+        _exit(127);
+    }
+    setpgid(pid, pid);
+    child = pid;
+    dprintf(fd, "%d\n", (int)pid);
+
+    /* Background processes the program left behind go with it, while its
+       unreaped pid still holds on to the process group id */
+    siginfo_t info;
+    while (waitid(P_PID, pid, &info, WEXITED | WNOWAIT) < 0) {
+        if (errno != EINTR) return 127;
+    }
+    kill(-pid, SIGKILL);
+    child = 0;
+
+    int status;
+    struct rusage usage;
+    while (wait4(pid, &status, 0, &usage) < 0) {
+        if (errno != EINTR) return 127;
+    }
+    dprintf(fd, "%ld %ld.%06ld %ld.%06ld\n", usage.ru_maxrss,
+            (long)usage.ru_utime.tv_sec, (long)usage.ru_utime.tv_usec,
+            (long)usage.ru_stime.tv_sec, (long)usage.ru_stime.tv_usec);
+    close(fd);
+
+    if (WIFSIGNALED(status)) {
+        struct rlimit no_core = {0, 0};
+        setrlimit(RLIMIT_CORE, &no_core);
+        signal(WTERMSIG(status), SIG_DFL);
+        raise(WTERMSIG(status));
+    }
+    return WIFEXITED(status) ? WEXITSTATUS(status) : 127;
+}
+"""
+
+# Compile caches by directory, kept for the lifetime of a serving runner
+_compile_caches = {}
+_toolchain = None
+# Path of the usage helper, '' once it turned out not to be available
+_rusage_helper = None
+_rusage_helper_lock = threading.Lock()
+
+
+def _kill_process_group(process):
+    """Kill a process and everything it forked"""
+    for group in getattr(process, 'groups', None) or [process.pid]:
+        try:
+            os.killpg(group, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+def _kill_program(process):
+    """Kill the program run by a process and everything it forked, leaving the usage helper to report on it"""
+    groups = getattr(process, 'groups', None) or [process.pid]
+    if len(groups) > 1:
+        # A program running as the test user is only within reach of the setuid helper
+        process.send_signal(signal.SIGUSR1)
+    try:
+        os.killpg(groups[-1], signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def build_rusage_helper(path=RUSAGE_HELPER, test_user=None):
+    """
+    Compile the helper _RusagePopen measures programs with
+
+    Args:
+        path (str): Where to put the executable
+        test_user (str, optional): User the helper runs untrusted programs as,
+            once it is installed setuid root
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, "rusage_helper.cpp")
+        with open(source, 'w') as f:
+            f.write(_RUSAGE_HELPER_SOURCE)
+        output = os.path.join(temp_dir, "rusage-helper")
+        defines = [f'-DTEST_USER="{test_user}"'] if test_user else []
+        subprocess.run(['g++', '-O2'] + defines + [source, '-o', output], check=True, capture_output=True)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        shutil.move(output, path)
+
+
+def _rusage_helper_path():
+    """The usage helper, built into a private directory on first use outside the runner image; None if unavailable"""
+    global _rusage_helper
+    with _rusage_helper_lock:
+        if _rusage_helper is None:
+            if os.access(RUSAGE_HELPER, os.X_OK):
+                _rusage_helper = RUSAGE_HELPER
+            else:
+                helper_dir = tempfile.mkdtemp(prefix="rusage-helper-")
+                atexit.register(shutil.rmtree, helper_dir, True)
+                try:
+                    build_rusage_helper(os.path.join(helper_dir, "rusage-helper"))
+                    _rusage_helper = os.path.join(helper_dir, "rusage-helper")
+                except (OSError, subprocess.CalledProcessError) as e:
+                    # stdout carries the serving runner's results
+                    print(f"Could not build the usage helper, peak memory is only reported above "
+                          f"the runner's own: {e}", file=sys.stderr)
+                    _rusage_helper = ''
+        return _rusage_helper or None
+
+
+class _RusagePopen(subprocess.Popen):
+    """
+    Popen that keeps the resource usage of the program it runs
+
+    A child's peak RSS starts out at its parent's, so a program started
+    straight from a large process (the Streamlit app, say) would report the
+    parent's peak. The program is therefore started by the small usage helper,
+    which reaps it with wait4 and reports its usage over a pipe. Without the
+    helper the child is reaped here, and peaks up to our own are not reported.
+
+    With `untrusted` the helper runs the program as TEST_USER, if one is set.
+    """
+
+    rusage = None
+
+    def __init__(self, args, untrusted=False, **kwargs):
+        helper = _rusage_helper_path()
+        self.rss_floor = 0
+        self._usage = None
+        if not helper:
+            self.rss_floor = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            super().__init__(args, **kwargs)
+            self.groups = [self.pid]
+            return
+
+        read_fd, write_fd = os.pipe()
+        try:
+            drop = ['--drop'] if untrusted and TEST_USER else []
+            super().__init__([helper] + drop + [str(write_fd)] + list(args), pass_fds=(write_fd,), **kwargs)
+        except BaseException:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        self._usage = os.fdopen(read_fd, 'rb')
+        # The program runs in a process group of its own, so it can be killed without the helper
+        program = self._usage.readline().strip()
+        self.groups = [self.pid] + ([int(program)] if program else [])
+
+    def _try_wait(self, wait_flags):
+        try:
+            pid, status, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            # Reaped elsewhere; report it like Popen does
+            return self.pid, 0
+        if pid == self.pid and self._usage is None:
+            self.rusage = rusage
+        return pid, status
+
+    def collect_usage(self):
+        """Read the program's usage from the helper once it has exited (None if it was killed first)"""
+        if self._usage is None:
+            return
+        fields = self._usage.readline().split()
+        self._usage.close()
+        self._usage = None
+        if len(fields) == 3:
+            self.rusage = _HelperUsage(int(fields[0]), float(fields[1]), float(fields[2]))
+
+
+class _HelperUsage:
+    """The parts of a struct rusage the usage helper reports"""
+
+    def __init__(self, ru_maxrss, ru_utime, ru_stime):
+        self.ru_maxrss = ru_maxrss
+        self.ru_utime = ru_utime
+        self.ru_stime = ru_stime
+
+
+# Resource usage reported for every test result
+USAGE_FIELDS = ('cpu_user', 'cpu_sys', 'max_rss_kb', 'signal')
+
+
+def _usage_fields(returncode, rusage, rss_floor=0):
+    """CPU time, peak memory and terminating signal of a finished process"""
+    return {
+        'cpu_user': rusage.ru_utime if rusage else None,
+        'cpu_sys': rusage.ru_stime if rusage else None,
+        # ru_maxrss is in kilobytes on Linux; None when it is below what can be measured (see _RusagePopen)
+        'max_rss_kb': rusage.ru_maxrss if rusage and rusage.ru_maxrss > rss_floor else None,
+        'signal': signal.Signals(-returncode).name if returncode < 0 and -returncode in signal.valid_signals() else None
+    }
+
+
+def truncate_output(text, limit=OUTPUT_EXCERPT):
+    """Shorten program output to an excerpt for results and feedback"""
+    if text is None or len(text) <= limit:
+        return text
+    return text[:limit] + f"\n... [{len(text) - limit} more characters]"
+
+
+def _read_bounded(stream, limit, chunks, on_overflow=None):
+    """Drain a pipe, keeping at most `limit` bytes and calling on_overflow once it is exceeded"""
+    size = 0
+    while True:
+        chunk = stream.read1(READ_CHUNK)
+        if not chunk:
+            break
+        if size < limit:
+            chunks.append(chunk[:limit - size])
+        size += len(chunk)
+        if size > limit and on_overflow:
+            on_overflow()
+            on_overflow = None
+    stream.close()
+
+
+def _feed_input(stream, input_data):
+    """Write the program's input (text or an open binary stream), ignoring programs that exit without reading it"""
+    try:
+        if hasattr(input_data, 'read'):
+            shutil.copyfileobj(input_data, stream, READ_CHUNK)
+        else:
+            stream.write(input_data.encode())
+        stream.close()
+    except (BrokenPipeError, OSError):
+        pass
+
+
+def _decode_output(chunks):
+    # Same newline handling as text-mode pipes
+    return b''.join(chunks).decode(errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def run_with_timeout(cmd, input_data=None, timeout=5, cwd=None, stdin=None, output_limit=OUTPUT_LIMIT,
+                     untrusted=False):
+    """
+    Run a command with timeout and input data
+
+    Results include the process's CPU time ('cpu_user', 'cpu_sys' in seconds),
+    peak resident memory ('max_rss_kb') and the 'signal' that killed it, if any;
+    see _RusagePopen for how they are measured.
+    `input_data` can be text or an open binary stream, which is copied to the
+    program a chunk at a time. `stdin` can be an open file to read input from
+    instead.
+
+    Output is read as it is produced and never buffered beyond `output_limit`
+    bytes of stdout and STDERR_LIMIT bytes of stderr. A program that prints more
+    than `output_limit` is killed and its result has 'output_limit_exceeded'.
+    Submissions are run `untrusted`, as TEST_USER where there is one.
+    """
+    start = time.time()
+    if stdin is None:
+        stdin = subprocess.PIPE if input_data else subprocess.DEVNULL
+    process = _RusagePopen(
+        cmd,
+        untrusted=untrusted,
+        cwd=cwd,
+        stdin=stdin,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True
+    )
+
+    stdout_chunks, stderr_chunks = [], []
+    exceeded = threading.Event()
+
+    def stop_runaway_output():
+        exceeded.set()
+        _kill_program(process)
+
+    threads = [
+        threading.Thread(target=_read_bounded, args=(process.stdout, output_limit, stdout_chunks,
+                                                     stop_runaway_output)),
+        threading.Thread(target=_read_bounded, args=(process.stderr, STDERR_LIMIT, stderr_chunks))
+    ]
+    if stdin == subprocess.PIPE:
+        threads.append(threading.Thread(target=_feed_input, args=(process.stdin, input_data)))
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        try:
+            process.wait(timeout=timeout)
+            timed_out = False
+        except subprocess.TimeoutExpired:
+            # Kill the process if it times out
+            _kill_program(process)
+            process.wait()
+            timed_out = True
+        end = time.time()
+    finally:
+        # Don't let background children of the program outlive the test (or keep the pipes open)
+        _kill_process_group(process)
+        for thread in threads:
+            thread.join()
+        process.collect_usage()
+
+    if timed_out:
+        return dict({
+            'returncode': -1,
+            'stdout': '',
+            'stderr': 'Process timed out',
+            'time': timeout,
+            'timed_out': True
+        }, **_usage_fields(0, process.rusage, process.rss_floor))  # The SIGKILL was ours, not the program's
+
+    result = {
+        'returncode': process.returncode,
+        'stdout': _decode_output(stdout_chunks),
+        'stderr': _decode_output(stderr_chunks),
+        'time': end - start
+    }
+    if exceeded.is_set():
+        result['output_limit_exceeded'] = True
+        result.update(_usage_fields(0, process.rusage, process.rss_floor))
+    else:
+        result.update(_usage_fields(process.returncode, process.rusage, process.rss_floor))
+    return result
+
+
+async def _read_bounded_async(stream, limit, on_overflow=None):
+    """Coroutine version of _read_bounded, returning the kept bytes"""
+    chunks = []
+    size = 0
+    while True:
+        chunk = await stream.read(READ_CHUNK)
+        if not chunk:
+            break
+        if size < limit:
+            chunks.append(chunk[:limit - size])
+        size += len(chunk)
+        if size > limit and on_overflow:
+            on_overflow()
+            on_overflow = None
+    return b''.join(chunks)
+
+
+async def _feed_input_async(stream, input_data):
+    """Coroutine version of _feed_input"""
+    try:
+        if hasattr(input_data, 'read'):
+            for chunk in iter(lambda: input_data.read(READ_CHUNK), b''):
+                stream.write(chunk)
+                await stream.drain()
+        else:
+            stream.write(input_data.encode())
+            await stream.drain()
+        stream.close()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+
+
+async def run_with_timeout_async(cmd, input_data=None, timeout=5, cwd=None, output_limit=OUTPUT_LIMIT):
+    """
+    Coroutine version of run_with_timeout; cancelling it kills the process
+
+    asyncio reaps the child itself, so CPU time and peak memory are reported as None.
+    """
+    start = time.time()
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=cwd,
+        stdin=subprocess.PIPE if input_data else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True
+    )
+
+    exceeded = False
+
+    def stop_runaway_output():
+        nonlocal exceeded
+        exceeded = True
+        _kill_process_group(process)
+
+    async def run():
+        io = [
+            _read_bounded_async(process.stdout, output_limit, stop_runaway_output),
+            _read_bounded_async(process.stderr, STDERR_LIMIT)
+        ]
+        if input_data:
+            io.append(_feed_input_async(process.stdin, input_data))
+        outputs = await asyncio.gather(*io)
+        await process.wait()
+        return outputs[0], outputs[1]
+
+    try:
+        stdout, stderr = await asyncio.wait_for(run(), timeout)
+        end = time.time()
+        result = {
+            'returncode': process.returncode,
+            'stdout': stdout.decode(errors='replace'),
+            'stderr': stderr.decode(errors='replace'),
+            'time': end - start
+        }
+        if exceeded:
+            result['output_limit_exceeded'] = True
+            result.update(_usage_fields(0, None))
+        else:
+            result.update(_usage_fields(process.returncode, None))
+        return result
+    except asyncio.TimeoutError:
+        # Kill the process if it times out
+        _kill_process_group(process)
+        await process.wait()
+        return dict({
+            'returncode': -1,
+            'stdout': '',
+            'stderr': 'Process timed out',
+            'time': timeout,
+            'timed_out': True
+        }, **_usage_fields(0, None))
+    finally:
+        # Also runs when the awaiting task is cancelled
+        _kill_process_group(process)
+
+
+def toolchain_id():
+    """Identify the compiler used for cache keys: the runner image version, or the host g++"""
+    global _toolchain
+    if _toolchain is None:
+        _toolchain = os.environ.get('RUNNER_IMAGE_VERSION')
+        if not _toolchain:
+            version = subprocess.run(['g++', '--version'], capture_output=True, text=True)
+            _toolchain = "host:" + (version.stdout.splitlines() or ['unknown'])[0]
+    return _toolchain
+
+
+def get_compile_cache(cache_dir, max_bytes=None):
+    """Get the compile cache for a directory, reusing it between jobs"""
+    if cache_dir not in _compile_caches:
+        if max_bytes:
+            _compile_caches[cache_dir] = CompileCache(cache_dir, max_bytes)
+        else:
+            _compile_caches[cache_dir] = CompileCache(cache_dir)
+    return _compile_caches[cache_dir]
+
+
+def _lookup_compile(code_path, binary_path, flags, cache):
+    """Return the cache key and the cached compile result (None on a miss)"""
+    if cache is None:
+        return None, None
+    with open(code_path, 'rb') as f:
+        key = make_cache_key(f.read(), flags, toolchain_id())
+    entry = cache.get(key)
+    if not entry:
+        return key, None
+    # Cache hit: skip g++ entirely
+    if entry['binary']:
+        shutil.copy2(entry['binary'], binary_path)
+    return key, dict(entry['compilation'], cached=True)
+
+
+def compile_flags(profile=None):
+    """
+    Compiler flags of a profile
+
+    Args:
+        profile (str, optional): Name from COMPILE_PROFILES, DEFAULT_COMPILE_PROFILE if None
+
+    Returns:
+        list: g++ flags
+    """
+    return list(COMPILE_PROFILES[profile or DEFAULT_COMPILE_PROFILE])
+
+
+def _pch_profile_name(flags):
+    """File name of the precompiled header variant built for a set of flags"""
+    return "_".join(flag.lstrip('-').replace('=', '') for flag in flags) or "default"
+
+
+def build_pch(pch_dir=PCH_DIR):
+    """
+    Precompile the common standard headers for every compile profile
+
+    GCC looks for `<header>.gch` in each include directory before the header
+    itself; when that is a directory it picks the variant whose flags match the
+    compilation, and silently parses the real header if none does. Adding
+    `-I <pch_dir>` to the compile command is therefore all it takes to use them.
+
+    Args:
+        pch_dir (str): Directory to build the precompiled headers in
+    """
+    for header in PCH_HEADERS:
+        variant_dir = os.path.join(pch_dir, f"{header}.gch")
+        os.makedirs(variant_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = os.path.join(temp_dir, "pch.h")
+            with open(source, 'w') as f:
+                f.write(f"#include <{header}>\n")
+            for flags in COMPILE_PROFILES.values():
+                output = os.path.join(variant_dir, f"{_pch_profile_name(flags)}.gch")
+                subprocess.run(['g++'] + flags + ['-x', 'c++-header', source, '-o', output], check=True)
+
+
+def _compile_command(code_path, binary_path, flags, prefix=None):
+    """g++ command line, run from the source directory so errors show the bare file name"""
+    # Precompiled headers only change how fast the headers are read, not the result
+    pch_flags = ['-I', PCH_DIR] if os.path.isdir(PCH_DIR) else []
+    return (
+        list(prefix or []) + ['g++', os.path.basename(code_path), '-o', os.path.abspath(binary_path)] + flags
+        + pch_flags,
+        os.path.dirname(os.path.abspath(code_path))
+    )
+
+
+def _store_compile(cache, key, compile_result, binary_path):
+    if key is not None and not compile_result.get('timed_out'):
+        cache.put(key, compile_result, binary_path if compile_result['returncode'] == 0 else None)
+    compile_result['cached'] = False
+    return compile_result
+
+
+def compile_source(code_path, binary_path, flags=None, cache=None, prefix=None):
+    """
+    Compile a C++ file, reusing a cached executable or compile error when possible
+
+    Args:
+        code_path (str): Path of the source file
+        binary_path (str): Where the executable should end up
+        flags (list, optional): Compiler flags, DEFAULT_COMPILE_FLAGS if omitted
+        cache (CompileCache, optional): Cache to look up and store the result in
+        prefix (list, optional): Command the compiler is run through, e.g. to confine it
+
+    Returns:
+        dict: Compiler result with 'returncode', 'stdout', 'stderr', 'time' and 'cached'
+    """
+    flags = DEFAULT_COMPILE_FLAGS if flags is None else flags
+
+    key, cached = _lookup_compile(code_path, binary_path, flags, cache)
+    if cached:
+        return cached
+
+    cmd, cwd = _compile_command(code_path, binary_path, flags, prefix)
+    compile_result = run_with_timeout(cmd, timeout=COMPILE_TIMEOUT, cwd=cwd)
+    return _store_compile(cache, key, compile_result, binary_path)
+
+
+async def compile_source_async(code_path, binary_path, flags=None, cache=None):
+    """Coroutine version of compile_source"""
+    flags = DEFAULT_COMPILE_FLAGS if flags is None else flags
+
+    key, cached = _lookup_compile(code_path, binary_path, flags, cache)
+    if cached:
+        return cached
+
+    cmd, cwd = _compile_command(code_path, binary_path, flags)
+    compile_result = await run_with_timeout_async(cmd, timeout=COMPILE_TIMEOUT, cwd=cwd)
+    return _store_compile(cache, key, compile_result, binary_path)
+
+
+def cpu_allowance():
+    """Number of CPUs this process may use, honouring the container's CFS quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max', 'r') as f:
+            limit, period = f.read().split()
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us', 'r') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us', 'r') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def compile_checker(checker_code, work_dir, cache=None):
+    """
+    Compile an exercise's checker program, reusing the cached executable when possible
+
+    A checker is run as `checker <input file> <output file> <expected output file>`
+    and accepts the output by exiting with 0; the first line it prints is shown to
+    the student when it rejects one.
+
+    Args:
+        checker_code (str): C++ source of the checker
+        work_dir (str): Directory to write the source and executable into
+        cache (CompileCache, optional): Cache shared with the submissions' compilations
+
+    Returns:
+        tuple: (executable path, compile result)
+    """
+    checker_path = os.path.join(work_dir, "checker.cpp")
+    with open(checker_path, 'w') as f:
+        f.write(checker_code)
+    compile_result = compile_source(checker_path, f"{checker_path}.out", compile_flags(CHECKER_PROFILE), cache)
+    return f"{checker_path}.out", compile_result
+
+
+def _write_checker_files(test_input, output, expected_output):
+    """Write a test's input, the program's output and the expected output (text or open streams) for the checker"""
+    files_dir = tempfile.mkdtemp(prefix="check-", dir=WORK_ROOT)
+    paths = []
+    for name, content in (("input.txt", test_input), ("output.txt", output), ("answer.txt", expected_output)):
+        path = os.path.join(files_dir, name)
+        with open(path, 'w') as f:
+            if hasattr(content, 'read'):
+                shutil.copyfileobj(content, f, READ_CHUNK)
+            else:
+                f.write(content or '')
+        paths.append(path)
+    return files_dir, paths
+
+
+def _checker_verdict(check_result):
+    """Turn a checker run into the same verdict dict as output_compare.compare_output"""
+    if check_result.get('timed_out'):
+        return {'passed': False, 'message': "Checker timed out", 'line': None, 'token': None}
+    message = (check_result['stdout'].strip() or check_result['stderr'].strip()).split('\n')[0]
+    passed = check_result['returncode'] == 0
+    if not passed and not message:
+        message = "Output rejected by the checker"
+    return {'passed': passed, 'message': truncate_output(message, 200) if not passed else None,
+            'line': None, 'token': None}
+
+
+def run_checker(checker_path, test_input, output, expected_output, timeout=CHECKER_TIMEOUT, cwd=None):
+    """
+    Judge a program's output with a compiled checker
+
+    Args:
+        checker_path (str): Executable from compile_checker
+        test_input (str | file): The test's input
+        output (str): What the program printed
+        expected_output (str | file): The test's expected output
+        timeout (int): Timeout in seconds
+        cwd (str, optional): Working directory of the checker
+
+    Returns:
+        dict: 'passed' and, for a rejected output, the checker's 'message'
+    """
+    files_dir, paths = _write_checker_files(test_input, output, expected_output)
+    try:
+        return _checker_verdict(run_with_timeout([checker_path] + paths, timeout=timeout, cwd=cwd))
+    finally:
+        shutil.rmtree(files_dir, ignore_errors=True)
+
+
+async def run_checker_async(checker_path, test_input, output, expected_output, timeout=CHECKER_TIMEOUT, cwd=None):
+    """Coroutine version of run_checker"""
+    files_dir, paths = _write_checker_files(test_input, output, expected_output)
+    try:
+        return _checker_verdict(await run_with_timeout_async([checker_path] + paths, timeout=timeout, cwd=cwd))
+    finally:
+        shutil.rmtree(files_dir, ignore_errors=True)
+
+
+# Test case keys whose data can be kept in the blob store instead
+BLOB_KEYS = {'input': 'input_blob', 'expected_output': 'expected_blob'}
+
+
+def open_test_data(test, key, blobs=None, binary=False):
+    """
+    Get a test's input or expected output for reading
+
+    Args:
+        test (dict): Test case
+        key (str): 'input' or 'expected_output'
+        blobs (BlobStore, optional): Store holding the test's blobs
+        binary (bool): Open a blob as bytes rather than text
+
+    Returns:
+        Context manager giving the inline text, or an open stream when the data is a blob
+    """
+    blob_hash = test.get(BLOB_KEYS[key])
+    if blob_hash:
+        return (blobs or get_blob_store()).open(blob_hash, binary)
+    return contextlib.nullcontext(test.get(key) or '')
+
+
+def run_test(binary_path, test_id, test, timeout=5, output_limit=OUTPUT_LIMIT, compare_mode=DEFAULT_COMPARE_MODE,
+             checker_path=None, prefix=None, blobs=None, repeat=1, cwd=None):
+    """
+    Run the compiled program on one test case
+
+    Args:
+        binary_path (str): Compiled executable
+        test_id (int): 1-based position of the test in the job
+        test (dict): Test case with 'input', 'expected_output' and 'is_hidden'; large data is
+            given as 'input_blob' / 'expected_blob' hashes, with only an excerpt inline, and
+            a calibrated exercise adds LIMIT_FIELDS
+        timeout (int): Timeout in seconds, unless the test has its own 'time_limit'
+        output_limit (int): Bytes of stdout after which the program is stopped and fails
+        compare_mode (str): How the output is compared, see output_compare
+        checker_path (str, optional): Compiled checker judging the output instead of compare_mode
+        prefix (list, optional): Command the program is run through, e.g. to confine it
+        blobs (BlobStore, optional): Store holding the test's blobs
+        repeat (int): Runs of a passing test, reporting their median time
+        cwd (str, optional): Working directory of the program and the checker
+
+    Returns:
+        dict: Test result including its wall-clock 'time' and resource usage (see USAGE_FIELDS)
+    """
+    test_input = test.get('input', '')
+    expected_output = test.get('expected_output', '').strip()
+    is_hidden = test.get('is_hidden', False)
+
+    # Run the program
+    cmd = list(prefix or []) + [binary_path]
+    timeout = test.get('time_limit') or timeout
+    with open_test_data(test, 'input', blobs, binary=True) as input_data:
+        run_result = run_with_timeout(cmd, input_data, timeout=timeout, cwd=cwd, output_limit=output_limit,
+                                      untrusted=True)
+    output_limit_exceeded = run_result.get('output_limit_exceeded', False)
+
+    # Check output
+    killed = run_result.get('timed_out') or output_limit_exceeded
+    if checker_path and not killed:
+        with open_test_data(test, 'input', blobs) as checker_input, \
+                open_test_data(test, 'expected_output', blobs) as expected:
+            comparison = run_checker(checker_path, checker_input, run_result['stdout'], expected, cwd=cwd)
+    else:
+        with open_test_data(test, 'expected_output', blobs) as expected:
+            comparison = compare_output(run_result['stdout'], expected, compare_mode)
+    actual_output = run_result['stdout'].strip()
+    limit_exceeded = limit_verdict(test, run_result)
+    passed = comparison['passed'] and run_result['returncode'] == 0 and not output_limit_exceeded and \
+        not limit_exceeded
+
+    median_time, runs = None, 1
+    if passed and repeat > 1:
+        median_time, runs = median_runtime(cmd, test, run_result['time'], repeat, timeout, output_limit, blobs,
+                                            cwd)
+
+    return {
+        'test_id': test_id,
+        'passed': passed,
+        'input': test_input if not is_hidden else "[Hidden]",
+        'expected_output': expected_output if not is_hidden else "[Hidden]",
+        # Only an excerpt, so runaway output cannot bloat the results
+        'actual_output': truncate_output(actual_output) if not is_hidden else "[Hidden]",
+        'stderr': truncate_output(run_result['stderr']),
+        'output_limit_exceeded': output_limit_exceeded,
+        # Where the output first differs from the expected one (meaningless for a killed run)
+        'mismatch': comparison['message'] if not is_hidden and not killed else None,
+        # Calibrated time or memory limit the run broke
+        'limit_exceeded': limit_exceeded,
+        'time': run_result['time'],
+        'median_time': median_time,
+        'runs': runs,
+        'reference_time': test.get('reference_time'),
+        'cpu_user': run_result['cpu_user'],
+        'cpu_sys': run_result['cpu_sys'],
+        'max_rss_kb': run_result['max_rss_kb'],
+        'signal': run_result['signal'],
+        'is_hidden': is_hidden
+    }
+
+
+def skipped_test(test_id, test):
+    """Result of a test case that a fail-fast job did not run"""
+    is_hidden = test.get('is_hidden', False)
+    return {
+        'test_id': test_id,
+        'passed': False,
+        'skipped': True,
+        'input': test.get('input', '') if not is_hidden else "[Hidden]",
+        'expected_output': test.get('expected_output', '').strip() if not is_hidden else "[Hidden]",
+        'actual_output': '',
+        'stderr': '',
+        'output_limit_exceeded': False,
+        'mismatch': None,
+        'limit_exceeded': None,
+        'time': 0,
+        'median_time': None,
+        'runs': 0,
+        'reference_time': test.get('reference_time'),
+        'cpu_user': None,
+        'cpu_sys': None,
+        'max_rss_kb': None,
+        'signal': None,
+        'is_hidden': is_hidden
+    }
+
+
+def format_usage(test):
+    """Short human-readable resource usage of a test result, like `0.02s, 3.1 MB`"""
+    parts = [f"{test['time']:.2f}s"] if test.get('time') is not None else []
+    if test.get('median_time') is not None:
+        parts.append(f"median {test['median_time']:.3f}s over {test['runs']} runs")
+        if test.get('reference_time') is not None:
+            parts.append(f"reference {test['reference_time']:.3f}s")
+    if test.get('max_rss_kb') is not None:
+        parts.append(f"{test['max_rss_kb'] / 1024:.1f} MB")
+    return ", ".join(parts)
+
+
+def limit_verdict(test, run_result):
+    """
+    Check a run against its test's calibrated time and memory limits
+
+    Args:
+        test (dict): Test case, with the LIMIT_FIELDS of a calibrated exercise
+        run_result (dict): Result of run_with_timeout
+
+    Returns:
+        str: Why the run broke a limit, or None if it did not (or the test has no limits)
+    """
+    time_limit = test.get('time_limit')
+    if time_limit and (run_result.get('timed_out') or run_result['time'] > time_limit):
+        message = f"Time limit exceeded: limit {time_limit:.2f}s"
+        if test.get('reference_time') is not None:
+            message += f", the reference solution takes {test['reference_time']:.2f}s"
+        return message
+    memory_limit = test.get('memory_limit_kb')
+    if memory_limit and run_result.get('max_rss_kb') and run_result['max_rss_kb'] > memory_limit:
+        return (f"Memory limit exceeded: used {run_result['max_rss_kb'] / 1024:.1f} MB, "
+                f"limit {memory_limit / 1024:.1f} MB")
+    return None
+
+
+def median_runtime(cmd, test, first_time, repeat, timeout, output_limit=OUTPUT_LIMIT, blobs=None, cwd=None):
+    """
+    Run a program that passed a test repeat - 1 more times to measure its typical runtime
+
+    Args:
+        cmd (list): Command running the program
+        test (dict): Test case whose input is fed to the program
+        first_time (float): Wall time of the run that was judged
+        repeat (int): Total number of runs
+        timeout (int): Timeout in seconds for each run
+        output_limit (int): Bytes of stdout after which a run is stopped
+        blobs (BlobStore, optional): Store holding the test's blobs
+        cwd (str, optional): Working directory of the runs
+
+    Returns:
+        tuple: (median wall time in seconds, number of runs)
+    """
+    times = [first_time]
+    for _ in range(repeat - 1):
+        with open_test_data(test, 'input', blobs, binary=True) as input_data:
+            times.append(run_with_timeout(cmd, input_data, timeout=timeout, cwd=cwd,
+                                          output_limit=output_limit, untrusted=True)['time'])
+    return statistics.median(times), len(times)
+
+
+def usage_summary(tests):
+    """
+    Aggregate resource usage of the tests that ran
+
+    Args:
+        tests (list): Test results carrying USAGE_FIELDS
+
+    Returns:
+        dict: Total 'cpu_time' in seconds and the largest 'max_rss_kb' (None when unknown)
+    """
+    measured = [test for test in tests if test.get('cpu_user') is not None]
+    peaks = [test['max_rss_kb'] for test in measured if test['max_rss_kb'] is not None]
+    return {
+        'cpu_time': sum(test['cpu_user'] + test['cpu_sys'] for test in measured) if measured else None,
+        'max_rss_kb': max(peaks) if peaks else None
+    }
+
+
+def run_job(config, work_dir=None, on_event=None):
+    """
+    Compile a submission and run it against its test cases
+
+    Args:
+        config (dict): Job description with either 'code' (source as a string) or
+            'code_path', plus 'test_cases', 'timeout' and optionally 'compile_flags',
+            'cache_dir', 'output_limit' (stdout bytes per test, OUTPUT_LIMIT by default),
+            'compare_mode' (see output_compare), 'checker_code' (C++ checker judging the outputs),
+            'compile_prefix' and 'run_prefix' (commands g++ and the tests are run through),
+            'blob_dir' (blob store of test cases given as 'input_blob' / 'expected_blob'),
+            'repeat' (runs of each passing test, reporting their median time),
+            'parallel' (run test cases concurrently, up to the CPU allowance) and
+            'max_failures' (stop after that many failed tests, skipping the rest)
+        work_dir (str, optional): Directory to write the source and binary into
+            when the code is passed inline
+        on_event (callable, optional): Called with a 'compile' event once the code is
+            compiled and a 'test' event as each test case finishes
+
+    Returns:
+        dict: Compilation result, per-test results and a summary
+    """
+    # Get code file path
+    if config.get('code') is not None:
+        code_path = os.path.join(work_dir or tempfile.mkdtemp(dir=WORK_ROOT), "solution.cpp")
+        with open(code_path, 'w') as f:
+            f.write(config['code'])
+    else:
+        code_path = config.get('code_path')
+    if not code_path or not os.path.exists(code_path):
+        raise Exception(f"Code file not found at {code_path}")
+    # Absolute, since the tests run with the job's directory as their working directory
+    code_path = os.path.abspath(code_path)
+
+    # Compile the code
+    cache = None
+    if config.get('cache_dir'):
+        cache = get_compile_cache(config['cache_dir'], config.get('cache_max_bytes'))
+    compile_result = compile_source(code_path, f"{code_path}.out", config.get('compile_flags'), cache,
+                                    config.get('compile_prefix'))
+
+    results = {
+        'compilation': compile_result,
+        'test_results': [],
+        'summary': {
+            'passed': 0,
+            'total': 0
+        }
+    }
+
+    if on_event:
+        on_event({'event': 'compile', 'compilation': compile_result})
+
+    # If compilation failed, return results immediately
+    if compile_result['returncode'] != 0:
+        results['summary']['error'] = "Compilation failed"
+        return results
+
+    # The exercise's checker runs in this job too, so judging costs no extra round trip
+    checker_path = None
+    if config.get('checker_code'):
+        # In a directory of its own, which the tests cannot read
+        checker_dir = tempfile.mkdtemp(prefix="checker-", dir=os.path.dirname(code_path))
+        checker_path, checker_compilation = compile_checker(config['checker_code'], checker_dir, cache)
+        results['checker_compilation'] = checker_compilation
+        if checker_compilation['returncode'] != 0:
+            results['summary']['error'] = "Checker compilation failed"
+            return results
+
+    # Get test cases
+    test_cases = config.get('test_cases', [])
+    results['summary']['total'] = len(test_cases)
+
+    # Run the test cases, concurrently if the job asks for it
+    start = time.time()
+    binary_path = f"{code_path}.out"
+    timeout = config.get('timeout', 5)
+    output_limit = config.get('output_limit') or OUTPUT_LIMIT
+    compare_mode = config.get('compare_mode') or DEFAULT_COMPARE_MODE
+    run_prefix = config.get('run_prefix')
+    # Large test data, read from the (read-only) blob store
+    blobs = get_blob_store(config['blob_dir']) if config.get('blob_dir') else None
+    repeat = config.get('repeat') or 1
+    # Files the tests write stay in the job's directory instead of the caller's
+    run_dir = os.path.dirname(code_path)
+    if TEST_USER:
+        # Writable by the test user too, who still cannot replace our files in it
+        os.chmod(run_dir, 0o1777)
+    # Fail-fast jobs stop once this many tests have failed
+    max_failures = config.get('max_failures')
+    failures = 0
+
+    test_results = [None] * len(test_cases)
+    if config.get('parallel') and len(test_cases) > 1:
+        workers = min(cpu_allowance(), len(test_cases))
+        results['summary']['workers'] = workers
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(run_test, binary_path, i + 1, test, timeout, output_limit, compare_mode,
+                                checker_path, run_prefix, blobs, repeat, run_dir): i
+                for i, test in enumerate(test_cases)
+            }
+            # Report tests as they finish, but keep the results in the original order
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                index = futures[future]
+                test_results[index] = future.result()
+                if on_event:
+                    on_event({'event': 'test', 'index': index, 'test': test_results[index]})
+
+                if not test_results[index]['passed']:
+                    failures += 1
+                    if max_failures and failures >= max_failures:
+                        # Drop the tests that have not started yet
+                        for pending in futures:
+                            pending.cancel()
+    else:
+        for i, test in enumerate(test_cases):
+            if max_failures and failures >= max_failures:
+                break
+            test_results[i] = run_test(binary_path, i + 1, test, timeout, output_limit, compare_mode, checker_path,
+                                       run_prefix, blobs, repeat, run_dir)
+            if on_event:
+                on_event({'event': 'test', 'index': i, 'test': test_results[i]})
+            if not test_results[i]['passed']:
+                failures += 1
+
+    # Tests that were never run
+    for i, test in enumerate(test_cases):
+        if test_results[i] is None:
+            test_results[i] = skipped_test(i + 1, test)
+            if on_event:
+                on_event({'event': 'test', 'index': i, 'test': test_results[i]})
+    results['summary']['skipped'] = sum(1 for test in test_results if test.get('skipped'))
+
+    results['test_results'] = test_results
+    results['summary']['passed'] = sum(1 for test in test_results if test['passed'])
+    results['summary']['wall_time'] = time.time() - start
+    results['summary'].update(usage_summary(test_results))
+
+    return results
+
+
+def _kill_leftover_processes():
+    """
+    Kill every other process in the container and reap them
+
+    Only done as PID 1 of the container's PID namespace, where kill(-1) cannot
+    reach anything outside the container; elsewhere this does nothing.
+    """
+    if os.getpid() != 1:
+        return
+    helper = _rusage_helper_path()
+    while True:
+        # Every process we may signal except ourselves, so forks made meanwhile are caught next round
+        if TEST_USER and helper:
+            # The test user's programs are only within reach of the setuid helper
+            if subprocess.run([helper, '--kill-all']).returncode != 0:
+                return
+        else:
+            try:
+                os.kill(-1, signal.SIGKILL)
+            except ProcessLookupError:
+                return
+        try:
+            # Orphans are re-parented to PID 1, so they are all ours to reap
+            os.waitpid(-1, 0)
+        except ChildProcessError:
+            time.sleep(0.01)
+
+
+def _open_up(directory):
+    try:
+        os.chmod(directory, 0o700)
+    except OSError:
+        pass
+
+
+def clear_directories(paths):
+    """
+    Delete everything inside the given directories that we may delete, keeping the directories
+
+    Args:
+        paths (list): Directories to empty; missing ones are skipped
+    """
+    for path in paths:
+        try:
+            names = os.listdir(path)
+        except OSError:
+            continue
+        for name in names:
+            entry = os.path.join(path, name)
+            if entry in paths:
+                continue
+            if os.path.isdir(entry) and not os.path.islink(entry):
+                # Directories a program made unreadable or read-only are still emptied,
+                # each one opened up before os.walk lists it
+                _open_up(entry)
+                for root, dirs, _ in os.walk(entry):
+                    for directory in dirs:
+                        _open_up(os.path.join(root, directory))
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                try:
+                    os.unlink(entry)
+                except OSError:
+                    pass
+
+
+def _clear_leftover_files():
+    """
+    Empty LEFTOVER_DIRS, so files a job left there cannot fill them up for the next ones
+
+    Only done as PID 1 of a container, like _kill_leftover_processes. Files of
+    the test user are deleted by a process running as the test user first.
+    """
+    if os.getpid() != 1:
+        return
+    if TEST_USER and _rusage_helper_path():
+        process = _RusagePopen([sys.executable, os.path.abspath(__file__), '--clear'] + LEFTOVER_DIRS,
+                               untrusted=True, cwd="/", stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        process.wait()
+        process.collect_usage()
+    clear_directories(LEFTOVER_DIRS)
+
+
+def _error_result(e):
+    """Build the result reported when a job could not be run at all"""
+    return {
+        'error': str(e),
+        'summary': {
+            'passed': 0,
+            'total': 0,
+            'error': str(e)
+        }
+    }
+
+
+def _write_line(message):
+    """Write one JSON message on its own line, flushed so the reader sees it right away"""
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+
+def _tag(message, config):
+    """Echo the job's nonce, if it has one, so the reader can tell our lines from anything a program forged"""
+    if isinstance(config, dict) and config.get('nonce'):
+        message['nonce'] = config['nonce']
+    return message
+
+
+def _event_writer(config):
+    """Event callback for a job, or None unless the job asked for streaming"""
+    if not config.get('stream'):
+        return None
+    return lambda event: _write_line(_tag(event, config))
+
+
+def serve():
+    """
+    Grade jobs read line by line from stdin, writing one JSON result line per job
+
+    Jobs with "stream": true also get one 'compile' and one 'test' event line
+    each, written before their result line as the work progresses. Every line
+    of a job carries the job's "nonce", if it gave one.
+    """
+    # Tell the pool the container is warm
+    _write_line({'ready': True})
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+
+        work_dir = tempfile.mkdtemp(prefix="job-", dir=WORK_ROOT)
+        config = None
+        try:
+            config = json.loads(line)
+            results = run_job(config, work_dir, _event_writer(config))
+        except Exception as e:
+            results = _error_result(e)
+        finally:
+            # Reset the container for the next job
+            _kill_leftover_processes()
+            shutil.rmtree(work_dir, ignore_errors=True)
+            _clear_leftover_files()
+
+        _write_line(_tag(results, config))
+
+
+def main():
+    """Main function to run C++ code against test cases"""
+    if len(sys.argv) < 2:
+        print("Usage: python run_cpp.py <path-to-config-json> | - | --serve | --build-pch [dir] | "
+              "--build-rusage-helper [path [test user]] | --clear dir...")
+        sys.exit(1)
+
+    if sys.argv[1] == "--serve":
+        serve()
+        return
+
+    if sys.argv[1] == "--build-rusage-helper":
+        build_rusage_helper(sys.argv[2] if len(sys.argv) > 2 else RUSAGE_HELPER,
+                            sys.argv[3] if len(sys.argv) > 3 else None)
+        return
+
+    if sys.argv[1] == "--clear":
+        clear_directories(sys.argv[2:])
+        return
+
+    if sys.argv[1] == "--build-pch":
+        build_pch(sys.argv[2] if len(sys.argv) > 2 else PCH_DIR)
+        return
+
+    config_path = sys.argv[1]
+
+    try:
+        if config_path == "-":
+            # Config piped in, so the job needs no files from the host
+            config = json.load(sys.stdin)
+        else:
+            with open(config_path, 'r') as f:
+                config = json.load(f)
+
+        # Output results as JSON
+        _write_line(_tag(run_job(config, on_event=_event_writer(config)), config))
+
+    except Exception as e:
+        print(json.dumps(_error_result(e)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
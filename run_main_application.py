@@ -5,11 +5,11 @@ from dataBase.chat_history_DB import (
 import Ollama_response as OLM
 from exercise_handler import (
     get_all_exercises, get_exercise_details, save_submission,
-    check_submission, get_user_progress, create_tables_if_not_exist
+    get_user_progress, create_tables_if_not_exist, INTERACTIVE_MAX_FAILURES, TIMING_RUNS
 )
+from grading_scheduler import get_scheduler
+from run_cpp import format_usage
 import uuid
-import asyncio
-import time
 import os
 import tempfile
 import sqlite3
@@ -46,12 +46,6 @@ def xu_li_chuoi(a):
         return a[0:25] + "   ..."
 
 
-def streamtext(text):
-    for word in text.split():
-        yield word + " "
-        time.sleep(0.02)
-
-
 async def get_code_review(code, exercise_title, results):
     """Get code review from Ollama"""
     passed_tests = results['passed_tests']
@@ -75,7 +69,8 @@ async def get_code_review(code, exercise_title, results):
     Keep your review concise and constructive.
     """
 
-    txt_index, txt_plain = await OLM.send_receive_response(prompt)
+    # The same code with the same results gets the same review
+    txt_index, txt_plain = await OLM.send_receive_response(prompt, cache="review")
     return txt_index, txt_plain
 
 
@@ -105,23 +100,16 @@ if prompt := st.chat_input("Nhập tin nhắn..."):
     st.session_state.messages.append(("user", "text", prompt))
     save_message(st.session_state.session_id, "user", prompt, "text", st.session_state.session_name)
 
-    # Bot response
+    # Bot response, shown token by token as the model writes it
     with st.chat_message("assistant"):
-        with st.spinner("Chờ tí...", show_time=True):
-            txt_index, txt_plain = asyncio.run(OLM.send_receive_response(prompt))
-        with st.container():
-            for item in txt_index:
-                start, end = item['content']
-                if item['type'] == 'text':
-                    text_piece = txt_plain[start:end]
-                    st.write_stream(streamtext(text_piece))
-                    st.session_state.messages.append(
-                        ("assistant", "text", text_piece)
-                    )
-                elif item['type'] == 'code':
-                    code_piece = txt_plain[start:end]
-                    st.code(code_piece, language="cpp")
-                    st.session_state.messages.append(("assistant", "code", code_piece))
+        txt_plain = st.write_stream(OLM.iter_response(prompt, st.session_state.session_id, cache="chat")) or ""
+    # Kept split into text and code, the way the history is displayed
+    for item in OLM.separate_code_and_text(txt_plain):
+        start, end = item['content']
+        if item['type'] == 'text':
+            st.session_state.messages.append(("assistant", "text", txt_plain[start:end]))
+        elif item['type'] == 'code':
+            st.session_state.messages.append(("assistant", "code", txt_plain[start:end]))
     save_message(st.session_state.session_id, "assistant", txt_plain, "text", st.session_state.session_name)
     st.rerun()
 
@@ -173,6 +161,8 @@ with tab2:
                 uploaded_file = st.file_uploader("Upload your C++ solution",
                                                  type=['cpp'],
                                                  key=f"upload_{ex_id}")
+                measure_runtime = st.checkbox(f"Measure runtime (median of {TIMING_RUNS} runs per passed test)",
+                                              key=f"timing_{ex_id}")
 
                 col1, col2 = st.columns(2)
                 with col1:
@@ -183,8 +173,42 @@ with tab2:
                                 tmp_file.write(uploaded_file.getvalue())
                                 tmp_path = tmp_file.name
 
-                            # Check the submission against test cases
-                            results = check_submission(ex_id, tmp_path)
+                            # Check the submission against test cases, queued behind other students,
+                            # showing each test as soon as it has run
+                            with st.status("Grading your submission...", expanded=True) as grading_status:
+                                shown_failure = False
+                                for event in get_scheduler().stream(ex_id, tmp_path,
+                                                                    max_failures=INTERACTIVE_MAX_FAILURES,
+                                                                    repeat=TIMING_RUNS if measure_runtime else 1):
+                                    if event['event'] == 'compile':
+                                        if event['compilation']['returncode'] != 0:
+                                            st.write("❌ Compilation failed")
+                                        elif event.get('cached_result'):
+                                            st.write("Same code as an earlier submission, reusing its results")
+                                        else:
+                                            st.write("Compiled, running tests...")
+                                    elif event['event'] == 'test':
+                                        test = event['test']
+                                        if test.get('skipped'):
+                                            st.write(f"Test {event['index'] + 1}: ⏭️ Skipped")
+                                            continue
+                                        st.write(f"Test {event['index'] + 1}: {'✅ Passed' if test['passed'] else '❌ Failed'}")
+                                        if test.get('median_time') is not None:
+                                            st.caption(format_usage(test))
+                                        if test.get('limit_exceeded'):
+                                            st.write(f"⏱️ {test['limit_exceeded']}")
+                                        if not test['passed'] and not shown_failure:
+                                            # The first failure is usually all the student needs
+                                            st.code(f"Input: {test['input']}\nExpected: {test['expected']}\n"
+                                                    f"Your output: {test['actual']}", language="text")
+                                            shown_failure = True
+                                    else:
+                                        results = event['results']
+                                grading_status.update(
+                                    label=f"Graded: {results['passed_tests']}/{results['total_tests']} tests passed",
+                                    state="complete" if results['passed_tests'] == results['total_tests'] else "error",
+                                    expanded=False
+                                )
                             code_content = uploaded_file.getvalue().decode('utf-8')
 
                             # Store the submission
@@ -217,7 +241,7 @@ with tab2:
                                 # Get and display code review from Ollama
                                 st.subheader("Code Review")
                                 with st.spinner("Getting code review..."):
-                                    review_index, review_plain = asyncio.run(
+                                    review_index, review_plain = OLM.run(
                                         get_code_review(code_content, title, results))
 
                                     # Display the review
@@ -243,8 +267,6 @@ if st.sidebar.button("ㅤ➕ New Chatㅤ"):
     st.session_state.session_id = str(uuid.uuid4())
     st.session_state.session_name = f"Chat {st.session_state.session_id[:7]}"
     st.session_state.messages = []
-    # Clear Ollama context before rerun
-    OLM.new_chat()
     # Force a complete rerun by clearing the cache
     st.cache_data.clear()
     st.rerun()
@@ -265,8 +287,6 @@ for sess_id, sess_name in sessions:
             st.session_state.session_id = sess_id
             st.session_state.messages = get_messages(sess_id)
             st.session_state.session_name = sess_name
-            # Update Ollama context
-            OLM.load_old_message(st.session_state.messages)
             # Force a complete rerun with cache clearing
             st.cache_data.clear()
             st.rerun()
@@ -274,6 +294,7 @@ for sess_id, sess_name in sessions:
     with col2:
         if st.button("❌", key=f"delete_{sess_id}"):
             delete_session(sess_id)
+            OLM.forget_session(sess_id)
             if st.session_state.session_id == sess_id:
                 st.session_state.session_id = str(uuid.uuid4())
                 st.session_state.session_name = f"Chat {st.session_state.session_id[:4]}"
@@ -1,10 +1,15 @@
-import asyncio
+import uuid
 
-from Ollama_response import send_receive_response
+from Ollama_response import iter_response
+
+# One conversation for the whole terminal session
+session_id = f"terminal-{uuid.uuid4()}"
 
 while True:
     chat = input(">>> ")
     if chat == "/exit":
         break
     elif len(chat) > 0:
-        asyncio.run(send_receive_response(chat))
+        for token in iter_response(chat, session_id):
+            print(token, end="", flush=True)
+        print()
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top level of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def scratch_db(tmp_path, monkeypatch):
+    """Exercises database of the test's own, holding the sample exercises, and a compile cache to match"""
+    import CURD_ex_data
+    import exercise_handler
+    from compile_cache import CompileCache
+
+    db_path = str(tmp_path / "exercises.db")
+    monkeypatch.setattr(exercise_handler, "DB_PATH", db_path)
+    monkeypatch.setattr(CURD_ex_data, "DB_PATH", db_path)
+    monkeypatch.setattr(exercise_handler, "_compile_cache", CompileCache(str(tmp_path / "compile_cache")))
+    exercise_handler.create_tables_if_not_exist()
+    return db_path
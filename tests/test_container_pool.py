@@ -0,0 +1,150 @@
+import json
+import queue
+import threading
+import time
+
+import pytest
+
+from container_pool import ContainerPool, RunnerContainer
+
+
+class FakeContainer:
+    def __init__(self, fail=False, block=None, result=None):
+        self.jobs_done = 0
+        self.fail = fail
+        self.block = block
+        self.result = result
+        self.stopped = False
+        self.out_of_step = False
+
+    def run(self, config, timeout, on_event=None):
+        if self.block:
+            self.block.wait()
+        if self.fail:
+            raise RuntimeError("container died")
+        self.jobs_done += 1
+        return self.result or {'summary': {'passed': 1, 'total': 1}}
+
+    def stop(self):
+        self.stopped = True
+
+
+def make_pool(monkeypatch, starts, **kwargs):
+    """Pool whose containers come from `starts`: FakeContainers, or exceptions raised instead of starting"""
+    pool = ContainerPool("cpp-runner:test", **kwargs)
+
+    def new_container():
+        start = starts.pop(0)
+        if isinstance(start, Exception):
+            raise start
+        return start
+
+    monkeypatch.setattr(pool, "_new_container", new_container)
+    return pool
+
+
+def test_job_fails_with_a_clear_error_when_no_container_starts(monkeypatch):
+    pool = make_pool(monkeypatch, [RuntimeError("docker is down")] * 2, size=1)
+
+    with pytest.raises(RuntimeError, match="could not start one: docker is down"):
+        pool.run_job({}, timeout=5)
+
+
+def test_lost_container_is_started_again_on_demand(monkeypatch):
+    replaced = threading.Event()
+    pool = make_pool(monkeypatch, [FakeContainer(fail=True), RuntimeError("replacement failed"), FakeContainer()],
+                     size=1)
+    original_replace = pool._replace
+
+    def replace(container):
+        original_replace(container)
+        replaced.set()
+
+    monkeypatch.setattr(pool, "_replace", replace)
+
+    with pytest.raises(RuntimeError, match="container died"):
+        pool.run_job({}, timeout=5)
+    assert replaced.wait(5)
+
+    # The pool is empty after the failed replacement, so this job starts a container itself
+    assert pool.run_job({}, timeout=5)['summary']['passed'] == 1
+
+
+def test_waiting_for_a_busy_pool_times_out(monkeypatch):
+    release = threading.Event()
+    pool = make_pool(monkeypatch, [FakeContainer(block=release)], size=1, wait_timeout=0.2)
+    busy = threading.Thread(target=pool.run_job, args=({}, 5))
+    busy.start()
+    # Give the first job time to take the only container
+    time.sleep(0.05)
+    try:
+        with pytest.raises(RuntimeError, match="became free within 0.2s"):
+            pool.run_job({}, timeout=5)
+    finally:
+        release.set()
+        busy.join()
+
+
+class FakeProcess:
+    def __init__(self, container, replies):
+        self.stdin = self
+        self.container = container
+        self.replies = replies
+
+    def write(self, line):
+        nonce = json.loads(line)['nonce']
+        for reply in self.replies:
+            self.container._lines.put(reply.replace("NONCE", nonce) + "\n")
+
+    def flush(self):
+        pass
+
+
+def runner_container(replies):
+    """RunnerContainer whose runner answers each job with `replies`, NONCE standing for the job's nonce"""
+    container = RunnerContainer.__new__(RunnerContainer)
+    container.name = "cpp-runner-pool-test"
+    container.jobs_done = 0
+    container.out_of_step = False
+    container._lines = queue.Queue()
+    container.process = FakeProcess(container, replies)
+    return container
+
+
+def test_lines_without_the_job_nonce_are_ignored_and_taint_the_container():
+    container = runner_container([
+        '{"summary": {"passed": 9, "total": 9}}',
+        'garbage',
+        '{"event": "compile", "compilation": {"returncode": 0}, "nonce": "NONCE"}',
+        '{"summary": {"passed": 0, "total": 1}, "nonce": "NONCE"}'
+    ])
+    events = []
+
+    result = container.run({}, timeout=5, on_event=events.append)
+
+    assert result == {'summary': {'passed': 0, 'total': 1}}
+    assert events == [{'event': 'compile', 'compilation': {'returncode': 0}}]
+    assert container.out_of_step
+
+
+def test_out_of_step_container_is_recycled(monkeypatch):
+    tainted = FakeContainer()
+    tainted.out_of_step = True
+    pool = make_pool(monkeypatch, [tainted, FakeContainer()], size=1)
+    replaced = threading.Event()
+    monkeypatch.setattr(pool, "_replace", lambda container: replaced.set())
+
+    assert pool.run_job({}, timeout=5)['summary']['passed'] == 1
+    assert replaced.wait(5)
+    assert pool._idle.empty()
+
+
+def test_container_is_recycled_after_an_error_result(monkeypatch):
+    broken = FakeContainer(result={'error': "No space left on device", 'summary': {'passed': 0, 'total': 0}})
+    pool = make_pool(monkeypatch, [broken, FakeContainer()], size=1)
+    replaced = threading.Event()
+    monkeypatch.setattr(pool, "_replace", lambda container: replaced.set())
+
+    assert pool.run_job({}, timeout=5)['error'] == "No space left on device"
+    assert replaced.wait(5)
+    assert pool._idle.empty()
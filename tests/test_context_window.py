@@ -0,0 +1,53 @@
+import asyncio
+
+from context_window import LOW_WATER, ContextWindow, message_tokens
+
+SYSTEM = {'role': 'system', 'content': "sys"}
+
+
+def turn(index):
+    """Message of 10 estimated tokens, users on even indices and the assistant on odd ones"""
+    return {'role': 'user' if index % 2 == 0 else 'assistant', 'content': f"m{index} a b c d e"}
+
+
+class StubSummarizer:
+    """Summarizer recording what it was asked to fold in"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, summary, messages):
+        self.calls.append((summary, [message['content'] for message in messages]))
+        return f"summary {len(self.calls)}"
+
+
+def test_overflow_trims_the_window_to_low_water_and_folds_the_rest_into_the_summary():
+    summarize = StubSummarizer()
+    # 100 - 5 (system prompt) - 25 (summary) leaves 70 tokens, room for 7 turns
+    window = ContextWindow(SYSTEM, budget=100, summarize=summarize, summary_budget=25)
+    window.reset([turn(index) for index in range(7)])
+
+    assert asyncio.run(window.prompt_messages()) == [SYSTEM] + window.messages
+    assert summarize.calls == []
+
+    window.append(turn(7))
+    window.append(turn(8))
+    prompt = asyncio.run(window.prompt_messages())
+
+    # Cut down to 60% of 70 tokens, 4 turns, then to the user turn starting the window
+    assert window.start == 6 and window.messages[6]['role'] == 'user'
+    assert sum(message_tokens(message) for message in window.messages[6:]) <= int(70 * LOW_WATER)
+    assert summarize.calls == [(None, [turn(index)['content'] for index in range(6)])]
+    assert prompt == [SYSTEM, {'role': 'system', 'content': "Summary of the earlier conversation: summary 1"}] \
+        + window.messages[6:]
+
+    # The summary is reused until the window overflows again, then extended
+    window.append(turn(9))
+    asyncio.run(window.prompt_messages())
+    assert len(summarize.calls) == 1
+    for index in range(10, 14):
+        window.append(turn(index))
+    asyncio.run(window.prompt_messages())
+    assert summarize.calls[1][0] == "summary 1"
+    assert summarize.calls[1][1][0] == turn(6)['content']
+    assert window.stats()['summarized_messages'] == window.start
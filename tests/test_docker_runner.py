@@ -0,0 +1,96 @@
+import asyncio
+import io
+import os
+
+import pytest
+
+import container_pool
+
+import docker_runner
+from compile_cache import CompileCache
+
+
+@pytest.fixture
+def host_cache(tmp_path, monkeypatch):
+    cache = CompileCache(str(tmp_path / "compile_cache"))
+    monkeypatch.setattr(docker_runner, "_compile_cache", cache)
+    return cache
+
+
+def test_only_compile_errors_from_a_runner_are_kept_on_the_host(host_cache):
+    flags = ['-std=c++11']
+    compiled = {'compilation': {'returncode': 0, 'stdout': '', 'stderr': '', 'cached': False},
+                'summary': {'passed': 1, 'total': 1}}
+    docker_runner._remember_compile_error("int main() {}", flags, compiled)
+
+    assert os.listdir(host_cache.cache_dir) == []
+    assert docker_runner._cached_compile_error("int main() {}", flags) is None
+
+    broken = {'compilation': {'returncode': 1, 'stdout': '', 'stderr': "error: expected ';'", 'cached': False},
+              'summary': {'passed': 0, 'total': 0}}
+    docker_runner._remember_compile_error("int main() {", flags, broken)
+
+    cached = docker_runner._cached_compile_error("int main() {", flags)
+    assert "error: expected ';'" in cached['feedback']
+    [entry] = os.listdir(host_cache.cache_dir)
+    assert os.listdir(os.path.join(host_cache.cache_dir, entry)) == ["meta.json"]
+
+
+def test_job_result_skips_lines_without_the_job_nonce():
+    stdout = "\n".join([
+        '{"ready": true}',
+        '{"summary": {"passed": 9, "total": 9}}',
+        '{"summary": {"passed": 0, "total": 2}, "nonce": "abc"}',
+        '{"summary": {"passed": 9, "total": 9}, "nonce": "forged"}',
+        'not json'
+    ])
+
+    assert docker_runner._job_result(stdout, "abc") == {'summary': {'passed': 0, 'total': 2}}
+    assert docker_runner._job_result('{"summary": {}}', "abc") is None
+
+
+def test_job_deadline_covers_every_run_of_the_longest_test():
+    tests = [{'input': '1'}, {'input': '2', 'time_limit': 4}, {'input': '3', 'time_limit': 0.5}]
+
+    plain = docker_runner.job_deadline(tests, timeout=2)
+    repeated = docker_runner.job_deadline(tests, timeout=2, repeat=3)
+    checked = docker_runner.job_deadline(tests, timeout=2, checker_code="int main() {}")
+
+    assert plain >= 3 * 4 + docker_runner.COMPILE_TIMEOUT
+    assert repeated - plain == 3 * 4 * 2
+    assert checked - plain == docker_runner.COMPILE_TIMEOUT + 3 * docker_runner.CHECKER_TIMEOUT
+
+
+def test_every_docker_path_runs_the_same_sandbox(host_cache, monkeypatch, tmp_path):
+    monkeypatch.setattr(docker_runner, "BLOB_DIR", str(tmp_path / "blobs"))
+    commands = []
+
+    def run(cmd, **kwargs):
+        commands.append(cmd)
+        raise RuntimeError("not running docker")
+
+    async def create_subprocess_exec(*cmd, **kwargs):
+        run(list(cmd))
+
+    class Popen:
+        def __init__(self, cmd, **kwargs):
+            commands.append(cmd)
+            self.stdout = io.StringIO()
+
+    monkeypatch.setattr(docker_runner.subprocess, "run", run)
+    monkeypatch.setattr(docker_runner.asyncio, "create_subprocess_exec", create_subprocess_exec)
+    monkeypatch.setattr(container_pool.subprocess, "Popen", Popen)
+    test_cases = [{'input': '', 'expected_output': ''}]
+
+    docker_runner.run_code_in_docker("int main() {}", test_cases, use_pool=False)
+    asyncio.run(docker_runner.run_code_in_docker_async("int main() {}", test_cases))
+    container_pool.RunnerContainer(docker_runner.RUNNER_IMAGE, docker_runner.DOCKER_MEMORY, docker_runner.DOCKER_CPUS,
+                                   docker_runner.DOCKER_PIDS_LIMIT, docker_runner.runner_volumes(),
+                                   docker_runner.scratch_mounts())
+
+    options = docker_runner.runner_options()
+    assert f"--pids-limit={docker_runner.DOCKER_PIDS_LIMIT}" in options
+    assert len(commands) == 3
+    for cmd in commands:
+        start = cmd.index(options[0])
+        assert cmd[start:start + len(options)] == options
@@ -0,0 +1,76 @@
+import asyncio
+import shutil
+
+import pytest
+
+from CURD_ex_data import update_exercise
+from exercise_handler import check_submission, check_submission_async, save_submission
+
+pytestmark = pytest.mark.skipif(not shutil.which("g++"), reason="g++ is not installed")
+
+# Right on the sample "Sum of Two Numbers" exercise except when the first number is 10
+SUM = """#include <iostream>
+int main() {
+    int a, b;
+    std::cin >> a >> b;
+    std::cout << "Sum: " << a + b + (a == 10) << std::endl;
+    return 0;
+}
+"""
+
+# Accepts any output that starts with "Sum:"
+CHECKER = """#include <fstream>
+#include <string>
+int main(int argc, char **argv) {
+    std::ifstream output(argv[2]);
+    std::string word;
+    output >> word;
+    return word == "Sum:" ? 0 : 1;
+}
+"""
+
+
+def submit(tmp_path, code):
+    path = tmp_path / "solution.cpp"
+    path.write_text(code)
+    return str(path)
+
+
+def verdicts(results):
+    return [(test['test_id'], test['passed'], test.get('skipped', False)) for test in results['details']]
+
+
+@pytest.mark.parametrize("checker", [None, CHECKER])
+def test_sync_and_async_grading_agree(scratch_db, tmp_path, checker):
+    if checker:
+        update_exercise(2, checker_code=checker)
+    path = submit(tmp_path, SUM)
+
+    results = check_submission(2, path, repeat=2)
+    async_results = asyncio.run(check_submission_async(2, path, repeat=2))
+
+    expected_passed = 3 if checker else 2
+    assert results['passed_tests'] == async_results['passed_tests'] == expected_passed, results['feedback']
+    assert verdicts(results) == verdicts(async_results)
+    for test in results['details'] + async_results['details']:
+        if test['passed']:
+            assert test['runs'] == 2 and test['median_time'] is not None
+
+
+def test_fail_fast_runs_likely_failures_first_and_skips_the_rest(scratch_db, tmp_path):
+    # Test 4 failed in both earlier submissions, test 3 in one of them and test 2 never
+    for failed in ([3, 4], [4]):
+        details = [{'test_id': test_id, 'passed': test_id not in failed} for test_id in (2, 3, 4)]
+        save_submission(2, SUM, {'passed_tests': 3 - len(failed), 'total_tests': 3, 'feedback': "Graded",
+                                 'details': details})
+    events = []
+
+    results = check_submission(2, submit(tmp_path, SUM), on_event=events.append, max_failures=1)
+
+    ran = [(event['index'], event['test'].get('skipped', False)) for event in events if event['event'] == 'test']
+    assert ran == [(2, False), (1, False), (0, True)]
+    assert verdicts(results) == [(2, False, True), (3, False, False), (4, True, False)]
+
+    # Final grading ignores max_failures and keeps the test order
+    final = check_submission(2, submit(tmp_path, SUM), max_failures=1, final=True)
+    assert verdicts(final) == [(2, True, False), (3, False, False), (4, True, False)]
@@ -0,0 +1,31 @@
+import threading
+
+import grading_scheduler
+from grading_scheduler import PRIORITY_REJUDGE, get_scheduler
+
+
+def test_interactive_jobs_go_before_rejudges_of_other_backends(monkeypatch):
+    order = []
+    release = threading.Event()
+
+    def slow(name):
+        release.wait(5)
+        order.append(name)
+
+    def record(name):
+        order.append(name)
+
+    monkeypatch.setattr(grading_scheduler, "BACKENDS", {"local": record, "sandbox": record, "slow": slow})
+    monkeypatch.setattr(grading_scheduler, "_scheduler", None)
+    monkeypatch.setenv("GRADING_WORKERS", "1")
+
+    # Keep the only worker busy while the other jobs queue up
+    blocker = get_scheduler("slow").submit("blocker")
+    rejudges = [get_scheduler("sandbox").submit(f"rejudge-{i}", priority=PRIORITY_REJUDGE) for i in range(3)]
+    interactive = get_scheduler("local").submit("interactive")
+    release.set()
+    for future in [blocker, interactive] + rejudges:
+        future.result(timeout=5)
+
+    assert order == ["blocker", "interactive", "rejudge-0", "rejudge-1", "rejudge-2"]
+    assert get_scheduler("local").stats()['workers'] == 1
@@ -0,0 +1,59 @@
+import llm_cache
+from llm_cache import ResponseCache, make_response_key, normalize_prompt
+
+
+class Clock:
+    """time.time stand-in moved forward by hand"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_prompts_are_normalized_and_code_keeps_its_case():
+    assert normalize_prompt("  What is\n a   pointer? ") == "What is a pointer?"
+    assert normalize_prompt("What is a POINTER ?!", casefold=True) == "what is a pointer"
+    assert make_response_key("m", "v", "what is a pointer", casefold=True) == \
+        make_response_key("m", "v", "  What is a Pointer?", casefold=True)
+    assert make_response_key("m", "v", "what is a pointer") != make_response_key("m", "v", "What is a pointer")
+
+    code = "Why does this fail?\n```cpp\nint X = 1;\nstd::cout << x;\n```"
+    assert normalize_prompt(code, casefold=True) == normalize_prompt(code)
+    assert make_response_key("m", "v", code, casefold=True) != \
+        make_response_key("m", "v", code.replace("int X", "int x"), casefold=True)
+
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    cache = ResponseCache(str(tmp_path / "cache.db"), ttl=60)
+
+    cache.put("old", "reply")
+    clock.now += 30
+    assert cache.get("old") == "reply"
+    # Using an entry does not extend its life
+    clock.now += 31
+    assert cache.get("old") is None
+    assert cache.stats()['entries'] == 0
+
+    cache.put("new", "reply")
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_least_recently_used_entries_go_past_max_entries(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_entries=2)
+
+    for key in ("a", "b"):
+        clock.now += 1
+        cache.put(key, f"reply {key}")
+    clock.now += 1
+    assert cache.get("a") == "reply a"
+    clock.now += 1
+    cache.put("c", "reply c")
+
+    assert [cache.get(key) for key in ("a", "b", "c")] == ["reply a", None, "reply c"]
+    assert cache.stats()['evictions'] == 1 and cache.stats()['entries'] == 2
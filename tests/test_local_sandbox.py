@@ -0,0 +1,71 @@
+import shutil
+
+import pytest
+
+import local_sandbox
+from local_sandbox import run_code_in_sandbox
+
+pytestmark = pytest.mark.skipif(not shutil.which("g++"), reason="g++ is not installed")
+
+WRITES_FILE = """#include <fstream>
+#include <iostream>
+int main() {
+    std::ofstream("x") << "written by the test program";
+    std::cout << "done" << std::endl;
+    return 0;
+}
+"""
+
+
+@pytest.fixture
+def caller_dir(tmp_path, monkeypatch):
+    """Run from an empty directory, with a compile cache of the test's own"""
+    caller = tmp_path / "caller"
+    caller.mkdir()
+    monkeypatch.chdir(caller)
+    monkeypatch.setattr(local_sandbox, "DEFAULT_CACHE_DIR", str(tmp_path / "compile_cache"))
+    return caller
+
+
+def test_files_written_by_a_program_stay_out_of_the_callers_directory(caller_dir):
+    results = run_code_in_sandbox(WRITES_FILE, [{'input': '', 'expected_output': 'done'}])
+
+    assert results['passed_tests'] == 1, results['feedback']
+    assert not (caller_dir / "x").exists()
+
+
+def test_checker_runs_in_the_job_directory(caller_dir):
+    checker = WRITES_FILE.replace('std::cout << "done" << std::endl;', '')
+    results = run_code_in_sandbox(WRITES_FILE, [{'input': '', 'expected_output': 'done'}], checker_code=checker)
+
+    assert results['passed_tests'] == 1, results['feedback']
+    assert not (caller_dir / "x").exists()
+
+
+SPINS = """#include <ctime>
+#include <iostream>
+int main() {
+    while (clock() < 2.5 * CLOCKS_PER_SEC) {}
+    std::cout << "done" << std::endl;
+    return 0;
+}
+"""
+
+
+def test_cpu_limit_leaves_room_for_a_tests_own_time_limit(caller_dir):
+    results = run_code_in_sandbox(SPINS, [{'input': '', 'expected_output': 'done', 'time_limit': 4}], timeout=1)
+
+    assert results['passed_tests'] == 1, results['feedback']
+
+
+def test_program_cannot_write_outside_its_job_directory(caller_dir):
+    if local_sandbox.isolation_prefix(str(caller_dir))[:2] != ["unshare", "-rmn"]:
+        pytest.skip("mount namespaces are not available")
+    target = caller_dir / "exercises.db"
+    target.write_text("original")
+    overwrites = WRITES_FILE.replace('"x"', f'"{target}"')
+
+    results = run_code_in_sandbox(overwrites, [{'input': '', 'expected_output': 'done'}])
+
+    assert results['passed_tests'] == 1, results['feedback']
+    assert target.read_text() == "original"
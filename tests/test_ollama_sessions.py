@@ -0,0 +1,41 @@
+from collections import OrderedDict
+
+import pytest
+
+pytest.importorskip("ollama")
+
+import Ollama_response  # noqa: E402
+from Ollama_response import get_conversation, get_session_stats  # noqa: E402
+
+
+@pytest.fixture
+def history(monkeypatch):
+    """Chat history of two turns per session, recording which sessions were loaded from it"""
+    loaded = []
+
+    def get_messages(session_id):
+        loaded.append(session_id)
+        return [('user', 'text', f"question in {session_id}"), ('assistant', 'text', f"answer in {session_id}")]
+
+    monkeypatch.setattr(Ollama_response, "get_messages", get_messages)
+    monkeypatch.setattr(Ollama_response, "MAX_SESSIONS", 2)
+    monkeypatch.setattr(Ollama_response, "_sessions", OrderedDict())
+    monkeypatch.setattr(Ollama_response, "_session_stats", {'hits': 0, 'rehydrated': 0, 'evicted': 0})
+    return loaded
+
+
+def test_least_recently_used_session_is_evicted_and_rehydrated_from_the_history(history):
+    a = get_conversation("a")
+    get_conversation("b")
+    a.append({'role': 'user', 'content': "follow-up in a"})
+
+    # "a" was used last, so "b" goes when "c" comes in
+    assert get_conversation("a") is a
+    get_conversation("c")
+    assert list(Ollama_response._sessions) == ["a", "c"]
+
+    b = get_conversation("b")
+    assert history == ["a", "b", "c", "b"]
+    assert [message['content'] for message in b.messages] == ["question in b", "answer in b"]
+    assert list(Ollama_response._sessions) == ["c", "b"]
+    assert get_session_stats() == {'hits': 1, 'rehydrated': 4, 'evicted': 2, 'sessions': 2, 'max_sessions': 2}
@@ -0,0 +1,111 @@
+import pytest
+
+import output_compare
+from blob_store import BlobStore
+from output_compare import READ_CHUNK, compare_output
+
+
+class ChunkedReads:
+    """File wrapper that fails on any read not bounded by the chunk size"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self, size=-1):
+        assert 0 < size <= READ_CHUNK, f"read({size}) would load the whole blob"
+        return self.stream.read(size)
+
+
+def expected_blob(tmp_path, text):
+    store = BlobStore(str(tmp_path / "blobs"))
+    return store, store.put(text)
+
+
+def test_exact_compare_streams_a_blob_larger_than_the_chunk_size(tmp_path):
+    lines = [f"{i} {i * i}" for i in range(READ_CHUNK // 4)]
+    expected = "\n".join(lines) + "\n"
+    assert len(expected) > 3 * READ_CHUNK
+    store, blob_hash = expected_blob(tmp_path, expected)
+
+    with store.open(blob_hash) as stream:
+        assert compare_output("  " + expected + "\n\n", ChunkedReads(stream), 'exact')['passed']
+
+    # A difference past the first few chunks is found and located
+    wrong = lines[:]
+    wrong[-2] = wrong[-2].replace(" ", "  ", 1)
+    with store.open(blob_hash) as stream:
+        result = compare_output("\n".join(wrong), ChunkedReads(stream), 'exact')
+    assert not result['passed']
+    assert result['line'] == len(lines) - 1
+    assert result['message'].startswith(f"Line {len(lines) - 1}, column {len(wrong[-2].split()[0]) + 2}:")
+
+
+def test_exact_compare_reports_output_that_ends_early(tmp_path):
+    expected = "x" * (2 * READ_CHUNK + 10)
+    store, blob_hash = expected_blob(tmp_path, expected)
+
+    with store.open(blob_hash) as stream:
+        result = compare_output(expected[:READ_CHUNK + 5] + "   ", ChunkedReads(stream), 'exact')
+    assert not result['passed']
+    assert result['message'] == f"Output ended early at line 1, column {READ_CHUNK + 6}"
+
+
+def test_whitespace_mode_ignores_spacing_but_not_tokens():
+    assert compare_output("1  2\n\n3\t4 ", "1 2\n3 4\n", 'whitespace')['passed']
+
+    result = compare_output("1 2\n3 5\n", "1 2\n3 4\n", 'whitespace')
+    assert not result['passed']
+    assert (result['line'], result['token']) == (2, 4)
+    assert result['message'] == "Line 2: expected '4', got '5'"
+
+    result = compare_output("1 2 3", "1 2", 'whitespace')
+    assert result['message'] == "Unexpected extra output on line 1: '3'"
+
+
+def test_lines_mode_ignores_crlf_trailing_spaces_and_trailing_blank_lines():
+    assert compare_output("a b\r\nc  \r\n\r\n\n", "a b\nc", 'lines')['passed']
+
+    # Blank lines in the middle still count, and spacing inside a line too
+    result = compare_output("a b\n\nc\n", "a b\nc\n", 'lines')
+    assert not result['passed']
+    assert result['message'] == "Line 2: expected 'c', got ''"
+    assert not compare_output("a  b\nc", "a b\nc", 'lines')['passed']
+
+    result = compare_output("a b\n", "a b\nc\n", 'lines')
+    assert result['message'] == "Output ended early: expected 'c' on line 2"
+
+
+def test_float_mode_matches_numbers_within_the_tolerance():
+    assert compare_output("0.30000004 1e3", "0.3 1000", 'float:1e-6')['passed']
+    assert not compare_output("0.3001", "0.3", 'float:1e-6')['passed']
+    assert compare_output("0.3001", "0.3", 'float:1e-3')['passed']
+
+    # NaN only matches NaN
+    assert compare_output("nan", "NaN", 'float')['passed']
+    assert not compare_output("nan", "1", 'float')['passed']
+    assert not compare_output("1", "nan", 'float')['passed']
+
+    # Other tokens must be equal
+    assert compare_output("answer: 1.0000001", "answer: 1", 'float')['passed']
+    result = compare_output("Answer: 1", "answer: 1", 'float')
+    assert not result['passed']
+    assert result['message'] == "Line 1: expected 'answer:', got 'Answer:'"
+
+
+@pytest.mark.parametrize("mode", ['exact', 'whitespace', 'lines', 'float'])
+def test_tokens_and_lines_spanning_a_chunk_boundary(monkeypatch, mode):
+    monkeypatch.setattr(output_compare, "READ_CHUNK", 4)
+    expected = "abcdefghi 0.1234567\nsecond line\nthird\n"
+
+    assert compare_output(expected, expected, mode)['passed']
+    if mode != 'exact':
+        assert compare_output(expected.replace("\n", "\r\n"), expected, mode)['passed']
+
+    # The difference is in the last character of a token split over three chunks
+    result = compare_output(expected.replace("abcdefghi", "abcdefghj"), expected, mode)
+    assert not result['passed']
+    assert result['line'] == 1
+    if mode == 'lines':
+        assert result['message'] == "Line 1: expected 'abcdefghi 0.1234567', got 'abcdefghj 0.1234567'"
+    elif mode != 'exact':
+        assert result['message'] == "Line 1: expected 'abcdefghi', got 'abcdefghj'"
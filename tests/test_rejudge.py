@@ -0,0 +1,106 @@
+import json
+import sqlite3
+from concurrent.futures import Future
+
+from CURD_ex_data import add_test_case, delete_test_case
+from exercise_handler import save_submission
+from rejudge import rejudge_exercise
+
+CODE = "int main() { return 0; }"
+
+
+class FakeScheduler:
+    """Grading scheduler passing every test it is given, recording the jobs"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, code, test_cases, **kwargs):
+        self.jobs.append(test_cases)
+        future = Future()
+        future.set_result({'feedback': "All tests passed",
+                           'test_results': [{'passed': True, 'time': 0.01} for _ in test_cases]})
+        return future
+
+
+def exercise_test_ids(db_path, exercise_id=2):
+    conn = sqlite3.connect(db_path)
+    ids = [row[0] for row in conn.execute("SELECT id FROM test_cases WHERE exercise_id = ? ORDER BY id",
+                                          (exercise_id,))]
+    conn.close()
+    return ids
+
+
+def submit_verdicts(db_path, passed):
+    """Store a submission to exercise 2 with the given verdict for each of its tests"""
+    details = [{'test_id': test_id, 'passed': ok, 'time': 0.01}
+               for test_id, ok in zip(exercise_test_ids(db_path), passed)]
+    return save_submission(2, CODE, {'passed_tests': sum(passed), 'total_tests': len(passed),
+                                     'feedback': "Graded", 'details': details})
+
+
+def stored(db_path, submission_id):
+    conn = sqlite3.connect(db_path)
+    passed, feedback, details = conn.execute("SELECT passed, feedback, details FROM submissions WHERE id = ?",
+                                             (submission_id,)).fetchone()
+    conn.close()
+    return bool(passed), feedback, json.loads(details)
+
+
+def test_new_test_runs_alone_and_earlier_verdicts_are_kept(scratch_db):
+    submission_id = submit_verdicts(scratch_db, [True, False, True])
+    add_test_case(2, "1\n1", "Sum: 2")
+    scheduler = FakeScheduler()
+
+    stats = rejudge_exercise(2, scheduler=scheduler)
+
+    assert [[test['input'] for test in job] for job in scheduler.jobs] == [["1\n1"]]
+    assert (stats['rejudged'], stats['test_runs'], stats['reused_verdicts'], stats['changed']) == (1, 1, 3, 0)
+    passed, _, details = stored(scratch_db, submission_id)
+    assert not passed
+    assert [verdict['test_case_id'] for verdict in details] == exercise_test_ids(scratch_db)
+    assert [verdict['passed'] for verdict in details] == [True, False, True, True]
+
+
+def test_changed_test_case_is_rerun(scratch_db):
+    submission_id = submit_verdicts(scratch_db, [True, False, True])
+    changed = exercise_test_ids(scratch_db)[1]
+    conn = sqlite3.connect(scratch_db)
+    conn.execute("UPDATE test_cases SET expected_output = 'Sum: 1' WHERE id = ?", (changed,))
+    conn.commit()
+    conn.close()
+    scheduler = FakeScheduler()
+
+    stats = rejudge_exercise(2, scheduler=scheduler)
+
+    assert [[test['expected_output'] for test in job] for job in scheduler.jobs] == [["Sum: 1"]]
+    assert (stats['test_runs'], stats['reused_verdicts'], stats['changed']) == (1, 2, 1)
+    passed, _, details = stored(scratch_db, submission_id)
+    assert passed
+    assert [verdict['passed'] for verdict in details] == [True, True, True]
+
+
+def test_verdict_of_deleted_test_is_dropped_without_running_anything(scratch_db):
+    submission_id = submit_verdicts(scratch_db, [True, True, False])
+    delete_test_case(exercise_test_ids(scratch_db)[2])
+    scheduler = FakeScheduler()
+
+    stats = rejudge_exercise(2, scheduler=scheduler)
+
+    assert scheduler.jobs == []
+    assert (stats['rejudged'], stats['test_runs'], stats['changed']) == (0, 0, 1)
+    passed, _, details = stored(scratch_db, submission_id)
+    assert passed
+    assert [verdict['test_case_id'] for verdict in details] == exercise_test_ids(scratch_db)
+
+
+def test_up_to_date_submission_is_left_untouched(scratch_db):
+    submission_id = submit_verdicts(scratch_db, [True, False, True])
+    before = stored(scratch_db, submission_id)
+    scheduler = FakeScheduler()
+
+    stats = rejudge_exercise(2, scheduler=scheduler)
+
+    assert scheduler.jobs == []
+    assert (stats['rejudged'], stats['reused_verdicts'], stats['changed']) == (0, 3, 0)
+    assert stored(scratch_db, submission_id) == before
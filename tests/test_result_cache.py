@@ -0,0 +1,68 @@
+import pytest
+
+import exercise_handler
+from CURD_ex_data import add_test_case, update_exercise
+from exercise_handler import check_submission
+
+CODE = "int main() { return 0; }\n"
+
+
+@pytest.fixture
+def gradings(scratch_db, monkeypatch):
+    """Replace grading with a fake one, returning the list of gradings done and the test result they give"""
+    done = []
+    test = {'test_id': 2, 'passed': True, 'time': 0.01}
+
+    def grade(exercise_id, file_path, settings, *args):
+        done.append(settings['suite_version'])
+        results = {'passed_tests': 1, 'total_tests': 1, 'details': [dict(test)], 'feedback': "All tests passed"}
+        return results, {'returncode': 0, 'stderr': ''}
+
+    monkeypatch.setattr(exercise_handler, "_grade_submission", grade)
+    return done, test
+
+
+def submit(tmp_path, code=CODE, name="solution.cpp"):
+    path = tmp_path / name
+    path.write_text(code)
+    return check_submission(2, str(path))
+
+
+def test_identical_submission_is_served_from_the_cache(gradings, tmp_path):
+    done, _ = gradings
+
+    first = submit(tmp_path)
+    # Differences normalize_source ignores still hit the cache
+    second = submit(tmp_path, CODE.replace("\n", "\r\n") + "\n\n", "again.cpp")
+
+    assert len(done) == 1
+    assert not first.get('cached')
+    assert second['cached'] and second['passed_tests'] == 1
+
+
+@pytest.mark.parametrize("change", [
+    lambda: add_test_case(2, "1\n1", "Sum: 2"),
+    lambda: update_exercise(2, compare_mode="whitespace"),
+])
+def test_changing_the_suite_stops_serving_the_old_result(gradings, tmp_path, change):
+    done, _ = gradings
+    submit(tmp_path)
+
+    assert change()[0]
+    results = submit(tmp_path)
+
+    assert len(done) == 2 and done[1] > done[0]
+    assert not results.get('cached')
+
+
+@pytest.mark.parametrize("outcome", [{'timed_out': True}, {'limit_exceeded': 'memory'}])
+def test_results_depending_on_luck_are_not_stored(gradings, tmp_path, outcome):
+    done, test = gradings
+    test.update(outcome, passed=False)
+
+    submit(tmp_path)
+    results = submit(tmp_path)
+
+    assert len(done) == 2
+    assert not results.get('cached')
+    assert exercise_handler.get_result_cache_stats()['entries'] == 0
@@ -0,0 +1,67 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from run_cpp import clear_directories, limit_verdict, run_with_timeout
+
+pytestmark = pytest.mark.skipif(not shutil.which("g++"), reason="g++ is not installed")
+
+ALLOCATES = """#include <cstdlib>
+#include <cstring>
+#include <iostream>
+int main(int argc, char **argv) {
+    size_t size = (size_t)atol(argv[1]) * 1024 * 1024;
+    char *data = (char *)malloc(size);
+    memset(data, 1, size);
+    std::cout << (int)data[size / 2] << std::endl;
+    return 0;
+}
+"""
+
+
+@pytest.fixture(scope="module")
+def allocates(tmp_path_factory):
+    source = tmp_path_factory.mktemp("allocates") / "allocates.cpp"
+    source.write_text(ALLOCATES)
+    subprocess.run(["g++", "-O2", str(source), "-o", f"{source}.out"], check=True)
+    return f"{source}.out"
+
+
+def test_peak_memory_is_the_programs_even_when_the_runner_is_larger(allocates):
+    # Make this process's own peak RSS far larger than the program's
+    ballast = bytearray(200 * 1024 * 1024)
+    for i in range(0, len(ballast), 4096):
+        ballast[i] = 1
+
+    result = run_with_timeout([allocates, "40"])
+
+    assert result['returncode'] == 0
+    assert 40 * 1024 <= result['max_rss_kb'] < 100 * 1024
+    assert limit_verdict({'memory_limit_kb': 20 * 1024}, result).startswith("Memory limit exceeded")
+    del ballast
+
+
+def test_timed_out_program_still_reports_its_usage(tmp_path):
+    result = run_with_timeout(["sh", "-c", "while :; do :; done"], timeout=0.5)
+
+    assert result['timed_out']
+    assert result['cpu_user'] is not None and result['max_rss_kb'] is not None
+
+
+def test_clear_directories_empties_them_including_locked_subdirectories(tmp_path):
+    scratch, work_root = tmp_path / "scratch", tmp_path / "scratch" / "work"
+    (scratch / "hidden" / "deeper").mkdir(parents=True)
+    (scratch / "hidden" / "deeper" / "fill").write_bytes(b"x" * 1024)
+    (scratch / "hidden" / "deeper").chmod(0o500)
+    (scratch / "hidden").chmod(0)
+    (scratch / "junk").write_text("left behind")
+    work_root.mkdir()
+    (work_root / "job-1").mkdir()
+
+    clear_directories([str(scratch), str(work_root), str(tmp_path / "missing")])
+
+    # The directories themselves stay, even one nested in another
+    assert os.listdir(scratch) == ["work"]
+    assert os.listdir(work_root) == []
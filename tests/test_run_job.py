@@ -0,0 +1,83 @@
+import shutil
+
+import pytest
+
+import run_cpp
+from run_cpp import run_job
+
+pytestmark = pytest.mark.skipif(not shutil.which("g++"), reason="g++ is not installed")
+
+# Sleeps for the number of milliseconds it reads, then prints it
+SLEEPS = """#include <chrono>
+#include <iostream>
+#include <thread>
+int main() {
+    int ms;
+    std::cin >> ms;
+    std::this_thread::sleep_for(std::chrono::milliseconds(ms));
+    std::cout << ms << std::endl;
+    return 0;
+}
+"""
+
+
+def sleep_tests(*milliseconds):
+    return [{'input': str(ms), 'expected_output': str(ms)} for ms in milliseconds]
+
+
+def job(tmp_path, test_cases, on_event=None, **options):
+    """Run SLEEPS on the test cases with tmp_path as the job directory"""
+    return run_job(dict({'code': SLEEPS, 'test_cases': test_cases, 'timeout': 5}, **options), str(tmp_path),
+                   on_event)
+
+
+def test_parallel_results_keep_the_test_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_cpp, "cpu_allowance", lambda: 3)
+    finished = []
+
+    results = job(tmp_path, sleep_tests(600, 300, 0), lambda event: finished.append(event.get('index')),
+                  parallel=True)
+
+    assert results['summary']['workers'] == 3
+    # The shortest test finished first, but results stay in test order
+    assert finished[1:] == [2, 1, 0]
+    assert [test['test_id'] for test in results['test_results']] == [1, 2, 3]
+    assert [test['actual_output'] for test in results['test_results']] == ["600", "300", "0"]
+    assert results['summary']['passed'] == 3
+
+
+def test_events_stream_compile_then_each_test_as_it_finishes(tmp_path):
+    test_cases = sleep_tests(0, 0, 0)
+    test_cases[1]['expected_output'] = "1"
+    events = []
+
+    results = job(tmp_path, test_cases, events.append, max_failures=1)
+
+    assert [event['event'] for event in events] == ['compile', 'test', 'test', 'test']
+    assert events[0]['compilation'] == results['compilation']
+    # Tests in the order they were run, then the ones fail-fast grading skipped
+    assert [event['index'] for event in events[1:]] == [0, 1, 2]
+    assert [event['test'] for event in events[1:]] == results['test_results']
+    assert [test.get('skipped', False) for test in results['test_results']] == [False, False, True]
+
+
+# Prints forever
+FLOODS = """#include <cstdio>
+int main() {
+    while (true) {
+        fputs("y\\n", stdout);
+    }
+}
+"""
+
+
+def test_program_over_the_output_limit_is_stopped_and_its_output_truncated(tmp_path):
+    results = job(tmp_path, [{'input': '', 'expected_output': 'y'}], code=FLOODS, output_limit=64 * 1024)
+
+    test = results['test_results'][0]
+    assert test['output_limit_exceeded'] and not test['passed']
+    assert not test.get('timed_out') and test['time'] < 5
+    excerpt, note = test['actual_output'].rsplit("\n... [", 1)
+    assert len(excerpt) == run_cpp.OUTPUT_EXCERPT
+    # Only the first output_limit bytes were kept
+    assert len(excerpt) + int(note.split()[0]) <= 64 * 1024